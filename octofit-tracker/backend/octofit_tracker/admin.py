@@ -1,12 +1,16 @@
 from django.contrib import admin
-from .models import User, Team, Activity, Leaderboard, Workout
+from .models import (
+    User, Team, Activity, DailyActivityRollup, Leaderboard, LeaderboardJob, LeaderboardRefresh, Workout,
+    WorkoutRecommendation,
+)
 
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     """Admin interface for User model"""
-    list_display = ('id', 'username', 'email', 'team_id', 'created_at')
-    list_filter = ('team_id', 'created_at')
+    list_display = ('id', 'username', 'email', 'team', 'created_at')
+    list_filter = ('team', 'created_at')
+    list_select_related = ('team',)
     search_fields = ('username', 'email')
     ordering = ('-created_at',)
     readonly_fields = ('created_at', 'updated_at')
@@ -16,7 +20,7 @@ class UserAdmin(admin.ModelAdmin):
             'fields': ('username', 'email', 'password')
         }),
         ('Team', {
-            'fields': ('team_id',)
+            'fields': ('team',)
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
@@ -31,11 +35,11 @@ class TeamAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'created_at', 'member_count')
     search_fields = ('name',)
     ordering = ('-created_at',)
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('member_count', 'created_at', 'updated_at')
 
     fieldsets = (
         ('Team Information', {
-            'fields': ('name', 'description')
+            'fields': ('name', 'description', 'member_count')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
@@ -43,24 +47,21 @@ class TeamAdmin(admin.ModelAdmin):
         }),
     )
 
-    def member_count(self, obj):
-        """Display member count for team"""
-        return User.objects.filter(team_id=obj.id).count()
-    member_count.short_description = 'Members'
-
 
 @admin.register(Activity)
 class ActivityAdmin(admin.ModelAdmin):
     """Admin interface for Activity model"""
-    list_display = ('id', 'user_id', 'activity_type', 'duration', 'calories', 'date', 'created_at')
+    list_display = ('id', 'user', 'activity_type', 'duration', 'calories', 'date', 'created_at')
     list_filter = ('activity_type', 'date', 'created_at')
-    search_fields = ('user_id', 'notes')
+    list_select_related = ('user',)
+    search_fields = ('user__username', 'notes')
+    raw_id_fields = ('user',)
     ordering = ('-date',)
     readonly_fields = ('created_at', 'updated_at')
 
     fieldsets = (
         ('Activity Information', {
-            'fields': ('user_id', 'activity_type', 'date')
+            'fields': ('user', 'activity_type', 'date')
         }),
         ('Metrics', {
             'fields': ('duration', 'distance', 'calories')
@@ -75,6 +76,16 @@ class ActivityAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(DailyActivityRollup)
+class DailyActivityRollupAdmin(admin.ModelAdmin):
+    """Admin interface for DailyActivityRollup model"""
+    list_display = ('user_id', 'day', 'activity_type', 'activity_count', 'total_duration', 'total_calories', 'total_distance')
+    list_filter = ('activity_type', 'day')
+    search_fields = ('user_id',)
+    ordering = ('-day',)
+    readonly_fields = ('user_id', 'day', 'activity_type', 'activity_count', 'total_duration', 'total_calories', 'total_distance')
+
+
 @admin.register(Leaderboard)
 class LeaderboardAdmin(admin.ModelAdmin):
     """Admin interface for Leaderboard model"""
@@ -98,6 +109,25 @@ class LeaderboardAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(LeaderboardRefresh)
+class LeaderboardRefreshAdmin(admin.ModelAdmin):
+    """Admin interface for LeaderboardRefresh model"""
+    list_display = ('id', 'mode', 'started_at', 'completed_at', 'users_updated', 'teams_updated')
+    list_filter = ('mode',)
+    ordering = ('-started_at',)
+    readonly_fields = ('mode', 'started_at', 'completed_at', 'users_updated', 'teams_updated')
+
+
+@admin.register(LeaderboardJob)
+class LeaderboardJobAdmin(admin.ModelAdmin):
+    """Admin interface for LeaderboardJob model"""
+    list_display = ('id', 'mode', 'status', 'request_count', 'requested_at', 'started_at', 'finished_at')
+    list_filter = ('status', 'mode')
+    ordering = ('-requested_at',)
+    readonly_fields = ('mode', 'status', 'request_count', 'requested_at', 'started_at', 'finished_at',
+                       'users_updated', 'teams_updated', 'error')
+
+
 @admin.register(Workout)
 class WorkoutAdmin(admin.ModelAdmin):
     """Admin interface for Workout model"""
@@ -122,3 +152,14 @@ class WorkoutAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(WorkoutRecommendation)
+class WorkoutRecommendationAdmin(admin.ModelAdmin):
+    """Admin interface for WorkoutRecommendation model"""
+    list_display = ('user', 'difficulty', 'rank', 'workout', 'score', 'updated_at')
+    list_filter = ('difficulty',)
+    list_select_related = ('user', 'workout')
+    raw_id_fields = ('user', 'workout')
+    ordering = ('user_id', 'difficulty', 'rank')
+    readonly_fields = ('user', 'workout', 'difficulty', 'rank', 'score', 'updated_at')
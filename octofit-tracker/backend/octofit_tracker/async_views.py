@@ -0,0 +1,175 @@
+"""Async read endpoints for OctoFit Tracker
+
+Native Django async views for the hottest dashboard reads: the leaderboard
+list, user and team stats, and team members. They return the same JSON as the
+DRF endpoints under /api/async/. Run them under asgi.py (e.g. with uvicorn or
+daphne): each request's ORM calls then run in that request's own thread while
+the event loop keeps accepting requests, so a worker holds many more requests
+in flight than it has threads. Under WSGI they still work, one event loop per
+request.
+
+The stats views run their independent queries at the same time: each goes
+to a thread-pool thread (thread_sensitive=False) with its own database
+connection, closed when the query is done, and the view gathers the results.
+Stats come from views.window_stats, so MONGO_DAL is honoured as on the DRF
+endpoints. Like the DRF endpoints, the leaderboard and team members honour
+?fields= and ?exclude=, and the leaderboard serves ?top=N from the in-memory
+standings.
+"""
+import asyncio
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.http import Http404, HttpResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from . import standings
+from .caching import cache_response, cached_response, get_response_cache, response_cache_key
+from .leaderboard import is_stored_period, period_snapshot, window_snapshot
+from .models import User, Team, Leaderboard
+from .pagination import DefaultCursorPagination, LeaderboardCursorPagination, WindowSnapshotPagination
+from .periods import bounded_window_from_params, window_from_params
+from .serializers import (
+    UserSerializer, LeaderboardSerializer, LeaderboardSnapshotSerializer,
+    FastLeaderboardSerializer, FastLeaderboardSnapshotSerializer,
+    model_columns, readable_fields, select_fields
+)
+from .views import parse_int_param, window_stats
+
+
+def json_response(data, status=200):
+    """Render `data` exactly as the DRF JSON renderer does"""
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status)
+
+
+def async_read_view(view):
+    """Turn Http404 and DRF validation errors into the responses DRF would send"""
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return json_response({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+        try:
+            return await view(request, *args, **kwargs)
+        except Http404:
+            return json_response({'detail': 'Not found.'}, status=404)
+        except ValidationError as error:
+            return json_response(error.detail, status=400)
+    wrapper.__name__ = view.__name__
+    wrapper.__doc__ = view.__doc__
+    return wrapper
+
+
+async def _get_or_404(queryset, **lookup):
+    try:
+        return await queryset.aget(**lookup)
+    except queryset.model.DoesNotExist:
+        raise Http404
+
+
+async def in_own_connection(function, *args):
+    """Run `function` on a thread-pool thread with a database connection of its own"""
+    def call():
+        try:
+            return function(*args)
+        finally:
+            # Pool threads outlive the request, so they must not keep connections open
+            connections.close_all()
+    return await sync_to_async(call, thread_sensitive=False)()
+
+
+def _leaderboard_top(request, window, fast):
+    count = parse_int_param(request.GET, 'top', minimum=1, maximum=standings.MAX_TOP)
+    entity_type = request.GET.get('type', 'user')
+    if window is None:
+        rows = standings.top(entity_type, count)
+    elif not is_stored_period(*window):
+        rows = window_snapshot(*window, entity_type)[:count]
+    else:
+        queryset = period_snapshot(*window).filter(entity_type=entity_type).order_by('rank', 'id')
+        rows = fast.values(queryset[:count])
+    return fast.to_representation(rows)
+
+
+def _leaderboard_page(request, window):
+    """One page of leaderboard or snapshot rows, or the ?top=N rows, serialized on the fast path"""
+    if window is None:
+        serializer_class, fast_class = LeaderboardSerializer, FastLeaderboardSerializer
+    else:
+        serializer_class, fast_class = LeaderboardSnapshotSerializer, FastLeaderboardSnapshotSerializer
+    fast = fast_class(select_fields(request.GET, readable_fields(serializer_class())))
+    if 'top' in request.GET:
+        return _leaderboard_top(request, window, fast)
+    entity_type = request.GET.get('type', None)
+    if window is not None and not is_stored_period(*window):
+        paginator = WindowSnapshotPagination()
+        page = paginator.paginate_queryset(window_snapshot(*window, entity_type), Request(request))
+        return paginator.get_paginated_response(fast.to_representation(page)).data
+    queryset = Leaderboard.objects.all() if window is None else period_snapshot(*window)
+    if entity_type is not None:
+        queryset = queryset.filter(entity_type=entity_type)
+    paginator = LeaderboardCursorPagination()
+    rows = fast.values(queryset, extra=[field.lstrip('-') for field in paginator.ordering])
+    page = paginator.paginate_queryset(rows, Request(request))
+    return paginator.get_paginated_response(fast.to_representation(page)).data
+
+
+def _members_page(request, team_id):
+    """One page of a team's members, reading only the columns ?fields= keeps"""
+    request = Request(request)
+    members = User.objects.filter(team=team_id)
+    fields = select_fields(request.query_params, readable_fields(UserSerializer()))
+    columns = None if fields is None else model_columns(UserSerializer(), fields)
+    if columns is not None:
+        members = members.only('id', *columns)
+    paginator = DefaultCursorPagination()
+    page = paginator.paginate_queryset(members, request)
+    serializer = UserSerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data).data
+
+
+@async_read_view
+async def leaderboard_list(request):
+    """Leaderboard page, sharing the response cache namespace with the DRF endpoint"""
+    window = bounded_window_from_params(request.GET)
+    if 'top' in request.GET:
+        # Read from the in-memory standings, which are cheaper than a cache lookup
+        return json_response(await sync_to_async(_leaderboard_page)(request, window))
+    key = await sync_to_async(response_cache_key)('leaderboard', request)
+    cached = await get_response_cache().aget(key)
+    if cached is not None:
+        return cached_response(request, cached)
+    data = await sync_to_async(_leaderboard_page)(request, window)
+    return await sync_to_async(cache_response)(request, key, json_response(data))
+
+
+@async_read_view
+async def user_stats(request, pk):
+    """Statistics for a user (?period=week|month or ?from=&to=)"""
+    window = window_from_params(request.GET)
+    exists, stats = await asyncio.gather(
+        in_own_connection(User.objects.filter(pk=pk).exists),
+        in_own_connection(window_stats, [pk], window),
+    )
+    if not exists:
+        raise Http404
+    return json_response(stats)
+
+
+@async_read_view
+async def team_stats(request, pk):
+    """Statistics for a team (?period=week|month or ?from=&to=)"""
+    window = window_from_params(request.GET)
+    member_count, stats = await asyncio.gather(
+        in_own_connection(Team.objects.filter(pk=pk).values_list('member_count', flat=True).first),
+        in_own_connection(window_stats, User.objects.filter(team=pk).values('id'), window),
+    )
+    if member_count is None:
+        raise Http404
+    stats['member_count'] = member_count
+    return json_response(stats)
+
+
+@async_read_view
+async def team_members(request, pk):
+    """A page of a team's members"""
+    await _get_or_404(Team.objects.all(), pk=pk)
+    return json_response(await sync_to_async(_members_page)(request, pk))
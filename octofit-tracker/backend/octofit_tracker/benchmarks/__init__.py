@@ -0,0 +1,70 @@
+"""Benchmark suites for OctoFit Tracker
+
+Run with `python manage.py benchmark`. Each suite seeds a throwaway test
+database, measures its cases and compares the results with baselines.json.
+"""
+import json
+import math
+from pathlib import Path
+
+BASELINES_PATH = Path(__file__).resolve().parent / 'baselines.json'
+
+# Synthetic dataset sizes passed to synthetic.generate_dataset
+PROFILES = {
+    'small': {'users': 100, 'teams': 4, 'activities_per_user': 10},
+    'medium': {'users': 2000, 'teams': 20, 'activities_per_user': 50},
+    'large': {'users': 20000, 'teams': 100, 'activities_per_user': 50},
+}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[index]
+
+
+def summarize(timings_ms, query_counts=None):
+    """Latency percentiles and, when counted, worst-case query count for one case"""
+    summary = {
+        'p50_ms': round(percentile(timings_ms, 0.50), 3),
+        'p95_ms': round(percentile(timings_ms, 0.95), 3),
+        'max_ms': round(max(timings_ms), 3),
+    }
+    if query_counts is not None:
+        summary['queries'] = max(query_counts)
+    return summary
+
+
+def load_baselines(path=BASELINES_PATH):
+    if not Path(path).exists():
+        return {}
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def save_baselines(baselines, path=BASELINES_PATH):
+    with open(path, 'w') as handle:
+        json.dump(baselines, handle, indent=2, sort_keys=True)
+        handle.write('\n')
+
+
+def find_regressions(results, baselines, tolerance=1.0, min_delta_ms=10.0):
+    """Describe every case whose query count or p95 latency exceeds its baseline.
+
+    Query counts must not grow at all. Latency may grow by `tolerance` (a
+    fraction of the baseline) and by at least `min_delta_ms`, which keeps
+    sub-millisecond noise from failing the run.
+    """
+    regressions = []
+    for case, baseline in sorted(baselines.items()):
+        result = results.get(case)
+        if result is None:
+            continue
+        if 'queries' in baseline and result['queries'] > baseline['queries']:
+            regressions.append(f"{case}: {result['queries']} queries (baseline {baseline['queries']})")
+        if 'p95_ms' in baseline:
+            limit = max(baseline['p95_ms'] * (1 + tolerance), baseline['p95_ms'] + min_delta_ms)
+            if result['p95_ms'] > limit:
+                regressions.append(f"{case}: p95 {result['p95_ms']}ms (baseline {baseline['p95_ms']}ms)")
+    return regressions
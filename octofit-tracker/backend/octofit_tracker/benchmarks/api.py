@@ -0,0 +1,104 @@
+"""REST API benchmark suite
+
+Measures latency percentiles and query counts for every router endpoint and
+the stats, members, activities and refresh actions. Response caching is
+cleared before each request so the database path is what gets measured.
+
+The refresh action only queues a job, so the leaderboard-refresh-job case
+times the recomputation itself: a full refresh job run as the worker runs it.
+"""
+import time
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from ..caching import get_response_cache
+from ..jobs import claim_next_job, enqueue_refresh, run_job
+from ..models import User, Team, Activity, Leaderboard, Workout
+from . import summarize
+
+
+def api_cases():
+    """(case name, HTTP method, URL) for each benchmarked endpoint"""
+    user = User.objects.filter(team_id__isnull=False).order_by('id').first()
+    team = Team.objects.order_by('id').first()
+    activity = Activity.objects.order_by('id').first()
+    entry = Leaderboard.objects.order_by('id').first()
+    workout = Workout.objects.order_by('id').first()
+    return [
+        ('api-root', 'get', reverse('api-root')),
+        ('user-list', 'get', reverse('user-list')),
+        ('user-detail', 'get', reverse('user-detail', args=[user.id])),
+        ('user-activities', 'get', reverse('user-activities', args=[user.id])),
+        ('user-stats', 'get', reverse('user-stats', args=[user.id])),
+        ('team-list', 'get', reverse('team-list')),
+        ('team-detail', 'get', reverse('team-detail', args=[team.id])),
+        ('team-members', 'get', reverse('team-members', args=[team.id])),
+        ('team-stats', 'get', reverse('team-stats', args=[team.id])),
+        ('activity-list', 'get', reverse('activity-list')),
+        ('activity-list-sparse', 'get', f"{reverse('activity-list')}?fields=id,activity_type,duration,calories,date"),
+        ('activity-detail', 'get', reverse('activity-detail', args=[activity.id])),
+        ('leaderboard-list', 'get', reverse('leaderboard-list')),
+        ('leaderboard-detail', 'get', reverse('leaderboard-detail', args=[entry.id])),
+        ('leaderboard-top', 'get', f"{reverse('leaderboard-list')}?top=50"),
+        ('leaderboard-around', 'get',
+         f"{reverse('leaderboard-around')}?type={entry.entity_type}&entity_id={entry.entity_id}&radius=5"),
+        ('workout-list', 'get', reverse('workout-list')),
+        ('workout-list-sparse', 'get', f"{reverse('workout-list')}?exclude=description,instructions"),
+        ('workout-detail', 'get', reverse('workout-detail', args=[workout.id])),
+        ('workout-suggest', 'get', reverse('workout-suggest')),
+        ('workout-suggest-user', 'get', f"{reverse('workout-suggest')}?user_id={user.id}"),
+        ('leaderboard-refresh', 'post', reverse('leaderboard-refresh')),
+    ]
+
+
+def measure(client, method, url, iterations):
+    """Time `iterations` requests, after one untimed warm-up, and count their queries"""
+    getattr(client, method)(url)
+    timings_ms = []
+    query_counts = []
+    for _ in range(iterations):
+        get_response_cache().clear()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(client, method)(url)
+            timings_ms.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{method.upper()} {url} returned {response.status_code}')
+        query_counts.append(len(queries.captured_queries))
+    return summarize(timings_ms, query_counts)
+
+
+def measure_refresh_job(iterations):
+    """Time `iterations` full refresh jobs, after one untimed warm-up, and count their queries"""
+    timings_ms = []
+    query_counts = []
+    for _ in range(iterations + 1):
+        enqueue_refresh()
+        job = claim_next_job()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            job = run_job(job)
+            timings_ms.append((time.perf_counter() - start) * 1000)
+        if job.status != 'succeeded':
+            raise RuntimeError(f'Refresh job {job.id} {job.status}: {job.error}')
+        query_counts.append(len(queries.captured_queries))
+    return summarize(timings_ms[1:], query_counts[1:])
+
+
+def run(iterations=20, refresh_iterations=3, log=None, **options):
+    """Run every API case and return {case name: summary}"""
+    log = log or (lambda message: None)
+    client = Client()
+    results = {}
+    for name, method, url in api_cases():
+        count = refresh_iterations if name == 'leaderboard-refresh' else iterations
+        results[name] = measure(client, method, url, count)
+        _log_case(log, name, results[name])
+    results['leaderboard-refresh-job'] = measure_refresh_job(refresh_iterations)
+    _log_case(log, 'leaderboard-refresh-job', results['leaderboard-refresh-job'])
+    return results
+
+
+def _log_case(log, name, summary):
+    log(f"{name:<24} p50 {summary['p50_ms']:>9.2f}ms  p95 {summary['p95_ms']:>9.2f}ms  queries {summary['queries']}")
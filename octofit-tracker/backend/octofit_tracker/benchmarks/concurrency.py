@@ -0,0 +1,113 @@
+"""WSGI vs ASGI benchmark suite
+
+Compares the DRF endpoints, called through the WSGI test client, with their
+async counterparts, called through the ASGI test client. Each endpoint is
+measured one request at a time and in bursts of `concurrency` simultaneous
+requests: WSGI bursts use a thread per request like a threaded WSGI server,
+ASGI bursts run on one event loop with a ThreadSensitiveContext per request
+like Django's ASGI handler. Burst summaries time the whole burst and report
+requests per second. Response caching is cleared before each request.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import ThreadSensitiveContext
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from ..caching import get_response_cache
+from ..models import User, Team
+from . import summarize
+
+DEFAULT_CONCURRENCY = 16
+
+
+def endpoint_pairs():
+    """(case name, WSGI URL, ASGI URL) for each endpoint with an async version"""
+    user = User.objects.filter(team_id__isnull=False).order_by('id').first()
+    team = Team.objects.order_by('id').first()
+    return [
+        ('leaderboard-list', reverse('leaderboard-list'), reverse('async-leaderboard-list')),
+        ('user-stats', reverse('user-stats', args=[user.id]), reverse('async-user-stats', args=[user.id])),
+        ('team-stats', reverse('team-stats', args=[team.id]), reverse('async-team-stats', args=[team.id])),
+        ('team-members', reverse('team-members', args=[team.id]), reverse('async-team-members', args=[team.id])),
+    ]
+
+
+def _check(response, url):
+    if response.status_code >= 400:
+        raise RuntimeError(f'GET {url} returned {response.status_code}')
+
+
+def _wsgi_request(url):
+    try:
+        _check(Client().get(url), url)
+    finally:
+        connections.close_all()
+
+
+def measure_wsgi(url, iterations, concurrency):
+    """Sequential request latencies and burst wall times through the WSGI client"""
+    client = Client()
+    client.get(url)
+    sequential_ms, burst_ms = [], []
+    with ThreadPoolExecutor(concurrency) as pool:
+        for _ in range(iterations):
+            get_response_cache().clear()
+            start = time.perf_counter()
+            _check(client.get(url), url)
+            sequential_ms.append((time.perf_counter() - start) * 1000)
+
+            get_response_cache().clear()
+            start = time.perf_counter()
+            list(pool.map(_wsgi_request, [url] * concurrency))
+            burst_ms.append((time.perf_counter() - start) * 1000)
+    return sequential_ms, burst_ms
+
+
+async def _asgi_request(client, url):
+    async with ThreadSensitiveContext():
+        response = await client.get(url)
+    _check(response, url)
+
+
+async def _measure_asgi(url, iterations, concurrency):
+    client = AsyncClient()
+    await client.get(url)
+    sequential_ms, burst_ms = [], []
+    for _ in range(iterations):
+        get_response_cache().clear()
+        start = time.perf_counter()
+        await _asgi_request(client, url)
+        sequential_ms.append((time.perf_counter() - start) * 1000)
+
+        get_response_cache().clear()
+        start = time.perf_counter()
+        await asyncio.gather(*(_asgi_request(client, url) for _ in range(concurrency)))
+        burst_ms.append((time.perf_counter() - start) * 1000)
+    return sequential_ms, burst_ms
+
+
+def measure_asgi(url, iterations, concurrency):
+    """Sequential request latencies and burst wall times through the ASGI client"""
+    return asyncio.run(_measure_asgi(url, iterations, concurrency))
+
+
+def _burst_summary(burst_ms, concurrency):
+    summary = summarize(burst_ms)
+    summary['requests_per_s'] = round(concurrency / (summary['p50_ms'] / 1000)) if summary['p50_ms'] else None
+    return summary
+
+
+def run(iterations=20, concurrency=DEFAULT_CONCURRENCY, log=None, **options):
+    """Run every endpoint through both stacks and return {case name: summary}"""
+    log = log or (lambda message: None)
+    results = {}
+    for name, wsgi_url, asgi_url in endpoint_pairs():
+        for stack, url, measure in (('wsgi', wsgi_url, measure_wsgi), ('asgi', asgi_url, measure_asgi)):
+            sequential_ms, burst_ms = measure(url, iterations, concurrency)
+            results[f'{stack}-{name}'] = summarize(sequential_ms)
+            results[f'{stack}-{name}-burst'] = _burst_summary(burst_ms, concurrency)
+            log(f"{stack}-{name:<18} p50 {results[f'{stack}-{name}']['p50_ms']:>9.2f}ms  "
+                f"burst of {concurrency}: {results[f'{stack}-{name}-burst']['requests_per_s']} req/s")
+    return results
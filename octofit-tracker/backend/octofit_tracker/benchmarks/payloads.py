@@ -0,0 +1,74 @@
+"""Response payload benchmark suite
+
+Renders one list page of activities and of leaderboard rows in each response
+format (JSON, columnar JSON and, when msgpack is installed, MessagePack) and
+compresses it with each installed coding. Each summary times rendering plus
+compression and reports the bytes that would go on the wire.
+"""
+import time
+from rest_framework.renderers import JSONRenderer
+from ..compression import CODECS, compress
+from ..models import Activity, Leaderboard
+from ..renderers import ColumnarJSONRenderer, MessagePackRenderer
+from ..serializers import FastActivitySerializer, FastLeaderboardSerializer
+from . import summarize
+
+PAGE_SIZE = 500
+
+
+def renderers():
+    """{format name: renderer} for every format available here"""
+    formats = {'json': JSONRenderer(), 'columnar': ColumnarJSONRenderer()}
+    try:
+        import msgpack  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        formats['msgpack'] = MessagePackRenderer()
+    return formats
+
+
+def pages(page_size=PAGE_SIZE):
+    """(dataset name, paginated response data) for one page of each list endpoint"""
+    activities = Activity.objects.select_related('user').order_by('-date', 'id')[:page_size]
+    leaderboard = Leaderboard.objects.order_by('rank', 'id')[:page_size]
+    return [
+        (name, {'next': None, 'previous': None, 'results': fast.to_representation(fast.values(queryset))})
+        for name, fast, queryset in [
+            ('activities', FastActivitySerializer(), activities),
+            ('leaderboard', FastLeaderboardSerializer(), leaderboard),
+        ]
+    ]
+
+
+def encode(renderer, encoding, data):
+    content = renderer.render(data)
+    if encoding != 'identity':
+        content = compress(encoding, content)
+    return content
+
+
+def measure(renderer, encoding, data, iterations):
+    """Time `iterations` encodes, after one untimed warm-up, and record the encoded size"""
+    size = len(encode(renderer, encoding, data))
+    timings_ms = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        encode(renderer, encoding, data)
+        timings_ms.append((time.perf_counter() - start) * 1000)
+    summary = summarize(timings_ms)
+    summary['bytes'] = size
+    return summary
+
+
+def run(iterations=20, log=None, **options):
+    """Run every dataset, format and coding and return {case name: summary}"""
+    log = log or (lambda message: None)
+    results = {}
+    for dataset, data in pages():
+        for format_name, renderer in renderers().items():
+            for encoding in ['identity', *CODECS]:
+                name = f'{dataset}-{format_name}-{encoding}'
+                results[name] = measure(renderer, encoding, data, iterations)
+                log(f"{name:<30} p50 {results[name]['p50_ms']:>8.2f}ms  {results[name]['bytes']:>9} bytes")
+    return results
@@ -0,0 +1,126 @@
+"""Leaderboard ranking benchmark suite
+
+Adds `rows` synthetic user rows to the leaderboard (one million by default)
+inside a transaction that is rolled back at the end, then measures:
+
+* full-python: the previous re-rank, which sorts every row in Python and
+  bulk updates the ranks that moved;
+* full-window: `rank_all`, a window function and one UPDATE ... FROM;
+* partial-ordinal and partial-competition: `rerank_entry` after one row's
+  points change, as an activity write does.
+
+Before each full re-rank CHANGED_ROWS random rows get new points, so every
+case has real work to do.
+"""
+import random
+import time
+from django.db import transaction
+from django.db.models import F, Max
+from ..models import Leaderboard
+from ..ranking import rank_all, rerank_entry
+from . import summarize
+
+DEFAULT_ROWS = 1_000_000
+CHANGED_ROWS = 100
+INSERT_BATCH_SIZE = 5000
+
+
+def python_assign_ranks(entity_type):
+    """The Python re-rank that `rank_all` replaced, kept for comparison"""
+    rows = Leaderboard.objects.filter(entity_type=entity_type).order_by(
+        '-total_points', 'entity_id'
+    ).values_list('id', 'rank')
+    moved = [
+        Leaderboard(id=pk, rank=rank)
+        for rank, (pk, current_rank) in enumerate(rows.iterator(), 1)
+        if current_rank != rank
+    ]
+    Leaderboard.objects.bulk_update(moved, ['rank'], batch_size=1000)
+    return len(moved)
+
+
+def add_rows(rng, count):
+    """Bulk insert `count` user rows with random points and return their entity ids"""
+    first = (Leaderboard.objects.filter(entity_type='user').aggregate(last=Max('entity_id'))['last'] or 0) + 1
+    entity_ids = range(first, first + count)
+    for start in range(0, count, INSERT_BATCH_SIZE):
+        Leaderboard.objects.bulk_create(
+            Leaderboard(
+                entity_id=entity_id, entity_type='user', name=f'Ranked {entity_id}',
+                total_points=rng.randint(0, 100_000),
+            )
+            for entity_id in entity_ids[start:start + INSERT_BATCH_SIZE]
+        )
+    return entity_ids
+
+
+def change_points(rng, entity_ids, count):
+    """Give `count` random rows new points and return (entity id, points change) pairs"""
+    changes = []
+    for entity_id in rng.sample(entity_ids, count):
+        change = rng.randint(-500, 500)
+        Leaderboard.objects.filter(entity_type='user', entity_id=entity_id).update(
+            total_points=F('total_points') + change
+        )
+        changes.append((entity_id, change))
+    return changes
+
+
+def _timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def measure_full(rng, entity_ids, rerank, iterations):
+    """Time full re-ranks after CHANGED_ROWS random point changes"""
+    timings_ms, moved = [], []
+    for _ in range(iterations):
+        change_points(rng, entity_ids, CHANGED_ROWS)
+        elapsed, count = _timed(rerank, 'user')
+        timings_ms.append(elapsed)
+        moved.append(count)
+    return timings_ms, moved
+
+
+def measure_partial(rng, entity_ids, mode, iterations):
+    """Time single-row re-ranks after one point change each"""
+    rank_all('user', mode)
+    timings_ms, moved = [], []
+    for _ in range(iterations):
+        [(entity_id, change)] = change_points(rng, entity_ids, 1)
+        elapsed, count = _timed(rerank_entry, 'user', entity_id, change, mode=mode)
+        timings_ms.append(elapsed)
+        moved.append(count)
+    return timings_ms, moved
+
+
+def _summary(timings_ms, moved):
+    summary = summarize(timings_ms)
+    summary['rows_moved'] = max(moved)
+    return summary
+
+
+def run(iterations=20, refresh_iterations=3, ranking_rows=DEFAULT_ROWS, log=None, **options):
+    """Run the ranking cases on an enlarged leaderboard and return {case name: summary}"""
+    log = log or (lambda message: None)
+    rng = random.Random(42)
+    results = {}
+    with transaction.atomic():
+        log(f'Adding {ranking_rows} leaderboard rows...')
+        entity_ids = add_rows(rng, ranking_rows)
+        rank_all('user', 'ordinal')
+        cases = [
+            ('full-python', lambda: measure_full(rng, entity_ids, python_assign_ranks, refresh_iterations)),
+            ('full-window', lambda: measure_full(
+                rng, entity_ids, lambda entity_type: rank_all(entity_type, 'ordinal'), refresh_iterations
+            )),
+            ('partial-ordinal', lambda: measure_partial(rng, entity_ids, 'ordinal', iterations)),
+            ('partial-competition', lambda: measure_partial(rng, entity_ids, 'competition', iterations)),
+        ]
+        for name, measure in cases:
+            results[name] = _summary(*measure())
+            log(f"{name:<22} p50 {results[name]['p50_ms']:>10.2f}ms  "
+                f"p95 {results[name]['p95_ms']:>10.2f}ms  up to {results[name]['rows_moved']} rows moved")
+        transaction.set_rollback(True)
+    return results
@@ -0,0 +1,63 @@
+"""Serializer throughput benchmark suite
+
+Serializes one list page of activities and leaderboard rows with the DRF
+ModelSerializers and with their FastReadSerializer counterparts, including the
+queries each path runs. Each summary also reports rows serialized per second.
+"""
+import time
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from ..models import Activity, Leaderboard
+from ..serializers import (
+    ActivitySerializer, LeaderboardSerializer, FastActivitySerializer, FastLeaderboardSerializer
+)
+from . import summarize
+
+PAGE_SIZE = 500
+
+
+def serializer_cases(page_size=PAGE_SIZE):
+    """(case name, callable) pairs, one ModelSerializer and one fast path per model"""
+    activities = Activity.objects.select_related('user').order_by('-date', 'id')[:page_size]
+    leaderboard = Leaderboard.objects.order_by('rank', 'id')[:page_size]
+    return [
+        ('activity-model', lambda: ActivitySerializer(activities.all(), many=True).data),
+        ('activity-fast', lambda: FastActivitySerializer().to_representation(
+            FastActivitySerializer().values(activities.all())
+        )),
+        ('leaderboard-model', lambda: LeaderboardSerializer(leaderboard.all(), many=True).data),
+        ('leaderboard-fast', lambda: FastLeaderboardSerializer().to_representation(
+            FastLeaderboardSerializer().values(leaderboard.all())
+        )),
+    ]
+
+
+def measure(serialize, iterations):
+    """Time `iterations` calls, after one untimed warm-up, and count their queries"""
+    rows = len(serialize())
+    timings_ms = []
+    query_counts = []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            serialize()
+            timings_ms.append((time.perf_counter() - start) * 1000)
+        query_counts.append(len(queries.captured_queries))
+    summary = summarize(timings_ms, query_counts)
+    summary['rows_per_s'] = round(rows / (summary['p50_ms'] / 1000)) if summary['p50_ms'] else None
+    return summary
+
+
+def run(iterations=20, log=None, **options):
+    """Run every serializer case and return {case name: summary}"""
+    log = log or (lambda message: None)
+    results = {}
+    for name, serialize in serializer_cases():
+        results[name] = measure(serialize, iterations)
+        log(f"{name:<22} p50 {results[name]['p50_ms']:>9.2f}ms  "
+            f"rows/s {results[name]['rows_per_s']}  queries {results[name]['queries']}")
+    for model in ('activity', 'leaderboard'):
+        slow, fast = results[f'{model}-model']['p50_ms'], results[f'{model}-fast']['p50_ms']
+        if fast:
+            log(f'{model} fast path speedup: {slow / fast:.1f}x')
+    return results
@@ -0,0 +1,192 @@
+"""SQLite write throughput benchmark suite
+
+Copies the seeded database into a temporary file (WAL needs a real file) and
+runs the same mixed workload against it once per database profile: `writers`
+threads each commit `iterations` activity writes, each inserting an activity
+and applying its delta to the daily rollup row like the post_save signal,
+while `readers` threads keep running user stats and leaderboard page queries.
+
+The default profile opens a connection per transaction and leaves SQLite's
+defaults (rollback journal, synchronous=FULL), like Django with CONN_MAX_AGE=0;
+the production profile keeps one connection per thread and applies its
+PRAGMAs once, like CONN_MAX_AGE with the connection_created hook. Writes that
+still fail with "database is locked" are counted, not retried.
+"""
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from django.db import connection
+from ..database import PROFILES, apply_pragmas
+from ..models import User
+from . import summarize
+
+DEFAULT_READERS = 4
+ACTIVITY_TYPES = ['running', 'cycling', 'swimming', 'walking']
+
+INSERT_ACTIVITY = (
+    'INSERT INTO activities (user_id, activity_type, duration, distance, calories, date, notes, '
+    "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, '', ?, ?)"
+)
+UPDATE_ROLLUP = (
+    'UPDATE daily_activity_rollups SET activity_count = activity_count + 1, '
+    'total_duration = total_duration + ?, total_calories = total_calories + ?, '
+    'total_distance = total_distance + ? WHERE user_id = ? AND day = ? AND activity_type = ?'
+)
+INSERT_ROLLUP = (
+    'INSERT INTO daily_activity_rollups (user_id, day, activity_type, activity_count, total_duration, '
+    'total_calories, total_distance) VALUES (?, ?, ?, 1, ?, ?, ?)'
+)
+USER_STATS = (
+    'SELECT SUM(activity_count), SUM(total_duration), SUM(total_calories) '
+    'FROM daily_activity_rollups WHERE user_id = ? AND day >= ?'
+)
+LEADERBOARD_PAGE = 'SELECT id, name, total_points, rank FROM leaderboard ORDER BY rank LIMIT 50'
+
+
+def copy_database(path):
+    """Copy the current SQLite database, including uncommitted test data, into `path`"""
+    connection.ensure_connection()
+    target = sqlite3.connect(path)
+    try:
+        connection.connection.backup(target)
+    finally:
+        target.close()
+
+
+class Workload:
+    """Connections for one profile: per transaction, or kept per thread"""
+
+    def __init__(self, path, pragmas, persistent):
+        self.path = path
+        self.pragmas = pragmas
+        self.persistent = persistent
+        self.local = threading.local()
+
+    def connect(self):
+        # Django opens SQLite connections in autocommit mode and begins transactions itself
+        db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        apply_pragmas(db, self.pragmas)
+        return db
+
+    def run(self, work):
+        if not self.persistent:
+            db = self.connect()
+            try:
+                return work(db)
+            finally:
+                db.close()
+        if getattr(self.local, 'db', None) is None:
+            self.local.db = self.connect()
+        return work(self.local.db)
+
+    def close(self):
+        if getattr(self.local, 'db', None) is not None:
+            self.local.db.close()
+            self.local.db = None
+
+
+def write_activity(db, user_id, rng):
+    """Insert one activity and apply it to its rollup row in one transaction"""
+    now = datetime.now(dt_timezone.utc)
+    date = now - timedelta(days=rng.randint(0, 6))
+    activity_type = rng.choice(ACTIVITY_TYPES)
+    duration, calories, distance = rng.randint(20, 120), rng.randint(100, 800), round(rng.uniform(1, 20), 2)
+    stamp = now.strftime('%Y-%m-%d %H:%M:%S.%f')
+    day = date.date().isoformat()
+    db.execute('BEGIN')
+    try:
+        db.execute(INSERT_ACTIVITY, (
+            user_id, activity_type, duration, distance, calories,
+            date.strftime('%Y-%m-%d %H:%M:%S.%f'), stamp, stamp,
+        ))
+        updated = db.execute(UPDATE_ROLLUP, (duration, calories, distance, user_id, day, activity_type))
+        if not updated.rowcount:
+            db.execute(INSERT_ROLLUP, (user_id, day, activity_type, duration, calories, distance))
+        db.execute('COMMIT')
+    except BaseException:
+        if db.in_transaction:
+            db.execute('ROLLBACK')
+        raise
+
+
+def read_dashboard(db, user_id):
+    """Run the stats and leaderboard reads a dashboard page makes"""
+    since = (datetime.now(dt_timezone.utc) - timedelta(days=7)).date().isoformat()
+    db.execute(USER_STATS, (user_id, since)).fetchall()
+    db.execute(LEADERBOARD_PAGE).fetchall()
+
+
+def measure_profile(path, profile, user_ids, iterations, writers, readers):
+    """Write latencies, wall time and locked-write count for one profile"""
+    workload = Workload(path, PROFILES[profile], persistent=profile != 'default')
+    write_ms, locked, lock = [], [0], threading.Lock()
+    writing = threading.Event()
+    writing.set()
+
+    def writer(number):
+        rng = random.Random(number)
+        try:
+            for _ in range(iterations):
+                start = time.perf_counter()
+                try:
+                    workload.run(lambda db: write_activity(db, rng.choice(user_ids), rng))
+                except sqlite3.OperationalError as error:
+                    if 'locked' not in str(error):
+                        raise
+                    with lock:
+                        locked[0] += 1
+                    continue
+                with lock:
+                    write_ms.append((time.perf_counter() - start) * 1000)
+        finally:
+            workload.close()
+
+    def reader(number):
+        rng = random.Random(-number)
+        try:
+            while writing.is_set():
+                try:
+                    workload.run(lambda db: read_dashboard(db, rng.choice(user_ids)))
+                except sqlite3.OperationalError as error:
+                    if 'locked' not in str(error):
+                        raise
+        finally:
+            workload.close()
+
+    reader_threads = [threading.Thread(target=reader, args=(number,)) for number in range(readers)]
+    writer_threads = [threading.Thread(target=writer, args=(number,)) for number in range(writers)]
+    for thread in reader_threads:
+        thread.start()
+    start = time.perf_counter()
+    for thread in writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    wall_s = time.perf_counter() - start
+    writing.clear()
+    for thread in reader_threads:
+        thread.join()
+    return write_ms, wall_s, locked[0]
+
+
+def run(iterations=20, concurrency=16, readers=DEFAULT_READERS, log=None, **options):
+    """Run the write workload under each profile and return {case name: summary}"""
+    log = log or (lambda message: None)
+    user_ids = list(User.objects.values_list('id', flat=True))
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in PROFILES:
+            path = Path(directory) / f'{profile}.sqlite3'
+            copy_database(path)
+            write_ms, wall_s, locked = measure_profile(path, profile, user_ids, iterations, concurrency, readers)
+            summary = summarize(write_ms or [0.0])
+            summary['writes_per_s'] = round(len(write_ms) / wall_s)
+            summary['locked'] = locked
+            results[f'{profile}-writes'] = summary
+            log(f"{profile:<12} {summary['writes_per_s']:>6} writes/s  p95 {summary['p95_ms']:>9.2f}ms  "
+                f"{locked} locked with {concurrency} writers and {readers} readers")
+    return results
@@ -0,0 +1,143 @@
+"""Response cache for read-heavy OctoFit Tracker endpoints
+
+Rendered GET responses are cached per namespace, path, query string and
+Accept header. Each namespace has a version number that is part of every key;
+writes bump the version, which orphans all cached entries for that namespace
+at once without having to enumerate keys. Orphaned entries expire on their own.
+
+The cache alias and timeout come from settings.RESPONSE_CACHE. The default
+local-memory backend only invalidates within one process; point the alias at a
+shared backend when running several workers.
+"""
+import hashlib
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+
+KEY_PREFIX = 'octofit:response'
+CACHED_HEADERS = ('Allow', 'Vary')
+
+
+def get_response_cache():
+    return caches[settings.RESPONSE_CACHE.get('ALIAS', 'default')]
+
+
+def is_process_local():
+    """Whether the response cache lives in this process, so other processes cannot invalidate it"""
+    return isinstance(get_response_cache(), LocMemCache)
+
+
+def _version_key(namespace):
+    return f'{KEY_PREFIX}:version:{namespace}'
+
+
+def namespace_version(namespace):
+    """Current version of `namespace`, starting at 1"""
+    return get_response_cache().get_or_set(_version_key(namespace), 1, timeout=None)
+
+
+def invalidate_responses(namespace):
+    """Drop every cached response in `namespace` by bumping its version; returns the new version"""
+    cache = get_response_cache()
+    try:
+        return cache.incr(_version_key(namespace))
+    except ValueError:
+        cache.set(_version_key(namespace), 2, timeout=None)
+        return 2
+
+
+def response_cache_key(namespace, request):
+    """Cache key for a GET request within the current namespace version"""
+    variant = '|'.join([
+        request.path,
+        request.META.get('QUERY_STRING', ''),
+        request.META.get('HTTP_ACCEPT', ''),
+    ])
+    digest = hashlib.sha256(variant.encode()).hexdigest()
+    return f'{KEY_PREFIX}:{namespace}:{namespace_version(namespace)}:{digest}'
+
+
+def cached_result(namespace, name, compute):
+    """`compute()`, cached like a response: under `namespace`'s current version, so writes drop it"""
+    cache = get_response_cache()
+    key = f'{KEY_PREFIX}:{namespace}:{namespace_version(namespace)}:result:{name}'
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, settings.RESPONSE_CACHE.get('TIMEOUT', 300))
+    return value
+
+
+def _etag_matches(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # Weak comparison, since CompressionMiddleware weakens the ETags it encodes
+    return etag.removeprefix('W/') in {tag.removeprefix('W/') for tag in parse_etags(if_none_match)}
+
+
+def cached_response(request, cached):
+    """Rebuild a response from a cache entry, or a 304 when the client's copy is current"""
+    if _etag_matches(request, cached['etag']):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(cached['content'], content_type=cached['content_type'])
+    for header, value in cached['headers'].items():
+        response[header] = value
+    response['ETag'] = cached['etag']
+    return response
+
+
+def cache_response(request, key, response):
+    """Store a rendered 200 response under `key` and return a response carrying its ETag"""
+    cached = {
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'etag': quote_etag(hashlib.md5(response.content).hexdigest()),
+        'headers': {header: response[header] for header in CACHED_HEADERS if header in response},
+    }
+    get_response_cache().set(key, cached, settings.RESPONSE_CACHE.get('TIMEOUT', 300))
+    if _etag_matches(request, cached['etag']):
+        return cached_response(request, cached)
+    response['ETag'] = cached['etag']
+    return response
+
+
+class CachedResponseMixin:
+    """ViewSet mixin that caches GET responses for `cached_actions`.
+
+    Successful unsafe requests through the viewset invalidate its namespace;
+    other writers call `invalidate_responses` directly.
+    """
+    cache_namespace = None
+    cached_actions = ('list', 'retrieve')
+
+    def is_cached(self, request, action):
+        """Whether this GET request's response is cached; by default, if `action` is in `cached_actions`"""
+        return action in self.cached_actions
+
+    def dispatch(self, request, *args, **kwargs):
+        method = request.method.lower()
+        action = getattr(self, 'action_map', {}).get(method)
+        if method != 'get' or not self.is_cached(request, action):
+            response = super().dispatch(request, *args, **kwargs)
+            if method not in ('get', 'head', 'options', 'trace') and response.status_code < 400:
+                invalidate_responses(self.cache_namespace)
+            return response
+
+        cache = get_response_cache()
+        key = response_cache_key(self.cache_namespace, request)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached_response(request, cached)
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code != 200 or getattr(response, 'streaming', False):
+            return response
+        if hasattr(response, 'render'):
+            response.render()
+        return cache_response(request, key, response)
@@ -0,0 +1,91 @@
+"""Response compression codecs for OctoFit Tracker
+
+gzip is always available. Brotli ('br', from the brotli package) and
+Zstandard ('zstd', from the zstandard package) are used when installed. Levels
+favour speed, since API responses are compressed on every request:
+
+* gzip level 6, the zlib default;
+* brotli quality 5, where it still beats gzip on size at a similar cost;
+* zstd level 3, the library default.
+
+`negotiate` picks the codec for an Accept-Encoding header. The server's
+preference order (settings.RESPONSE_COMPRESSION['ENCODINGS']) breaks ties
+between codings the client rates equally.
+"""
+import gzip
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+
+
+def _gzip(content):
+    # mtime=0 keeps the output, and so its ETag, stable
+    return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _brotli(content):
+    return brotli.compress(content, quality=BROTLI_QUALITY)
+
+
+def _zstd(content):
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(content)
+
+
+CODECS = {'gzip': _gzip}
+if brotli is not None:
+    CODECS['br'] = _brotli
+if zstandard is not None:
+    CODECS['zstd'] = _zstd
+
+
+def enabled_encodings():
+    """Configured codings that are installed, in server preference order"""
+    configured = settings.RESPONSE_COMPRESSION.get('ENCODINGS', ['br', 'zstd', 'gzip'])
+    return [encoding for encoding in configured if encoding in CODECS]
+
+
+def parse_accept_encoding(header):
+    """{coding: q} from an Accept-Encoding header"""
+    weights = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.lower()] = weight
+    return weights
+
+
+def negotiate(header, encodings=None):
+    """The coding to use for an Accept-Encoding header, or None to send the body as is"""
+    encodings = enabled_encodings() if encodings is None else encodings
+    weights = parse_accept_encoding(header or '')
+    best, best_weight = None, 0.0
+    for encoding in encodings:
+        weight = weights.get(encoding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress(encoding, content):
+    return CODECS[encoding](content)
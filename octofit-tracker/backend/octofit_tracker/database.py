@@ -0,0 +1,55 @@
+"""SQLite connection tuning for OctoFit Tracker
+
+Select a profile with OCTOFIT_DB_PROFILE. The 'production' profile keeps
+connections open between requests (see settings.py) and runs these PRAGMAs on
+every new SQLite connection:
+
+* journal_mode=WAL lets readers keep reading while a write commits, and a
+  commit becomes an append to the write-ahead log;
+* synchronous=NORMAL syncs the log at checkpoints instead of on every commit
+  (a power cut can lose the last commits but cannot corrupt the database);
+* busy_timeout waits for a competing writer's lock instead of failing;
+* cache_size and mmap_size keep hot pages in memory and read the file through
+  a memory map.
+
+SQLite stores journal_mode in the database file, so once a connection has
+switched a file to WAL it stays in WAL for every later connection.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+PROFILES = {
+    'default': {},
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        # Negative sizes are in KiB: 64 MiB of page cache per connection
+        'cache_size': -64 * 1024,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+}
+
+
+def profile_pragmas(profile):
+    """PRAGMA settings for a database profile name"""
+    try:
+        return PROFILES[profile]
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"Unknown database profile {profile!r}; expected one of {', '.join(sorted(PROFILES))}"
+        )
+
+
+def apply_pragmas(connection, pragmas):
+    """Run `PRAGMA name = value` for each item on a DB-API sqlite3 connection"""
+    for name, value in pragmas.items():
+        connection.execute(f'PRAGMA {name} = {value}')
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Apply the configured profile's PRAGMAs to each new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    apply_pragmas(connection.connection, profile_pragmas(getattr(settings, 'DATABASE_PROFILE', 'default')))
@@ -0,0 +1,54 @@
+"""Streaming activity exports for OctoFit Tracker
+
+Rows are read with a chunked server-side iterator over `.values()` and encoded
+one at a time, so memory use does not depend on how many rows are exported.
+"""
+import csv
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import StreamingHttpResponse
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FIELDS = ['id', 'user_id', 'user_name', 'activity_type', 'duration', 'distance',
+                 'calories', 'date', 'notes', 'created_at', 'updated_at']
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class Echo:
+    """File-like object whose write() returns the value instead of buffering it"""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(activities):
+    """Iterate activity dicts in EXPORT_FIELDS order without loading the queryset"""
+    rows = activities.annotate(user_name=F('user__username')).values(*EXPORT_FIELDS)
+    return rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def iter_ndjson(rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(row) + '\n'
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow([row[field] for field in EXPORT_FIELDS])
+
+
+def stream_activities(activities, export_format):
+    """Build a StreamingHttpResponse for `activities` in `export_format`"""
+    encode = iter_csv if export_format == 'csv' else iter_ndjson
+    response = StreamingHttpResponse(
+        encode(export_rows(activities)),
+        content_type=EXPORT_FORMATS[export_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="activities.{export_format}"'
+    return response
@@ -0,0 +1,67 @@
+"""Bulk activity ingestion for OctoFit Tracker
+
+Items are validated in a single pass with one serializer instance, unknown
+users are detected with one query rather than one lookup per item, and valid
+rows are written with bulk_create in batches. bulk_create skips model
+signals, so daily rollups, leaderboard totals and recommendations are updated
+here directly.
+"""
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from .leaderboard import apply_activity_changes
+from .models import User, Activity
+from .recommendations import schedule_refresh
+from .rollups import add_activities
+from .serializers import ActivitySerializer
+
+DEFAULT_BATCH_SIZE = 500
+MAX_BATCH_SIZE = 5000
+
+
+class ActivityIngestSerializer(ActivitySerializer):
+    """ActivitySerializer that leaves checking user_id to validate_activities"""
+    user_id = serializers.IntegerField()
+
+
+def validate_activities(items):
+    """Validate raw activity dicts, returning (valid [(index, data)], errors [{index, errors}])"""
+    serializer = ActivityIngestSerializer()
+    valid = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, serializer.run_validation(item)))
+        except ValidationError as exc:
+            errors.append({'index': index, 'errors': exc.detail})
+
+    user_ids = {data['user_id'] for _, data in valid}
+    known = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+    unknown = [(index, data) for index, data in valid if data['user_id'] not in known]
+    for index, data in unknown:
+        errors.append({'index': index, 'errors': {'user_id': [f"User {data['user_id']} does not exist."]}})
+    if unknown:
+        valid = [(index, data) for index, data in valid if data['user_id'] in known]
+        errors.sort(key=lambda error: error['index'])
+    return valid, errors
+
+
+def ingest_activities(items, batch_size=DEFAULT_BATCH_SIZE):
+    """Validate and bulk insert activities.
+
+    Returns a dict with the number of rows created, per-item errors and the
+    sorted ids of the users that received new activities.
+    """
+    valid, errors = validate_activities(items)
+    activities = [Activity(**data) for _, data in valid]
+    with transaction.atomic():
+        Activity.objects.bulk_create(activities, batch_size=batch_size)
+        add_activities(activities)
+        if activities:
+            apply_activity_changes([(activity, 1) for activity in activities])
+        schedule_refresh({activity.user_id for activity in activities})
+    return {
+        'created': len(activities),
+        'errors': errors,
+        'user_ids': sorted({activity.user_id for activity in activities}),
+    }
@@ -0,0 +1,121 @@
+"""Background leaderboard refresh jobs for OctoFit Tracker
+
+Refresh requests are stored as LeaderboardJob rows and run by the
+leaderboard_worker management command, one at a time. A partial unique
+constraint allows at most one queued and one running job, so:
+
+* requests that arrive while a job is queued are coalesced into it (a full
+  request upgrades a queued incremental job to full);
+* a request that arrives while a job is running queues exactly one follow-up
+  job, which picks up whatever the running job missed;
+* two workers can never run recomputations at the same time.
+
+Between jobs the worker also rescores one batch of users whose stored
+workout recommendations are stale (see recommendations.py), so neither
+reads nor catalogue edits do that work.
+
+The worker invalidates cached leaderboard responses from its own process, so
+it needs a response cache shared with the API processes; the command refuses
+to start on the per-process local-memory cache unless told to.
+"""
+import time
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .leaderboard import refresh_leaderboard
+from .models import LeaderboardJob
+from .recommendations import refresh_stale_recommendations
+
+# A running job older than this is assumed to belong to a dead worker
+STALE_AFTER_SECONDS = 60 * 60
+
+
+def enqueue_refresh(incremental=False):
+    """Queue a refresh, or fold the request into the job that is already queued"""
+    mode = 'incremental' if incremental else 'full'
+    while True:
+        queued = LeaderboardJob.objects.filter(status='queued')
+        job = queued.first()
+        if job is None:
+            try:
+                with transaction.atomic():
+                    return LeaderboardJob.objects.create(mode=mode)
+            except IntegrityError:
+                # Another request queued a job first; coalesce into it
+                continue
+        changes = {'request_count': F('request_count') + 1}
+        if mode == 'full':
+            changes['mode'] = 'full'
+        if queued.filter(pk=job.pk).update(**changes):
+            job.refresh_from_db()
+            return job
+        # The job was claimed by a worker in the meantime; queue a new one
+
+
+def claim_next_job():
+    """Mark the queued job as running and return it, or None if there is nothing to run"""
+    job = LeaderboardJob.objects.filter(status='queued').first()
+    if job is None:
+        return None
+    try:
+        with transaction.atomic():
+            claimed = LeaderboardJob.objects.filter(pk=job.pk, status='queued').update(
+                status='running', started_at=timezone.now()
+            )
+    except IntegrityError:
+        # Another job is still running
+        return None
+    if not claimed:
+        return None
+    job.refresh_from_db()
+    return job
+
+
+def run_job(job):
+    """Run a claimed job and record its outcome"""
+    try:
+        run = refresh_leaderboard(incremental=job.mode == 'incremental')
+    except Exception as error:
+        job.status = 'failed'
+        job.error = f'{type(error).__name__}: {error}'
+    else:
+        job.status = 'succeeded'
+        job.users_updated = run.users_updated
+        job.teams_updated = run.teams_updated
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'users_updated', 'teams_updated', 'finished_at'])
+    return job
+
+
+def recover_stale_jobs(stale_after=STALE_AFTER_SECONDS):
+    """Fail running jobs whose worker has evidently died, freeing the running slot"""
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    return LeaderboardJob.objects.filter(status='running', started_at__lt=cutoff).update(
+        status='failed', finished_at=timezone.now(), error='Worker stopped before the job finished'
+    )
+
+
+def run_pending_jobs():
+    """Run jobs until the queue is empty and return the jobs that ran"""
+    finished = []
+    job = claim_next_job()
+    while job is not None:
+        finished.append(run_job(job))
+        job = claim_next_job()
+    return finished
+
+
+def work(poll_interval=1.0, stale_after=STALE_AFTER_SECONDS, log_job=None, should_stop=None):
+    """Poll for and run jobs until `should_stop()` returns true, passing each finished job to `log_job`.
+
+    Each poll also rescores one batch of users with stale recommendations.
+    """
+    log_job = log_job or (lambda job: None)
+    should_stop = should_stop or (lambda: False)
+    while not should_stop():
+        recover_stale_jobs(stale_after)
+        for job in run_pending_jobs():
+            log_job(job)
+        if not refresh_stale_recommendations():
+            time.sleep(poll_interval)
@@ -0,0 +1,523 @@
+"""Leaderboard computation for OctoFit Tracker
+
+Totals are computed with grouped queries (or MongoDB aggregation pipelines,
+see mongo.py) and written with a bulk upsert, so a refresh costs a handful of
+queries regardless of how many users and teams exist.
+
+Between refreshes, activity writes add their deltas to the user's and team's
+rows in the writing transaction (see signals.py), and to the stored week and
+month snapshots covering the activity's day. `find_drift` compares those
+running totals with a full recompute.
+"""
+from collections import defaultdict
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+from .models import (
+    User, Team, Activity, DailyActivityRollup, Leaderboard, LeaderboardRefresh, LeaderboardSnapshot
+)
+from . import mongo
+from .caching import cached_result, invalidate_responses
+from .periods import PERIODS, filter_window, period_window
+from .ranking import rank_all, rank_rows, ranks_for, rerank_entry, rerank_row
+from .rollups import rollup_key
+from .standings import bump_table_version, sync_entries
+
+POINTS_PER_ACTIVITY = 10
+BATCH_SIZE = 1000
+
+UPSERT_FIELDS = ['name', 'total_points', 'total_activities', 'total_calories', 'total_duration', 'updated_at']
+
+
+def calculate_points(total_activities, total_calories):
+    """Points awarded for a number of activities and calories burned"""
+    return total_activities * POINTS_PER_ACTIVITY + total_calories
+
+
+def _aggregate(activities, group_by):
+    """Return {group value: totals} for a grouped activity queryset"""
+    rows = activities.order_by().values(group_by).annotate(
+        total_activities=Count('id'),
+        total_duration=Sum('duration'),
+        total_calories=Sum('calories')
+    )
+    return {row[group_by]: row for row in rows}
+
+
+def _build_entry(entity_type, entity_id, name, totals):
+    """Build an unsaved Leaderboard row from aggregated totals"""
+    totals = totals or {}
+    total_activities = totals.get('total_activities') or 0
+    total_calories = totals.get('total_calories') or 0
+    return Leaderboard(
+        entity_id=entity_id,
+        entity_type=entity_type,
+        name=name,
+        total_points=calculate_points(total_activities, total_calories),
+        total_activities=total_activities,
+        total_calories=total_calories,
+        total_duration=totals.get('total_duration') or 0,
+    )
+
+
+def compute_user_entries(user_ids=None):
+    """Leaderboard rows for all users, or only for `user_ids` (ids or a values queryset)"""
+    users = User.objects.all()
+    activities = Activity.objects.all()
+    if user_ids is not None:
+        users = users.filter(id__in=user_ids)
+        activities = activities.filter(user_id__in=user_ids)
+
+    if mongo.enabled():
+        totals = mongo.user_totals(mongo.get_database(), user_ids)
+    else:
+        totals = _aggregate(activities, 'user_id')
+    return [
+        _build_entry('user', user_id, username, totals.get(user_id))
+        for user_id, username in users.values_list('id', 'username')
+    ]
+
+
+def compute_team_entries(team_ids=None):
+    """Leaderboard rows for all teams, or only for `team_ids` (ids or a values queryset)"""
+    teams = Team.objects.all()
+    activities = Activity.objects.filter(user__team__isnull=False)
+    if team_ids is not None:
+        teams = teams.filter(id__in=team_ids)
+        activities = activities.filter(user__team__in=team_ids)
+
+    if mongo.enabled():
+        totals = mongo.team_totals(mongo.get_database(), team_ids)
+    else:
+        totals = _aggregate(activities, 'user__team_id')
+    return [
+        _build_entry('team', team_id, name, totals.get(team_id))
+        for team_id, name in teams.values_list('id', 'name')
+    ]
+
+
+def changed_user_ids(since):
+    """Users whose activities or profile changed at or after `since`"""
+    return User.objects.filter(
+        Q(id__in=Activity.objects.filter(updated_at__gte=since).values('user_id')) |
+        Q(updated_at__gte=since)
+    ).values('id')
+
+
+def changed_team_ids(since, user_ids):
+    """Teams that were renamed at or after `since` or contain one of `user_ids`"""
+    return Team.objects.filter(
+        Q(id__in=User.objects.filter(id__in=user_ids).values('team_id')) |
+        Q(updated_at__gte=since)
+    ).values('id')
+
+
+def upsert_entries(entries):
+    """Insert or update Leaderboard rows keyed on (entity_type, entity_id)"""
+    Leaderboard.objects.bulk_create(
+        entries,
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['entity_type', 'entity_id'],
+        update_fields=UPSERT_FIELDS,
+    )
+
+
+def prune_entries():
+    """Delete rows whose user or team no longer exists"""
+    Leaderboard.objects.filter(entity_type='user').exclude(entity_id__in=User.objects.values('id')).delete()
+    Leaderboard.objects.filter(entity_type='team').exclude(entity_id__in=Team.objects.values('id')).delete()
+
+
+def _aggregate_rollups(rollups, group_by):
+    """Return {group value: totals} for a grouped rollup queryset"""
+    rows = rollups.order_by().values(group_by).annotate(
+        total_activities=Sum('activity_count'),
+        total_duration=Sum('total_duration'),
+        total_calories=Sum('total_calories')
+    )
+    return {row[group_by]: row for row in rows}
+
+
+def _ranked_snapshot_rows(entity_type, totals, names, start, end):
+    """Build ranked, unsaved LeaderboardSnapshot rows for one entity type"""
+    entries = [
+        _build_entry(entity_type, entity_id, names.get(entity_id, ''), entity_totals)
+        for entity_id, entity_totals in totals.items()
+        if entity_id is not None
+    ]
+    entries.sort(key=lambda entry: (-entry.total_points, entry.entity_id))
+    ranks = ranks_for([entry.total_points for entry in entries])
+    return [
+        LeaderboardSnapshot(
+            period_start=start, period_end=end, rank=rank,
+            **{field: getattr(entry, field) for field in (
+                'entity_id', 'entity_type', 'name', 'total_points',
+                'total_activities', 'total_calories', 'total_duration'
+            )}
+        )
+        for rank, entry in zip(ranks, entries)
+    ]
+
+
+def snapshot_rows(start, end):
+    """Ranked, unsaved snapshot rows for the [start, end) day window, from daily rollups.
+
+    Only users and teams with activity in the window get a row.
+    """
+    rollups = filter_window(DailyActivityRollup.objects.all(), (start, end))
+    user_totals = _aggregate_rollups(rollups, 'user_id')
+    member_team = User.objects.filter(id=OuterRef('user_id')).values('team_id')[:1]
+    team_totals = _aggregate_rollups(rollups.annotate(team_id=Subquery(member_team)), 'team_id')
+
+    user_names = dict(User.objects.filter(id__in=rollups.values('user_id')).values_list('id', 'username'))
+    team_names = dict(Team.objects.filter(id__in=list(team_totals)).values_list('id', 'name'))
+    return (
+        _ranked_snapshot_rows('user', user_totals, user_names, start, end) +
+        _ranked_snapshot_rows('team', team_totals, team_names, start, end)
+    )
+
+
+def materialize_period(start, end):
+    """Rebuild the stored snapshot for the [start, end) day window"""
+    rows = snapshot_rows(start, end)
+    with transaction.atomic():
+        LeaderboardSnapshot.objects.filter(period_start=start, period_end=end).delete()
+        LeaderboardSnapshot.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def is_stored_period(start, end):
+    """Whether the window's snapshot is stored; only the current week and month are"""
+    return (start, end) in [period_window(period) for period in PERIODS]
+
+
+def period_snapshot(start, end):
+    """Stored snapshot rows for the current week or month, materializing them on first use"""
+    rows = LeaderboardSnapshot.objects.filter(period_start=start, period_end=end)
+    if not rows.exists():
+        try:
+            materialize_period(start, end)
+        except IntegrityError:
+            # A concurrent first read stored the same rows
+            pass
+    return rows
+
+
+def window_snapshot(start, end, entity_type=None):
+    """Snapshot rows for any other window as `.values()`-style dicts in rank order, without storing them.
+
+    The rows are computed once per window and kept in the response cache
+    until the next leaderboard write.
+    """
+    def compute():
+        now = timezone.now()
+        fields = [field.attname for field in LeaderboardSnapshot._meta.concrete_fields]
+        rows = []
+        for row in snapshot_rows(start, end):
+            row.updated_at = now
+            rows.append({field: getattr(row, field) for field in fields})
+        rows.sort(key=lambda row: (row['rank'], row['entity_type'], row['entity_id']))
+        return rows
+
+    rows = cached_result('leaderboard', f'window:{start}:{end}', compute)
+    return [row for row in rows if entity_type is None or row['entity_type'] == entity_type]
+
+
+def _add_to_entry(entity_type, entity_id, name, activities, duration, calories):
+    """Add totals to one row, creating it when it is missing, and move it to its new rank"""
+    points = calculate_points(activities, calories)
+    rows = Leaderboard.objects.filter(entity_type=entity_type, entity_id=entity_id)
+    changes = {
+        'total_points': F('total_points') + points,
+        'total_activities': F('total_activities') + activities,
+        'total_calories': F('total_calories') + calories,
+        'total_duration': F('total_duration') + duration,
+        'updated_at': timezone.now(),
+    }
+    if rows.update(**changes):
+        if points:
+            rerank_entry(entity_type, entity_id, points)
+        return
+    if activities <= 0:
+        return
+    entry = _build_entry(entity_type, entity_id, name, {
+        'total_activities': activities, 'total_duration': duration, 'total_calories': calories,
+    })
+    entry.rank = Leaderboard.objects.filter(entity_type=entity_type).count() + 1
+    try:
+        # bulk_create sends no post_save, so sync_entries does the only cache invalidation
+        with transaction.atomic():
+            Leaderboard.objects.bulk_create([entry])
+    except IntegrityError:
+        # Another writer created the row first
+        rows.update(**changes)
+        rerank_entry(entity_type, entity_id, points)
+    else:
+        rerank_entry(entity_type, entity_id)
+
+
+def apply_deltas(user_deltas):
+    """Add {user_id: (activities, duration, calories)} to the users' rows and their current teams' rows.
+
+    Negative values remove totals. Rows that do not exist yet are created.
+    Each changed row is moved to its new rank with a partial re-rank, and
+    the in-memory standings pick the rows up once the transaction commits.
+    """
+    team_deltas = defaultdict(lambda: [0, 0, 0])
+    team_names = {}
+    users = User.objects.filter(id__in=list(user_deltas)).values_list('id', 'username', 'team_id', 'team__name')
+    with transaction.atomic():
+        for user_id, username, team_id, team_name in users:
+            delta = user_deltas[user_id]
+            _add_to_entry('user', user_id, username, *delta)
+            if team_id is not None:
+                team_names[team_id] = team_name
+                team_deltas[team_id] = [total + change for total, change in zip(team_deltas[team_id], delta)]
+        for team_id, delta in team_deltas.items():
+            _add_to_entry('team', team_id, team_names[team_id], *delta)
+        sync_entries(
+            [('user', user_id) for user_id in user_deltas] + [('team', team_id) for team_id in team_deltas]
+        )
+
+
+def _add_to_snapshot(start, end, entity_type, entity_id, name, activities, duration, calories):
+    """Add totals to one row of a stored snapshot and move it to its new rank.
+
+    A missing row is created. A row left without activities is deleted, as a
+    rebuild would leave it out, and the rows below it move up.
+    """
+    points = calculate_points(activities, calories)
+    rows = LeaderboardSnapshot.objects.filter(period_start=start, period_end=end, entity_type=entity_type)
+    entry = rows.filter(entity_id=entity_id)
+    changes = {
+        'total_points': F('total_points') + points,
+        'total_activities': F('total_activities') + activities,
+        'total_calories': F('total_calories') + calories,
+        'total_duration': F('total_duration') + duration,
+        'updated_at': timezone.now(),
+    }
+    if entry.update(**changes):
+        if entry.filter(total_activities__lte=0).delete()[0]:
+            rank_rows(rows)
+        elif points:
+            rerank_row(rows, entity_id, points)
+        return
+    if activities <= 0:
+        return
+    row = LeaderboardSnapshot(
+        period_start=start, period_end=end, entity_type=entity_type, entity_id=entity_id, name=name,
+        total_points=points, total_activities=activities, total_calories=calories, total_duration=duration,
+        rank=rows.count() + 1,
+    )
+    try:
+        with transaction.atomic():
+            LeaderboardSnapshot.objects.bulk_create([row])
+    except IntegrityError:
+        # Another writer created the row first
+        entry.update(**changes)
+        rerank_row(rows, entity_id, points)
+    else:
+        rerank_row(rows, entity_id)
+
+
+def apply_snapshot_deltas(day_deltas):
+    """Add {(user_id, day): (activities, duration, calories)} to the stored week and month snapshots.
+
+    Only snapshots that have been materialized are touched; the others are
+    built from rollups on their first read. Teams are credited to the user's
+    current team, as `snapshot_rows` does.
+    """
+    windows = [
+        window for window in (period_window(period) for period in PERIODS)
+        if LeaderboardSnapshot.objects.filter(period_start=window[0], period_end=window[1]).exists()
+    ]
+    if not windows:
+        return
+    users = {
+        user_id: (username, team_id, team_name)
+        for user_id, username, team_id, team_name in User.objects.filter(
+            id__in={user_id for user_id, day in day_deltas}
+        ).values_list('id', 'username', 'team_id', 'team__name')
+    }
+    for start, end in windows:
+        entity_deltas = defaultdict(lambda: [0, 0, 0])
+        names = {}
+        for (user_id, day), delta in day_deltas.items():
+            if user_id not in users or not start <= day < end:
+                continue
+            username, team_id, team_name = users[user_id]
+            keys = [('user', user_id, username)]
+            if team_id is not None:
+                keys.append(('team', team_id, team_name))
+            for entity_type, entity_id, name in keys:
+                names[entity_type, entity_id] = name
+                entity_deltas[entity_type, entity_id] = [
+                    total + change for total, change in zip(entity_deltas[entity_type, entity_id], delta)
+                ]
+        for (entity_type, entity_id), delta in entity_deltas.items():
+            if any(delta):
+                _add_to_snapshot(start, end, entity_type, entity_id, names[entity_type, entity_id], *delta)
+
+
+def apply_day_deltas(day_deltas):
+    """Add {(user_id, day): (activities, duration, calories)} to the leaderboard and the stored snapshots"""
+    user_deltas = defaultdict(lambda: [0, 0, 0])
+    for (user_id, day), delta in day_deltas.items():
+        user_deltas[user_id] = [total + change for total, change in zip(user_deltas[user_id], delta)]
+    user_deltas = {user_id: delta for user_id, delta in user_deltas.items() if any(delta)}
+    with transaction.atomic():
+        if user_deltas:
+            apply_deltas(user_deltas)
+        if any(any(delta) for delta in day_deltas.values()):
+            apply_snapshot_deltas(day_deltas)
+            if not user_deltas:
+                # An activity moved between days; nothing else drops the cached snapshot responses
+                transaction.on_commit(lambda: invalidate_responses('leaderboard'))
+
+
+def apply_activity_changes(changes):
+    """Apply [(activity, sign)] to the leaderboard and to the stored snapshots covering their days"""
+    day_deltas = defaultdict(lambda: [0, 0, 0])
+    for activity, sign in changes:
+        delta = day_deltas[activity.user_id, rollup_key(activity.user_id, activity.date, activity.activity_type)[1]]
+        delta[0] += sign
+        delta[1] += sign * activity.duration
+        delta[2] += sign * activity.calories
+    apply_day_deltas(day_deltas)
+
+
+def remove_user_totals(user_id):
+    """Take all of a user's activities off the leaderboard and the stored snapshots in one pass.
+
+    The totals come from the user's rollup rows, so this costs the same few
+    queries however many activities the user has.
+    """
+    rollups = DailyActivityRollup.objects.filter(user_id=user_id).order_by().values('day').annotate(
+        activities=Sum('activity_count'), duration=Sum('total_duration'), calories=Sum('total_calories')
+    )
+    apply_day_deltas({
+        (user_id, row['day']): [-row['activities'], -row['duration'], -row['calories']] for row in rollups
+    })
+
+
+def move_member_totals(user_id, old_team_id, new_team_id):
+    """Move a user's activity totals from one team's row to another's (either may be None)"""
+    if old_team_id == new_team_id:
+        return
+    totals = Activity.objects.filter(user_id=user_id).aggregate(
+        activities=Count('id'), duration=Sum('duration'), calories=Sum('calories')
+    )
+    if not totals['activities']:
+        return
+    delta = (totals['activities'], totals['duration'], totals['calories'])
+    names = dict(Team.objects.filter(id__in=[old_team_id, new_team_id]).values_list('id', 'name'))
+    with transaction.atomic():
+        if old_team_id in names:
+            _add_to_entry('team', old_team_id, names[old_team_id], *(-value for value in delta))
+        if new_team_id in names:
+            _add_to_entry('team', new_team_id, names[new_team_id], *delta)
+        sync_entries(('team', team_id) for team_id in names)
+
+
+def find_drift():
+    """Compare stored totals with a full recompute.
+
+    Returns [(entity_type, entity_id, stored, expected)] where each side is
+    (points, activities, calories, duration); a missing row counts as zeros.
+    """
+    zeros = (0, 0, 0, 0)
+    expected = {
+        (entry.entity_type, entry.entity_id): (
+            entry.total_points, entry.total_activities, entry.total_calories, entry.total_duration
+        )
+        for entry in compute_user_entries() + compute_team_entries()
+    }
+    stored = {
+        (entity_type, entity_id): totals
+        for entity_type, entity_id, *totals in Leaderboard.objects.values_list(
+            'entity_type', 'entity_id', 'total_points', 'total_activities', 'total_calories', 'total_duration'
+        )
+    }
+    drift = []
+    for key in sorted(expected.keys() | stored.keys()):
+        stored_totals = tuple(stored.get(key, zeros))
+        expected_totals = expected.get(key, zeros)
+        if stored_totals != expected_totals:
+            drift.append((*key, stored_totals, expected_totals))
+    return drift
+
+
+def invalidate_leaderboard_responses():
+    """Count a rewrite of the table now and drop cached leaderboard responses once the transaction commits"""
+    bump_table_version()
+    transaction.on_commit(lambda: invalidate_responses('leaderboard'))
+
+
+def refresh_periods():
+    """Rebuild the current week and month snapshots and drop all others.
+
+    Dropped windows, such as last week's, are computed on read without being stored.
+    """
+    windows = [period_window(period) for period in PERIODS]
+    with transaction.atomic():
+        stale = LeaderboardSnapshot.objects.all()
+        for start, end in windows:
+            stale = stale.exclude(period_start=start, period_end=end)
+        stale.delete()
+        for start, end in windows:
+            materialize_period(start, end)
+
+
+def refresh_users(user_ids):
+    """Recompute rows for `user_ids` and their current teams, then re-rank"""
+    with transaction.atomic():
+        user_entries = compute_user_entries(user_ids)
+        team_entries = compute_team_entries(
+            User.objects.filter(id__in=user_ids, team_id__isnull=False).values('team_id')
+        )
+        upsert_entries(user_entries + team_entries)
+        rank_all('user')
+        rank_all('team')
+        refresh_periods()
+        invalidate_leaderboard_responses()
+    return len(user_entries), len(team_entries)
+
+
+def refresh_leaderboard(incremental=False):
+    """Recompute the leaderboard in a single transaction.
+
+    A full refresh recomputes every user and team. An incremental refresh only
+    recomputes users whose activities or profile changed since the last run and
+    the teams they belong to; it falls back to a full refresh when there is no
+    previous run. Deleted activities and a user's previous team are only
+    corrected by a full refresh. Current week and month snapshots are rebuilt
+    in both modes. Returns the LeaderboardRefresh record for this run.
+    """
+    started_at = timezone.now()
+    previous = LeaderboardRefresh.objects.first() if incremental else None
+
+    with transaction.atomic():
+        if previous is None:
+            mode = 'full'
+            user_entries = compute_user_entries()
+            team_entries = compute_team_entries()
+        else:
+            mode = 'incremental'
+            user_ids = changed_user_ids(previous.started_at)
+            user_entries = compute_user_entries(user_ids)
+            team_entries = compute_team_entries(changed_team_ids(previous.started_at, user_ids))
+
+        prune_entries()
+        upsert_entries(user_entries + team_entries)
+        rank_all('user')
+        rank_all('team')
+        refresh_periods()
+        invalidate_leaderboard_responses()
+
+        return LeaderboardRefresh.objects.create(
+            mode=mode,
+            started_at=started_at,
+            users_updated=len(user_entries),
+            teams_updated=len(team_entries),
+        )
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from octofit_tracker import benchmarks
+from octofit_tracker.benchmarks import api, concurrency, payloads, ranking, serializers, writes
+from octofit_tracker.synthetic import generate_dataset
+
+SUITES = {
+    'api': api,
+    'asgi': concurrency,
+    'payloads': payloads,
+    'ranking': ranking,
+    'serializers': serializers,
+    'writes': writes,
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the API against a seeded throwaway SQLite database and compare with baselines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', choices=sorted(benchmarks.PROFILES), default='small',
+                            help='Dataset size to seed (small=1k, medium=100k, large=1M activities)')
+        parser.add_argument('--suite', choices=sorted(SUITES), action='append',
+                            help='Suite to run (repeatable, default: all)')
+        parser.add_argument('--iterations', type=int, default=20, help='Requests per case')
+        parser.add_argument('--refresh-iterations', type=int, default=3,
+                            help='Requests for the leaderboard refresh case')
+        parser.add_argument('--concurrency', type=int, default=concurrency.DEFAULT_CONCURRENCY,
+                            help='Simultaneous requests per burst (asgi suite) or writer threads (writes suite)')
+        parser.add_argument('--ranking-rows', type=int, default=ranking.DEFAULT_ROWS,
+                            help='Extra leaderboard rows for the ranking suite')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the dataset')
+        parser.add_argument('--tolerance', type=float, default=1.0,
+                            help='Allowed p95 growth over baseline as a fraction')
+        parser.add_argument('--update-baselines', action='store_true',
+                            help='Store these results as the new baselines instead of comparing')
+
+    def handle(self, *args, **options):
+        profile = options['profile']
+        suites = options['suite'] or sorted(SUITES)
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(f'Seeding {profile} dataset...')
+            generate_dataset(seed=options['seed'], **benchmarks.PROFILES[profile])
+            results = {}
+            for suite in suites:
+                self.stdout.write(self.style.MIGRATE_HEADING(f'Suite: {suite}'))
+                suite_results = SUITES[suite].run(
+                    iterations=options['iterations'],
+                    refresh_iterations=options['refresh_iterations'],
+                    concurrency=options['concurrency'],
+                    ranking_rows=options['ranking_rows'],
+                    log=self.stdout.write,
+                )
+                results.update({f'{suite}:{case}': summary for case, summary in suite_results.items()})
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        baselines = benchmarks.load_baselines()
+        if options['update_baselines']:
+            baselines.setdefault(profile, {}).update(results)
+            benchmarks.save_baselines(baselines)
+            self.stdout.write(self.style.SUCCESS(f'Baselines for {profile} updated'))
+            return
+
+        regressions = benchmarks.find_regressions(results, baselines.get(profile, {}), options['tolerance'])
+        if regressions:
+            raise CommandError('Benchmark regressions:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions against baselines'))
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from octofit_tracker.caching import is_process_local
+from octofit_tracker.jobs import STALE_AFTER_SECONDS, recover_stale_jobs, run_pending_jobs, work
+from octofit_tracker.recommendations import refresh_stale_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Run queued leaderboard refresh jobs, one at a time, and rescore stale workout recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Run the jobs that are queued now and rescore stale recommendations, then exit')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait between queue checks')
+        parser.add_argument('--stale-after', type=int, default=STALE_AFTER_SECONDS,
+                            help='Seconds after which a running job is assumed abandoned')
+        parser.add_argument('--allow-local-cache', action='store_true',
+                            help='Run even though the response cache is local to each process, '
+                                 'so API processes keep serving cached leaderboards until they expire')
+
+    def handle(self, *args, **options):
+        if options['poll_interval'] <= 0 or options['stale_after'] < 1:
+            raise CommandError('--poll-interval and --stale-after must be positive')
+        if is_process_local() and not options['allow_local_cache']:
+            # The worker's invalidations would only clear its own copy of the cache
+            raise CommandError(
+                'The response cache is local to each process, so refreshes run here would not invalidate '
+                'cached leaderboard responses in the API processes. Set OCTOFIT_CACHE_BACKEND to a shared '
+                'backend, or pass --allow-local-cache to run anyway.'
+            )
+
+        if options['once']:
+            recover_stale_jobs(options['stale_after'])
+            jobs = run_pending_jobs()
+            for job in jobs:
+                self.log_job(job)
+            rescored = 0
+            batch = refresh_stale_recommendations()
+            while batch:
+                rescored += batch
+                batch = refresh_stale_recommendations()
+            self.stdout.write(self.style.SUCCESS(
+                f'Ran {len(jobs)} job(s), rescored recommendations for {rescored} user(s)'
+            ))
+            return
+
+        self.stdout.write(self.style.SUCCESS('Leaderboard worker started, press Ctrl+C to stop'))
+        try:
+            work(options['poll_interval'], options['stale_after'], log_job=self.log_job)
+        except KeyboardInterrupt:
+            self.stdout.write('Leaderboard worker stopped')
+
+    def log_job(self, job):
+        message = f'Job {job.id} ({job.mode}, {job.request_count} request(s)) {job.status}'
+        if job.status == 'failed':
+            self.stdout.write(self.style.ERROR(f'{message}: {job.error}'))
+        else:
+            self.stdout.write(message)
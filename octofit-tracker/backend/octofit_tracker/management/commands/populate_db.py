@@ -1,23 +1,80 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection
 from django.utils import timezone
 from datetime import timedelta
 import random
-from octofit_tracker.models import User, Team, Activity, Leaderboard, Workout
+from octofit_tracker.models import (
+    User, Team, Activity, DailyActivityRollup, Leaderboard, LeaderboardJob, LeaderboardRefresh,
+    LeaderboardSnapshot, Workout, WorkoutRecommendation
+)
+from octofit_tracker.synthetic import DEFAULT_BATCH_SIZE, derive_tables, generate_dataset
 
 
 class Command(BaseCommand):
     help = 'Populate the octofit_db database with test data'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int,
+                            help='Generate this many synthetic users instead of the superhero dataset')
+        parser.add_argument('--teams', type=int, default=10, help='Synthetic teams to create')
+        parser.add_argument('--activities-per-user', type=int, default=20, help='Synthetic activities per user')
+        parser.add_argument('--days', type=int, default=30, help='Spread synthetic activities over this many days')
+        parser.add_argument('--workouts', type=int, default=24, help='Synthetic workouts to create')
+        parser.add_argument('--seed', type=int, help='Random seed for reproducible data')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Rows per bulk insert')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes generating activities in parallel')
+
+    def clear_data(self):
+        """Empty every OctoFit table without loading rows or firing per-row signals"""
+        models = [Activity, DailyActivityRollup, Leaderboard, LeaderboardSnapshot, LeaderboardRefresh,
+                  LeaderboardJob, WorkoutRecommendation, User, Team, Workout]
+        tables = [model._meta.db_table for model in models]
+        connection.ops.execute_sql_flush(connection.ops.sql_flush(no_style(), tables, reset_sequences=True))
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Starting database population...'))
 
         # Clear existing data
         self.stdout.write('Clearing existing data...')
-        User.objects.all().delete()
-        Team.objects.all().delete()
-        Activity.objects.all().delete()
-        Leaderboard.objects.all().delete()
-        Workout.objects.all().delete()
+        self.clear_data()
+
+        if options['users'] is not None:
+            self.populate_synthetic(options)
+        else:
+            self.populate_heroes(options)
+
+        # Summary
+        self.stdout.write(self.style.SUCCESS('\n=== Database Population Complete ==='))
+        self.stdout.write(f'Teams created: {Team.objects.count()}')
+        self.stdout.write(f'Users created: {User.objects.count()}')
+        self.stdout.write(f'Activities created: {Activity.objects.count()}')
+        self.stdout.write(f'Workouts created: {Workout.objects.count()}')
+        self.stdout.write(f'Leaderboard entries: {Leaderboard.objects.count()}')
+        self.stdout.write(self.style.SUCCESS('='*40))
+
+    def populate_synthetic(self, options):
+        """Generate a configurable synthetic dataset with bulk inserts"""
+        if options['users'] < 0 or options['teams'] < 0 or options['activities_per_user'] < 0:
+            raise CommandError('--users, --teams and --activities-per-user must not be negative')
+        if options['days'] < 1 or options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--days, --batch-size and --workers must be at least 1')
+        generate_dataset(
+            users=options['users'],
+            teams=options['teams'],
+            activities_per_user=options['activities_per_user'],
+            days=options['days'],
+            workouts=options['workouts'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            log=self.stdout.write,
+        )
+
+    def populate_heroes(self, options):
+        """Create the Marvel vs DC demo dataset"""
+        rng = random.Random(options['seed'])
 
         # Create Teams
         self.stdout.write('Creating teams...')
@@ -41,8 +98,7 @@ class Command(BaseCommand):
             {'email': 'peter.parker@marvel.com', 'username': 'Spider-Man', 'password': 'webslinger'},
         ]
 
-        for user_data in marvel_users:
-            User.objects.create(team_id=team_marvel.id, **user_data)
+        users = [User(team_id=team_marvel.id, **user_data) for user_data in marvel_users]
 
         # Create Users - DC Heroes
         self.stdout.write('Creating DC heroes...')
@@ -55,43 +111,46 @@ class Command(BaseCommand):
             {'email': 'hal.jordan@dc.com', 'username': 'Green Lantern', 'password': 'willpower'},
         ]
 
-        for user_data in dc_users:
-            User.objects.create(team_id=team_dc.id, **user_data)
+        users += [User(team_id=team_dc.id, **user_data) for user_data in dc_users]
+        User.objects.bulk_create(users)
 
         # Create Activities
         self.stdout.write('Creating activities...')
         all_users = User.objects.all()
         activity_types = ['running', 'cycling', 'swimming', 'walking', 'weightlifting', 'yoga']
-        
+        notes_options = [
+            'Great workout!',
+            'Feeling strong today',
+            'Good progress',
+            'Challenging but rewarding',
+            'New personal best!',
+            '',
+        ]
+        now = timezone.now()
+        activities = []
+
         for user in all_users:
             # Create 5-10 random activities for each user
-            num_activities = random.randint(5, 10)
+            num_activities = rng.randint(5, 10)
             for i in range(num_activities):
-                activity_type = random.choice(activity_types)
-                duration = random.randint(20, 120)
-                distance = round(random.uniform(1.0, 20.0), 2) if activity_type in ['running', 'cycling', 'swimming', 'walking'] else None
-                calories = random.randint(100, 800)
-                days_ago = random.randint(0, 30)
-                date = timezone.now() - timedelta(days=days_ago)
-                
-                notes_options = [
-                    'Great workout!',
-                    'Feeling strong today',
-                    'Good progress',
-                    'Challenging but rewarding',
-                    'New personal best!',
-                    '',
-                ]
-                
-                Activity.objects.create(
+                activity_type = rng.choice(activity_types)
+                duration = rng.randint(20, 120)
+                distance = round(rng.uniform(1.0, 20.0), 2) if activity_type in ['running', 'cycling', 'swimming', 'walking'] else None
+                calories = rng.randint(100, 800)
+                days_ago = rng.randint(0, 30)
+                date = now - timedelta(days=days_ago)
+
+                activities.append(Activity(
                     user_id=user.id,
                     activity_type=activity_type,
                     duration=duration,
                     distance=distance,
                     calories=calories,
                     date=date,
-                    notes=random.choice(notes_options)
-                )
+                    notes=rng.choice(notes_options)
+                ))
+
+        Activity.objects.bulk_create(activities, batch_size=options['batch_size'])
 
         # Create Workouts
         self.stdout.write('Creating workout suggestions...')
@@ -170,72 +229,7 @@ class Command(BaseCommand):
             },
         ]
 
-        for workout_data in workouts_data:
-            Workout.objects.create(**workout_data)
+        Workout.objects.bulk_create(Workout(**workout_data) for workout_data in workouts_data)
 
-        # Calculate and populate leaderboard
-        self.stdout.write('Calculating leaderboard...')
-        from django.db.models import Sum, Count
-        
-        # User leaderboard
-        user_stats = []
-        for user in all_users:
-            activities = Activity.objects.filter(user_id=user.id)
-            stats = activities.aggregate(
-                total_activities=Count('id'),
-                total_duration=Sum('duration'),
-                total_calories=Sum('calories')
-            )
-            total_points = (stats['total_activities'] or 0) * 10 + (stats['total_calories'] or 0)
-            user_stats.append({
-                'entity_id': user.id,
-                'entity_type': 'user',
-                'name': user.username,
-                'total_points': total_points,
-                'total_activities': stats['total_activities'] or 0,
-                'total_calories': stats['total_calories'] or 0,
-                'total_duration': stats['total_duration'] or 0,
-            })
-
-        # Sort by points and assign ranks
-        user_stats.sort(key=lambda x: x['total_points'], reverse=True)
-        for rank, stat in enumerate(user_stats, 1):
-            stat['rank'] = rank
-            Leaderboard.objects.create(**stat)
-
-        # Team leaderboard
-        teams = [team_marvel, team_dc]
-        team_stats = []
-        for team in teams:
-            user_ids = User.objects.filter(team_id=team.id).values_list('id', flat=True)
-            activities = Activity.objects.filter(user_id__in=user_ids)
-            stats = activities.aggregate(
-                total_activities=Count('id'),
-                total_duration=Sum('duration'),
-                total_calories=Sum('calories')
-            )
-            total_points = (stats['total_activities'] or 0) * 10 + (stats['total_calories'] or 0)
-            team_stats.append({
-                'entity_id': team.id,
-                'entity_type': 'team',
-                'name': team.name,
-                'total_points': total_points,
-                'total_activities': stats['total_activities'] or 0,
-                'total_calories': stats['total_calories'] or 0,
-                'total_duration': stats['total_duration'] or 0,
-            })
-
-        # Sort by points and assign ranks
-        team_stats.sort(key=lambda x: x['total_points'], reverse=True)
-        for rank, stat in enumerate(team_stats, 1):
-            stat['rank'] = rank
-            Leaderboard.objects.create(**stat)
-
-        # Summary
-        self.stdout.write(self.style.SUCCESS('\n=== Database Population Complete ==='))
-        self.stdout.write(f'Teams created: {Team.objects.count()}')
-        self.stdout.write(f'Users created: {User.objects.count()}')
-        self.stdout.write(f'Activities created: {Activity.objects.count()}')
-        self.stdout.write(f'Workouts created: {Workout.objects.count()}')
-        self.stdout.write(f'Leaderboard entries: {Leaderboard.objects.count()}')
-        self.stdout.write(self.style.SUCCESS('='*40))
+        # Calculate rollups, member counts and the leaderboard once
+        derive_tables(self.stdout.write)
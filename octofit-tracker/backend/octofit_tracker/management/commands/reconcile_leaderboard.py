@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from octofit_tracker.leaderboard import find_drift, refresh_leaderboard
+
+
+class Command(BaseCommand):
+    help = 'Compare the incrementally maintained leaderboard totals with a full recompute'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Run a full refresh when any row has drifted')
+        parser.add_argument('--limit', type=int, default=20,
+                            help='Drifted rows to list (0 for all)')
+
+    def handle(self, *args, **options):
+        drift = find_drift()
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Leaderboard totals match a full recompute'))
+            return
+
+        shown = drift if options['limit'] <= 0 else drift[:options['limit']]
+        for entity_type, entity_id, stored, expected in shown:
+            self.stdout.write(f'{entity_type} {entity_id}: stored {stored}, expected {expected}')
+        if len(shown) < len(drift):
+            self.stdout.write(f'... and {len(drift) - len(shown)} more')
+
+        if not options['fix']:
+            raise CommandError(f'{len(drift)} leaderboard row(s) drifted; rerun with --fix to refresh')
+        run = refresh_leaderboard()
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshed {run.users_updated} user(s) and {run.teams_updated} team(s); '
+            f'{len(find_drift())} row(s) still drifted'
+        ))
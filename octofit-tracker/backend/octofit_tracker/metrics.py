@@ -0,0 +1,126 @@
+"""In-process request metrics for OctoFit Tracker
+
+Histograms are kept per route name (the URL name, e.g. ``activity-list`` or
+``leaderboard-refresh``) and exposed in the Prometheus text format by
+`metrics_view`. Values are per worker process.
+
+Serializers report the time they spend in `to_representation` through
+`timed_serialization` to the request's SerializeTimer, which
+RequestMetricsMiddleware installs for each request.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from django.http import HttpResponse
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+METRICS = {
+    'octofit_request_duration_seconds': ('Total time spent handling the request', SECONDS_BUCKETS),
+    'octofit_db_duration_seconds': ('Time spent executing database queries', SECONDS_BUCKETS),
+    'octofit_db_queries': ('Database queries executed per request', QUERY_BUCKETS),
+    'octofit_serialize_duration_seconds': ('Time spent in serializers building the response data', SECONDS_BUCKETS),
+    'octofit_render_duration_seconds': ('Time spent rendering the response body', SECONDS_BUCKETS),
+    'octofit_response_size_bytes': ('Size of the response body', BYTES_BUCKETS),
+}
+
+
+# The timer for the request being handled, if any
+current_serialize_timer = ContextVar('octofit_serialize_timer', default=None)
+
+
+class SerializeTimer:
+    """Total time spent serializing; calls nested inside a timed call are counted once"""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.active = False
+
+    def measure(self, function, *args):
+        if self.active:
+            return function(*args)
+        self.active = True
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.active = False
+
+
+def timed_serialization(function, *args):
+    """Call `function(*args)`, adding its duration to the current request's serialize timer"""
+    timer = current_serialize_timer.get()
+    if timer is None:
+        return function(*args)
+    return timer.measure(function, *args)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+    def samples(self):
+        """(le label, cumulative count) pairs ending with +Inf"""
+        running = 0
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            running += count
+            yield str(bound), running
+
+
+class MetricsRegistry:
+    """Thread-safe histograms keyed by metric name and route"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, route, **values):
+        with self._lock:
+            for name, value in values.items():
+                key = (name, route)
+                if key not in self._histograms:
+                    self._histograms[key] = Histogram(METRICS[name][1])
+                self._histograms[key].observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        """Prometheus text exposition of every histogram"""
+        lines = []
+        with self._lock:
+            for name, (description, _) in METRICS.items():
+                routes = sorted(route for metric, route in self._histograms if metric == name)
+                if not routes:
+                    continue
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for route in routes:
+                    histogram = self._histograms[(name, route)]
+                    label = route.replace('\\', '\\\\').replace('"', '\\"')
+                    for bound, count in histogram.samples():
+                        lines.append(f'{name}_bucket{{route="{label}",le="{bound}"}} {count}')
+                    lines.append(f'{name}_sum{{route="{label}"}} {histogram.total}')
+                    lines.append(f'{name}_count{{route="{label}"}} {sum(histogram.counts)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def metrics_view(request):
+    """Expose request metrics in the Prometheus text format"""
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,177 @@
+"""Middleware for OctoFit Tracker"""
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence
+from . import compression
+from .metrics import SerializeTimer, current_serialize_timer, registry
+
+# The recorder for the request being handled. Context variables follow the
+# request into the threads that async views run their ORM calls in.
+current_recorder = ContextVar('octofit_query_recorder', default=None)
+
+
+class QueryRecorder:
+    """Database execute wrapper that counts queries and their total duration"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper that reports to the current request's recorder, if any"""
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_query_recorder(connection, **kwargs):
+    """Attach `record_query` to a database connection once"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class RequestMetricsMiddleware:
+    """Record per-route query count, DB time, serializer time, render time and response size.
+
+    The numbers are added to the response as a Server-Timing header and
+    collected into the histograms served by the metrics endpoint. Queries run
+    while a streaming response is consumed are not included. Runs natively
+    under both WSGI and ASGI, so async views are not forced onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder, tokens, start = self.start(request)
+        # Connections opened later in this thread are covered by connection_created
+        for connection in connections.all():
+            install_query_recorder(connection)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.reset(tokens)
+        return self.finish(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        recorder, tokens, start = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.reset(tokens)
+        return self.finish(request, response, recorder, start)
+
+    def start(self, request):
+        recorder = QueryRecorder()
+        request._metrics_render_seconds = 0.0
+        request._metrics_serialize_timer = SerializeTimer()
+        tokens = (current_recorder.set(recorder), current_serialize_timer.set(request._metrics_serialize_timer))
+        return recorder, tokens, time.perf_counter()
+
+    @staticmethod
+    def reset(tokens):
+        recorder_token, timer_token = tokens
+        current_recorder.reset(recorder_token)
+        current_serialize_timer.reset(timer_token)
+
+    def finish(self, request, response, recorder, start):
+        total_seconds = time.perf_counter() - start
+        serialize_seconds = request._metrics_serialize_timer.seconds
+        render_seconds = request._metrics_render_seconds
+        observed = {
+            'octofit_request_duration_seconds': total_seconds,
+            'octofit_db_duration_seconds': recorder.seconds,
+            'octofit_db_queries': recorder.count,
+            'octofit_serialize_duration_seconds': serialize_seconds,
+            'octofit_render_duration_seconds': render_seconds,
+        }
+        if not response.streaming:
+            observed['octofit_response_size_bytes'] = len(response.content)
+        registry.observe(self.route_name(request), **observed)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={recorder.seconds * 1000:.2f};desc="{recorder.count} queries"',
+            f'serialize;dur={serialize_seconds * 1000:.2f};desc="Serializers"',
+            f'render;dur={render_seconds * 1000:.2f};desc="Response rendering"',
+            f'total;dur={total_seconds * 1000:.2f}',
+        ])
+        response['Timing-Allow-Origin'] = '*'
+        return response
+
+    def process_template_response(self, request, response):
+        """Time the render step that follows, where DRF encodes the response body"""
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._metrics_render_seconds = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def route_name(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None or not match.url_name:
+            return 'unmatched'
+        return match.url_name
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compress response bodies with the best coding the client accepts (see compression.py).
+
+    Bodies shorter than RESPONSE_COMPRESSION['MIN_SIZE'] bytes are sent as is,
+    as are bodies that would not get smaller. Streaming responses, such as
+    activity exports, are gzipped as they stream. ETags are made weak, since
+    the encoded bytes differ from the ones they were computed from.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or response.status_code in (204, 304):
+            return response
+        if not response.streaming and len(response.content) < settings.RESPONSE_COMPRESSION.get('MIN_SIZE', 1024):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encodings = compression.enabled_encodings()
+        if response.streaming:
+            encodings = [encoding for encoding in encodings if encoding == 'gzip']
+        encoding = compression.negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''), encodings)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_sequence(response.streaming_content)
+            del response['Content-Length']
+        else:
+            compressed = compression.compress(encoding, response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
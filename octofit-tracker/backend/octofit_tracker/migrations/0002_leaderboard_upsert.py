@@ -0,0 +1,32 @@
+# Generated by Django 4.1.7 on 2026-10-18 02:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardRefresh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(choices=[('full', 'Full'), ('incremental', 'Incremental')], max_length=20)),
+                ('started_at', models.DateTimeField(help_text='Activities changed after this point are picked up by the next run')),
+                ('completed_at', models.DateTimeField(auto_now_add=True)),
+                ('users_updated', models.IntegerField(default=0)),
+                ('teams_updated', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'leaderboard_refreshes',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboard',
+            constraint=models.UniqueConstraint(fields=('entity_type', 'entity_id'), name='leaderboard_entity_unique'),
+        ),
+    ]
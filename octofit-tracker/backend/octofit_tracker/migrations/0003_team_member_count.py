@@ -0,0 +1,31 @@
+# Generated by Django 4.1.7 on 2026-10-18 02:52
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_member_counts(apps, schema_editor):
+    User = apps.get_model('octofit_tracker', 'User')
+    Team = apps.get_model('octofit_tracker', 'Team')
+    counts = (
+        User.objects.filter(team_id__isnull=False).order_by()
+        .values('team_id').annotate(total=Count('id')).values_list('team_id', 'total')
+    )
+    for team_id, total in counts:
+        Team.objects.filter(id=team_id).update(member_count=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0002_leaderboard_upsert'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='team',
+            name='member_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Kept in sync with User.team_id'),
+        ),
+        migrations.RunPython(backfill_member_counts, migrations.RunPython.noop),
+    ]
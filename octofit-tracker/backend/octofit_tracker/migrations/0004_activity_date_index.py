@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-18 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0003_team_member_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['-date', 'id'], name='activities_date_b96136_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.1.7 on 2026-10-18 02:54
+
+from django.db import migrations, models
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    Activity = apps.get_model('octofit_tracker', 'Activity')
+    DailyActivityRollup = apps.get_model('octofit_tracker', 'DailyActivityRollup')
+    rows = Activity.objects.order_by().annotate(day=TruncDate('date')).values(
+        'user_id', 'day', 'activity_type'
+    ).annotate(
+        activity_count=Count('id'),
+        total_duration=Sum('duration'),
+        total_calories=Sum('calories'),
+        total_distance=Coalesce(Sum('distance'), Value(0.0)),
+    )
+    DailyActivityRollup.objects.bulk_create(
+        (DailyActivityRollup(**row) for row in rows.iterator()), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0004_activity_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField()),
+                ('day', models.DateField()),
+                ('activity_type', models.CharField(max_length=50)),
+                ('activity_count', models.IntegerField(default=0)),
+                ('total_duration', models.IntegerField(default=0, help_text='Total duration in minutes')),
+                ('total_calories', models.IntegerField(default=0)),
+                ('total_distance', models.FloatField(default=0, help_text='Total distance in kilometers')),
+            ],
+            options={
+                'db_table': 'daily_activity_rollups',
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyactivityrollup',
+            constraint=models.UniqueConstraint(fields=('user_id', 'day', 'activity_type'), name='rollup_user_day_type_unique'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.1.7 on 2026-10-18 02:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0005_daily_activity_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_id', models.IntegerField(help_text='User ID or Team ID')),
+                ('entity_type', models.CharField(choices=[('user', 'User'), ('team', 'Team')], max_length=10)),
+                ('name', models.CharField(max_length=100)),
+                ('period_start', models.DateField()),
+                ('period_end', models.DateField(help_text='First day after the window')),
+                ('total_points', models.IntegerField(default=0)),
+                ('total_activities', models.IntegerField(default=0)),
+                ('total_calories', models.IntegerField(default=0)),
+                ('total_duration', models.IntegerField(default=0, help_text='Total duration in minutes')),
+                ('rank', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'leaderboard_snapshots',
+                'ordering': ['rank'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='dailyactivityrollup',
+            index=models.Index(fields=['day'], name='daily_activ_day_04986e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardsnapshot',
+            index=models.Index(fields=['period_start', 'period_end', 'entity_type', 'rank'], name='leaderboard_period__0c60a3_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardsnapshot',
+            constraint=models.UniqueConstraint(fields=('period_start', 'period_end', 'entity_type', 'entity_id'), name='snapshot_period_entity_unique'),
+        ),
+    ]
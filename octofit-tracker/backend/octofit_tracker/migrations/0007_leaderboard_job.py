@@ -0,0 +1,36 @@
+# Generated by Django 4.1.7 on 2026-10-18 03:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0006_leaderboard_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(choices=[('full', 'Full'), ('incremental', 'Incremental')], max_length=20)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('request_count', models.IntegerField(default=1, help_text='Refresh requests coalesced into this job')),
+                ('requested_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('users_updated', models.IntegerField(blank=True, null=True)),
+                ('teams_updated', models.IntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'db_table': 'leaderboard_jobs',
+                'ordering': ['-requested_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('status',), name='leaderboard_job_single_active'),
+        ),
+    ]
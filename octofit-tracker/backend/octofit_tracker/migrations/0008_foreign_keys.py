@@ -0,0 +1,94 @@
+# Generated by Django 4.1.7 on 2026-10-18 03:15
+
+import logging
+from django.db import migrations, models
+import django.db.models.deletion
+
+logger = logging.getLogger(__name__)
+
+
+def drop_dangling_references(apps, schema_editor):
+    """Remove activities and rollups of deleted users and unset deleted teams, logging what changed"""
+    User = apps.get_model('octofit_tracker', 'User')
+    Team = apps.get_model('octofit_tracker', 'Team')
+    Activity = apps.get_model('octofit_tracker', 'Activity')
+    DailyActivityRollup = apps.get_model('octofit_tracker', 'DailyActivityRollup')
+    user_ids = User.objects.values('id')
+    orphan_activities = Activity.objects.exclude(user_id__in=user_ids)
+    orphan_rollups = DailyActivityRollup.objects.exclude(user_id__in=user_ids)
+    orphan_user_ids = sorted(
+        set(orphan_activities.values_list('user_id', flat=True)) |
+        set(orphan_rollups.values_list('user_id', flat=True))
+    )
+    activities, _ = orphan_activities.delete()
+    rollups, _ = orphan_rollups.delete()
+    unset = User.objects.filter(team_id__isnull=False).exclude(
+        team_id__in=Team.objects.values('id')
+    ).update(team_id=None)
+    if activities or rollups:
+        logger.warning(
+            'Deleted %d activities and %d daily rollups of users that no longer exist (user ids: %s)',
+            activities, rollups, ', '.join(map(str, orphan_user_ids)),
+        )
+    if unset:
+        logger.warning('Unset the team of %d users whose team no longer exists', unset)
+
+
+class Migration(migrations.Migration):
+    """Turn Activity.user_id and User.team_id into foreign keys on the same columns"""
+
+    dependencies = [
+        ('octofit_tracker', '0007_leaderboard_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_dangling_references, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            # The columns keep their names; only the constraints (and the team index) are added
+            database_operations=[
+                migrations.AlterField(
+                    model_name='activity',
+                    name='user_id',
+                    field=models.ForeignKey(db_column='user_id', db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='activities', to='octofit_tracker.user'),
+                ),
+                migrations.AlterField(
+                    model_name='user',
+                    name='team_id',
+                    field=models.ForeignKey(blank=True, db_column='team_id', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='members', to='octofit_tracker.team'),
+                ),
+            ],
+            state_operations=[
+                migrations.RemoveIndex(
+                    model_name='activity',
+                    name='activities_user_id_5cc191_idx',
+                ),
+                migrations.RemoveField(
+                    model_name='activity',
+                    name='user_id',
+                ),
+                migrations.RemoveField(
+                    model_name='user',
+                    name='team_id',
+                ),
+                migrations.AddField(
+                    model_name='activity',
+                    name='user',
+                    field=models.ForeignKey(db_column='user_id', db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='activities', to='octofit_tracker.user'),
+                ),
+                migrations.AddField(
+                    model_name='user',
+                    name='team',
+                    field=models.ForeignKey(blank=True, db_column='team_id', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='members', to='octofit_tracker.team'),
+                ),
+                migrations.AddIndex(
+                    model_name='activity',
+                    index=models.Index(fields=['user', '-date'], name='activities_user_id_5cc191_idx'),
+                ),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='team',
+            name='member_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Kept in sync with User.team'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.1.7 on 2026-10-18 03:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0008_foreign_keys'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='user',
+            name='users_email_4b85f2_idx',
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['activity_type', '-date'], name='activities_activit_ee85e6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboard',
+            index=models.Index(fields=['rank'], name='leaderboard_rank_4ad7a0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workout',
+            index=models.Index(fields=['difficulty'], name='workouts_difficu_e2fdd2_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.1.7 on 2026-10-18 03:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0009_query_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkoutRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('difficulty', models.CharField(help_text="Copy of the workout's difficulty", max_length=20)),
+                ('rank', models.PositiveIntegerField(help_text="Position among the user's recommendations at this difficulty")),
+                ('score', models.FloatField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(db_column='user_id', db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='octofit_tracker.user')),
+                ('workout', models.ForeignKey(db_column='workout_id', on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='octofit_tracker.workout')),
+            ],
+            options={
+                'db_table': 'workout_recommendations',
+                'ordering': ['user_id', 'difficulty', 'rank'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='workoutrecommendation',
+            constraint=models.UniqueConstraint(fields=('user', 'difficulty', 'rank'), name='recommendation_user_difficulty_rank_unique'),
+        ),
+    ]
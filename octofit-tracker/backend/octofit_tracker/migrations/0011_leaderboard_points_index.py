@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-18 03:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0010_workout_recommendation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='leaderboard',
+            index=models.Index(fields=['entity_type', 'total_points', 'entity_id'], name='leaderboard_entity__a8afaa_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.7 on 2026-10-18 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0011_leaderboard_points_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'leaderboard_version',
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.1.7 on 2026-10-18 04:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0012_leaderboard_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workoutrecommendation',
+            name='stale',
+            field=models.BooleanField(default=False, help_text='Set when the catalogue changed; the worker rescores it'),
+        ),
+        migrations.AddIndex(
+            model_name='workoutrecommendation',
+            index=models.Index(fields=['stale'], name='workout_rec_stale_e9b7dd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workoutrecommendation',
+            index=models.Index(fields=['updated_at'], name='workout_rec_updated_e9456f_idx'),
+        ),
+    ]
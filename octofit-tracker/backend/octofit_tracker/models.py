@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import EmailValidator
 
 
@@ -7,15 +7,14 @@ class User(models.Model):
     email = models.EmailField(unique=True, validators=[EmailValidator()])
     username = models.CharField(max_length=100)
     password = models.CharField(max_length=255)
-    team_id = models.IntegerField(null=True, blank=True)
+    team = models.ForeignKey(
+        'Team', null=True, blank=True, on_delete=models.SET_NULL, related_name='members', db_column='team_id'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'users'
-        indexes = [
-            models.Index(fields=['email']),
-        ]
 
     def __str__(self):
         return f"{self.username} ({self.email})"
@@ -25,6 +24,7 @@ class Team(models.Model):
     """Team model for OctoFit Tracker"""
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
+    member_count = models.IntegerField(default=0, editable=False, help_text="Kept in sync with User.team")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -47,7 +47,10 @@ class Activity(models.Model):
         ('other', 'Other'),
     ]
 
-    user_id = models.IntegerField()
+    # Indexed by the (user_id, -date) index below
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='activities', db_column='user_id', db_index=False
+    )
     activity_type = models.CharField(max_length=50, choices=ACTIVITY_TYPES)
     duration = models.IntegerField(help_text="Duration in minutes")
     distance = models.FloatField(null=True, blank=True, help_text="Distance in kilometers")
@@ -61,12 +64,43 @@ class Activity(models.Model):
         db_table = 'activities'
         ordering = ['-date']
         indexes = [
-            models.Index(fields=['user_id', '-date']),
+            models.Index(fields=['user', '-date']),
+            models.Index(fields=['activity_type', '-date']),
+            models.Index(fields=['-date', 'id']),
         ]
 
     def __str__(self):
         return f"{self.activity_type} - {self.duration} mins"
 
+    def save(self, *args, **kwargs):
+        # Signals apply this write to the rollups and leaderboard; commit them together
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+class DailyActivityRollup(models.Model):
+    """Per-user, per-day, per-activity-type totals maintained from Activity writes"""
+    user_id = models.IntegerField()
+    day = models.DateField()
+    activity_type = models.CharField(max_length=50)
+    activity_count = models.IntegerField(default=0)
+    total_duration = models.IntegerField(default=0, help_text="Total duration in minutes")
+    total_calories = models.IntegerField(default=0)
+    total_distance = models.FloatField(default=0, help_text="Total distance in kilometers")
+
+    class Meta:
+        db_table = 'daily_activity_rollups'
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'day', 'activity_type'], name='rollup_user_day_type_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.day} {self.activity_type} x{self.activity_count}"
+
 
 class Leaderboard(models.Model):
     """Leaderboard model for ranking users and teams"""
@@ -90,12 +124,116 @@ class Leaderboard(models.Model):
         ordering = ['rank']
         indexes = [
             models.Index(fields=['entity_type', 'rank']),
+            models.Index(fields=['rank']),
+            # Counts and range updates by points when re-ranking one row
+            models.Index(fields=['entity_type', 'total_points', 'entity_id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['entity_type', 'entity_id'], name='leaderboard_entity_unique'),
         ]
 
     def __str__(self):
         return f"{self.name} - Rank #{self.rank}"
 
 
+class LeaderboardVersion(models.Model):
+    """Single row counting writes to the Leaderboard table, bumped in the writing transaction"""
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'leaderboard_version'
+
+    def __str__(self):
+        return f"Leaderboard version {self.version}"
+
+
+class LeaderboardSnapshot(models.Model):
+    """Leaderboard rows materialized for a [period_start, period_end) day window"""
+    entity_id = models.IntegerField(help_text="User ID or Team ID")
+    entity_type = models.CharField(max_length=10, choices=Leaderboard.RANKING_TYPES)
+    name = models.CharField(max_length=100)
+    period_start = models.DateField()
+    period_end = models.DateField(help_text="First day after the window")
+    total_points = models.IntegerField(default=0)
+    total_activities = models.IntegerField(default=0)
+    total_calories = models.IntegerField(default=0)
+    total_duration = models.IntegerField(default=0, help_text="Total duration in minutes")
+    rank = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'leaderboard_snapshots'
+        ordering = ['rank']
+        indexes = [
+            models.Index(fields=['period_start', 'period_end', 'entity_type', 'rank']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['period_start', 'period_end', 'entity_type', 'entity_id'],
+                name='snapshot_period_entity_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} - Rank #{self.rank} ({self.period_start} to {self.period_end})"
+
+
+class LeaderboardRefresh(models.Model):
+    """Record of a leaderboard recomputation"""
+    REFRESH_MODES = [
+        ('full', 'Full'),
+        ('incremental', 'Incremental'),
+    ]
+
+    mode = models.CharField(max_length=20, choices=REFRESH_MODES)
+    started_at = models.DateTimeField(help_text="Activities changed after this point are picked up by the next run")
+    completed_at = models.DateTimeField(auto_now_add=True)
+    users_updated = models.IntegerField(default=0)
+    teams_updated = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'leaderboard_refreshes'
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.mode} refresh at {self.started_at}"
+
+
+class LeaderboardJob(models.Model):
+    """Queued leaderboard recomputation, run by the leaderboard_worker command"""
+    STATUSES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    mode = models.CharField(max_length=20, choices=LeaderboardRefresh.REFRESH_MODES)
+    status = models.CharField(max_length=20, choices=STATUSES, default='queued')
+    request_count = models.IntegerField(default=1, help_text="Refresh requests coalesced into this job")
+    requested_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    users_updated = models.IntegerField(null=True, blank=True)
+    teams_updated = models.IntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        db_table = 'leaderboard_jobs'
+        ordering = ['-requested_at']
+        constraints = [
+            # At most one queued and one running job at any time
+            models.UniqueConstraint(
+                fields=['status'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='leaderboard_job_single_active',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.mode} refresh job {self.id} ({self.status})"
+
+
 class Workout(models.Model):
     """Workout suggestion model"""
     DIFFICULTY_LEVELS = [
@@ -118,7 +256,41 @@ class Workout(models.Model):
         db_table = 'workouts'
         indexes = [
             models.Index(fields=['activity_type', 'difficulty']),
+            models.Index(fields=['difficulty']),
         ]
 
     def __str__(self):
         return f"{self.title} ({self.difficulty})"
+
+
+class WorkoutRecommendation(models.Model):
+    """Precomputed workout scores for a user: the best few workouts per difficulty"""
+    # Indexed by the (user_id, difficulty, rank) constraint below
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='recommendations', db_column='user_id', db_index=False
+    )
+    workout = models.ForeignKey(
+        Workout, on_delete=models.CASCADE, related_name='recommendations', db_column='workout_id'
+    )
+    difficulty = models.CharField(max_length=20, help_text="Copy of the workout's difficulty")
+    rank = models.PositiveIntegerField(help_text="Position among the user's recommendations at this difficulty")
+    score = models.FloatField()
+    stale = models.BooleanField(default=False, help_text="Set when the catalogue changed; the worker rescores it")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'workout_recommendations'
+        ordering = ['user_id', 'difficulty', 'rank']
+        indexes = [
+            # The worker's search for rows to rescore
+            models.Index(fields=['stale']),
+            models.Index(fields=['updated_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'difficulty', 'rank'], name='recommendation_user_difficulty_rank_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.difficulty} #{self.rank}: workout {self.workout_id} ({self.score})"
@@ -0,0 +1,154 @@
+"""MongoDB aggregation pipelines for OctoFit Tracker stats and the leaderboard
+
+On djongo every ORM aggregate is translated from SQL, which turns grouped
+queries into slow, generic pipelines. With OCTOFIT_MONGO_URI set (see
+settings.MONGO_DAL) the stats endpoints and leaderboard totals are instead
+computed by the pipelines below, run directly against the collections djongo
+writes: one per db_table, columns stored as fields, and DateField values
+stored as midnight datetimes.
+
+* Stats `$match` rollup rows on user_id and day, then `$group` them into sums.
+* User totals `$group` activities by user_id. Team totals group by user first,
+  `$lookup` each user's team_id and group again, so the join touches one
+  document per user rather than one per activity.
+
+`ensure_indexes` creates the compound indexes those `$match` stages use; the
+first call to `get_database` runs it.
+"""
+from datetime import datetime
+from django.conf import settings
+
+# (collection, keys, options) for every index the pipelines rely on
+INDEXES = [
+    ('activities', [('user_id', 1), ('date', -1)], {}),
+    ('users', [('id', 1)], {'unique': True}),
+    ('users', [('team_id', 1), ('id', 1)], {}),
+    ('daily_activity_rollups', [('user_id', 1), ('day', 1), ('activity_type', 1)], {'unique': True}),
+    ('daily_activity_rollups', [('day', 1)], {}),
+    ('leaderboard', [('entity_type', 1), ('rank', 1)], {}),
+]
+
+_database = None
+
+
+def enabled():
+    """Whether stats and leaderboard totals should be computed on MongoDB"""
+    return bool(getattr(settings, 'MONGO_DAL', {}).get('URI'))
+
+
+def get_database():
+    """The configured pymongo database, connected and indexed on first use"""
+    global _database
+    if _database is None:
+        import pymongo
+
+        config = settings.MONGO_DAL
+        database = pymongo.MongoClient(config['URI'])[config['NAME']]
+        ensure_indexes(database)
+        _database = database
+    return _database
+
+
+def ensure_indexes(db):
+    """Create the indexes in INDEXES (a no-op for ones that already exist)"""
+    for collection, keys, options in INDEXES:
+        db[collection].create_index(keys, **options)
+
+
+def _ids(values):
+    """A list of ids from ids or a values()/values_list() queryset"""
+    return [next(iter(value.values())) if isinstance(value, dict) else value for value in values]
+
+
+def _as_datetime(day):
+    """djongo stores DateField values as datetimes at midnight"""
+    if isinstance(day, datetime):
+        return day
+    return datetime(day.year, day.month, day.day)
+
+
+def window_match(window):
+    """Match condition on rollup `day` for a (start, end) window; either bound may be None"""
+    if window is None:
+        return {}
+    start, end = window
+    bounds = {}
+    if start is not None:
+        bounds['$gte'] = _as_datetime(start)
+    if end is not None:
+        bounds['$lt'] = _as_datetime(end)
+    return {'day': bounds} if bounds else {}
+
+
+def stats_pipeline(user_ids, window=None):
+    """Sum the rollup rows of `user_ids` within `window` into one document"""
+    return [
+        {'$match': {'user_id': {'$in': _ids(user_ids)}, **window_match(window)}},
+        {'$group': {
+            '_id': None,
+            'rows': {'$sum': 1},
+            'total_activities': {'$sum': '$activity_count'},
+            'total_duration': {'$sum': '$total_duration'},
+            'total_calories': {'$sum': '$total_calories'},
+            'total_distance': {'$sum': '$total_distance'},
+        }},
+    ]
+
+
+def rollup_stats(db, user_ids, window=None):
+    """Activity totals for `user_ids`, shaped like rollups.rollup_stats"""
+    for row in db.daily_activity_rollups.aggregate(stats_pipeline(user_ids, window)):
+        del row['_id']
+        if row.pop('rows'):
+            return row
+    # SQL sums over no rows are NULL, apart from the coalesced activity count
+    return {'total_activities': 0, 'total_duration': None, 'total_calories': None, 'total_distance': None}
+
+
+def _activity_totals(group_by):
+    return {
+        '_id': group_by,
+        'total_activities': {'$sum': 1},
+        'total_duration': {'$sum': '$duration'},
+        'total_calories': {'$sum': '$calories'},
+    }
+
+
+def user_totals_pipeline(user_ids=None):
+    """Group activities, optionally only those of `user_ids`, into per-user totals"""
+    pipeline = [{'$group': _activity_totals('$user_id')}]
+    if user_ids is not None:
+        pipeline.insert(0, {'$match': {'user_id': {'$in': _ids(user_ids)}}})
+    return pipeline
+
+
+def team_totals_pipeline(member_ids=None):
+    """Per-team totals: group by user, attach each user's team, group by team"""
+    return user_totals_pipeline(member_ids) + [
+        {'$lookup': {'from': 'users', 'localField': '_id', 'foreignField': 'id', 'as': 'user'}},
+        {'$unwind': '$user'},
+        {'$match': {'user.team_id': {'$ne': None}}},
+        {'$group': {
+            '_id': '$user.team_id',
+            'total_activities': {'$sum': '$total_activities'},
+            'total_duration': {'$sum': '$total_duration'},
+            'total_calories': {'$sum': '$total_calories'},
+        }},
+    ]
+
+
+def _totals_by_id(rows):
+    return {row.pop('_id'): row for row in rows}
+
+
+def user_totals(db, user_ids=None):
+    """{user_id: totals} like leaderboard._aggregate over activities"""
+    return _totals_by_id(db.activities.aggregate(user_totals_pipeline(user_ids)))
+
+
+def team_totals(db, team_ids=None):
+    """{team_id: totals} like leaderboard._aggregate over team members' activities"""
+    member_ids = None
+    if team_ids is not None:
+        member_ids = db.users.distinct('id', {'team_id': {'$in': _ids(team_ids)}})
+    return _totals_by_id(db.activities.aggregate(team_totals_pipeline(member_ids)))
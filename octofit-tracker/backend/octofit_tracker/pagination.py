@@ -0,0 +1,28 @@
+"""Keyset (cursor) pagination for OctoFit Tracker list endpoints
+
+Cursor pagination seeks on an indexed ordering instead of using OFFSET, so
+every page costs the same regardless of how deep it is.
+"""
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class DefaultCursorPagination(CursorPagination):
+    """Cursor pagination on primary key, used by users, teams and workouts"""
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class ActivityCursorPagination(DefaultCursorPagination):
+    """Newest activities first, ties broken by id"""
+    ordering = ('-date', 'id')
+
+
+class LeaderboardCursorPagination(DefaultCursorPagination):
+    """Leaderboard rows in rank order"""
+    ordering = ('rank', 'id')
+
+
+class WindowSnapshotPagination(LimitOffsetPagination):
+    """Offset pages over leaderboard rows computed in memory for a custom ?from=&to= window"""
+    max_limit = 500
@@ -0,0 +1,40 @@
+"""Request parsers for OctoFit Tracker"""
+import json
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import BaseParser
+
+
+class TooManyItems(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_code = 'too_many_items'
+
+    def __init__(self, limit):
+        super().__init__(f'At most {limit} items are accepted per request; split the payload.')
+
+
+class NDJSONParser(BaseParser):
+    """Parse newline-delimited JSON into a list, one object per non-blank line.
+
+    Stops with 413 once the body has more than settings.BULK_INGEST_MAX_ITEMS
+    objects, without reading the rest.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+        limit = settings.BULK_INGEST_MAX_ITEMS
+        items = []
+        for line_number, line in enumerate(stream, 1):
+            line = line.decode(encoding).strip()
+            if not line:
+                continue
+            if len(items) == limit:
+                raise TooManyItems(limit)
+            try:
+                items.append(json.loads(line))
+            except ValueError as exc:
+                raise ParseError(f'NDJSON parse error on line {line_number} - {exc}')
+        return items
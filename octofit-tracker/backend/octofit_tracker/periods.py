@@ -0,0 +1,77 @@
+"""Time windows for stats and leaderboards in OctoFit Tracker
+
+Windows are half-open day ranges [start, end) in the project time zone,
+which is the granularity of DailyActivityRollup.
+"""
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+PERIODS = ('week', 'month')
+
+
+def parse_date_param(params, name):
+    """Parse an ISO date or datetime query parameter into an aware datetime"""
+    value = params.get(name, None)
+    if value is None:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValidationError({name: 'Expected an ISO 8601 date or datetime.'})
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def period_window(period, today=None):
+    """The calendar week (Monday start) or month containing `today`"""
+    today = today or timezone.localdate()
+    if period == 'week':
+        start = today - timedelta(days=today.weekday())
+        return start, start + timedelta(days=7)
+    if period == 'month':
+        start = today.replace(day=1)
+        return start, (start + timedelta(days=32)).replace(day=1)
+    raise ValidationError({'period': f"Choose one of: {', '.join(PERIODS)}"})
+
+
+def window_from_params(params):
+    """Day window from ?period= or ?from=&to=, or None when neither is given.
+
+    Either bound of a from/to window may be None for an open-ended range.
+    """
+    period = params.get('period', None)
+    if period is not None:
+        return period_window(period)
+
+    date_from = parse_date_param(params, 'from')
+    date_to = parse_date_param(params, 'to')
+    if date_from is None and date_to is None:
+        return None
+    start = timezone.localdate(date_from) if date_from is not None else None
+    end = timezone.localdate(date_to) if date_to is not None else None
+    if start is not None and end is not None and start >= end:
+        raise ValidationError({'to': "'to' must be after 'from'."})
+    return start, end
+
+
+def bounded_window_from_params(params):
+    """Like `window_from_params`, but a from/to window needs both bounds"""
+    window = window_from_params(params)
+    if window is not None and None in window:
+        raise ValidationError({'to': "Leaderboard windows need both 'from' and 'to'."})
+    return window
+
+
+def filter_window(rollups, window):
+    """Restrict a DailyActivityRollup queryset to a day window"""
+    start, end = window
+    if start is not None:
+        rollups = rollups.filter(day__gte=start)
+    if end is not None:
+        rollups = rollups.filter(day__lt=end)
+    return rollups
@@ -0,0 +1,89 @@
+"""Query plan checks for OctoFit Tracker
+
+Requests each hot API endpoint, captures the SQL it runs and asks SQLite for
+the plan of every SELECT (EXPLAIN QUERY PLAN). A statement that walks a whole
+table, in rowid order or in the order of an index, is reported unless its case
+allows that table: unfiltered list pages walk the table in their sort order
+and stop after one page.
+"""
+import re
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .caching import get_response_cache
+from .models import User, Team, Activity, Workout
+
+# "SCAN t" and "SCAN t USING INDEX i" walk every row; "SEARCH t ..." seeks
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(?!CONSTANT ROW)(\w+)')
+
+
+def hot_requests():
+    """(case name, URL, query params, tables a full scan is allowed on) for the hot endpoints"""
+    user = User.objects.filter(team__isnull=False).order_by('id').first()
+    team = Team.objects.order_by('id').first()
+    activity = Activity.objects.order_by('id').first()
+    workout = Workout.objects.order_by('id').first()
+    window = {'from': '2024-01-01', 'to': '2024-02-01'}
+    return [
+        ('user-list', reverse('user-list'), {}, {'users'}),
+        ('user-detail', reverse('user-detail', args=[user.id]), {}, set()),
+        ('user-activities', reverse('user-activities', args=[user.id]), {}, set()),
+        ('user-stats', reverse('user-stats', args=[user.id]), {'period': 'week'}, set()),
+        ('team-list', reverse('team-list'), {}, {'teams'}),
+        ('team-detail', reverse('team-detail', args=[team.id]), {}, set()),
+        ('team-members', reverse('team-members', args=[team.id]), {}, set()),
+        ('team-stats', reverse('team-stats', args=[team.id]), {'period': 'month'}, set()),
+        ('activity-list', reverse('activity-list'), {}, {'activities'}),
+        ('activity-list-user', reverse('activity-list'), {'user_id': user.id}, set()),
+        ('activity-list-type', reverse('activity-list'), {'activity_type': 'running'}, set()),
+        ('activity-list-window', reverse('activity-list'), window, set()),
+        ('activity-list-type-window', reverse('activity-list'), {'activity_type': 'running', **window}, set()),
+        ('activity-detail', reverse('activity-detail', args=[activity.id]), {}, set()),
+        ('leaderboard-list', reverse('leaderboard-list'), {}, {'leaderboard'}),
+        ('leaderboard-list-type', reverse('leaderboard-list'), {'type': 'user'}, set()),
+        ('leaderboard-list-window', reverse('leaderboard-list'), window, set()),
+        ('workout-list', reverse('workout-list'), {}, {'workouts'}),
+        ('workout-list-difficulty', reverse('workout-list'), {'difficulty': 'beginner'}, set()),
+        ('workout-list-type', reverse('workout-list'), {'activity_type': 'running'}, set()),
+        ('workout-detail', reverse('workout-detail', args=[workout.id]), {}, set()),
+        ('workout-suggest', reverse('workout-suggest'), {'difficulty': 'advanced'}, set()),
+        ('workout-suggest-user', reverse('workout-suggest'), {'user_id': user.id}, set()),
+        ('workout-suggest-user-difficulty', reverse('workout-suggest'), {'user_id': user.id, 'difficulty': 'advanced'}, set()),
+    ]
+
+
+def query_plan(sql, params=()):
+    """SQLite's plan for `sql` as a list of detail lines"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(sql, params=()):
+    """Tables `sql` reads in full"""
+    return [match.group(1) for match in map(FULL_SCAN.match, query_plan(sql, params)) if match]
+
+
+def find_full_scans(cases=None):
+    """Request every case and return [(case name, table, sql)] for disallowed full scans"""
+    if connection.vendor != 'sqlite':
+        raise ImproperlyConfigured(
+            f'Query plans are read with SQLite EXPLAIN QUERY PLAN; the database is {connection.vendor}'
+        )
+    client = Client()
+    problems = []
+    for name, url, params, allowed in cases or hot_requests():
+        get_response_cache().clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, params)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {url} returned {response.status_code}')
+        for query in queries.captured_queries:
+            if not query['sql'].lstrip().upper().startswith('SELECT'):
+                continue
+            problems.extend(
+                (name, table, query['sql']) for table in full_scans(query['sql']) if table not in allowed
+            )
+    return problems
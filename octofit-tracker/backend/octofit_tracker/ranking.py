@@ -0,0 +1,149 @@
+"""Leaderboard ranking for OctoFit Tracker
+
+Rows are ranked by points, highest first. settings.LEADERBOARD_RANKING picks
+how ties are ranked:
+
+* 'ordinal' (default): every row gets its own rank, ties broken by entity id
+  (ROW_NUMBER);
+* 'competition': tied rows share a rank and the next rank is skipped, as in
+  1, 1, 3 (RANK);
+* 'dense': tied rows share a rank and no rank is skipped, as in 1, 1, 2
+  (DENSE_RANK).
+
+`rank_all` ranks with a window function in the database and writes only the
+ranks that changed, in one UPDATE ... FROM where the backend supports it.
+`rerank_entry` handles one row whose points changed: it shifts only the rows
+between the row's old and new positions. Under dense ranking one changed row
+can renumber every row below it, so there it falls back to `rank_all`.
+`rank_rows` and `rerank_row` do the same for any queryset of ranked rows,
+such as one period's LeaderboardSnapshot rows.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import F, Q, Window
+from django.db.models.functions import DenseRank, Rank, RowNumber
+from .models import Leaderboard
+
+BATCH_SIZE = 1000
+RANK_FUNCTIONS = {'ordinal': RowNumber, 'competition': Rank, 'dense': DenseRank}
+
+
+def ranking_mode():
+    """The configured tie handling, one of RANK_FUNCTIONS"""
+    mode = getattr(settings, 'LEADERBOARD_RANKING', 'ordinal')
+    if mode not in RANK_FUNCTIONS:
+        raise ImproperlyConfigured(
+            f"Unknown LEADERBOARD_RANKING {mode!r}; expected one of {', '.join(RANK_FUNCTIONS)}"
+        )
+    return mode
+
+
+def rank_window(mode=None):
+    """Window expression computing each row's rank within its queryset"""
+    mode = mode or ranking_mode()
+    order_by = [F('total_points').desc()]
+    if mode == 'ordinal':
+        order_by.append(F('entity_id').asc())
+    return Window(RANK_FUNCTIONS[mode](), order_by=order_by)
+
+
+def ranks_for(points, mode=None):
+    """Ranks for a list of point totals already sorted highest first"""
+    mode = mode or ranking_mode()
+    ranks = []
+    for position, value in enumerate(points):
+        if position and mode != 'ordinal' and value == points[position - 1]:
+            ranks.append(ranks[-1])
+        elif mode == 'dense':
+            ranks.append(ranks[-1] + 1 if ranks else 1)
+        else:
+            ranks.append(position + 1)
+    return ranks
+
+
+def _supports_update_from():
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 33)
+
+
+def rank_all(entity_type, mode=None):
+    """Recompute every rank of `entity_type` in the database and return the number of rows that moved"""
+    return rank_rows(Leaderboard.objects.filter(entity_type=entity_type), mode)
+
+
+def rank_rows(rows, mode=None):
+    """Recompute the ranks of the rows in `rows` among themselves and return the number that moved"""
+    model = rows.model
+    ranked = rows.order_by().annotate(new_rank=rank_window(mode))
+    if _supports_update_from():
+        sql, params = ranked.values('id', 'new_rank').query.sql_with_params()
+        table = connection.ops.quote_name(model._meta.db_table)
+        rank = connection.ops.quote_name('rank')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET {rank} = ranked.new_rank FROM ({sql}) AS ranked '
+                f'WHERE {table}.id = ranked.id AND {table}.{rank} <> ranked.new_rank',
+                params,
+            )
+            return cursor.rowcount
+    moved = [
+        model(id=pk, rank=new_rank)
+        for pk, current_rank, new_rank in ranked.values_list('id', 'rank', 'new_rank').iterator()
+        if current_rank != new_rank
+    ]
+    model.objects.bulk_update(moved, ['rank'], batch_size=BATCH_SIZE)
+    return len(moved)
+
+
+def rerank_entry(entity_type, entity_id, points_change=None, mode=None):
+    """Move one row to its new position after its points changed by `points_change`.
+
+    Pass None for a row that has just been created. Ranks must be consistent
+    before the change. Returns the number of other rows whose rank moved.
+    """
+    return rerank_row(Leaderboard.objects.filter(entity_type=entity_type), entity_id, points_change, mode)
+
+
+def rerank_row(rows, entity_id, points_change=None, mode=None):
+    """Like `rerank_entry`, for the row of `entity_id` among `rows`"""
+    mode = mode or ranking_mode()
+    if mode == 'dense':
+        return rank_rows(rows, mode)
+    entry = rows.filter(entity_id=entity_id).values('id', 'total_points', 'rank').first()
+    if entry is None:
+        return 0
+    others = rows.exclude(id=entry['id'])
+    points, old_rank = entry['total_points'], entry['rank']
+
+    if mode == 'ordinal':
+        # A new row is created at the bottom, so its stored rank is its old position
+        new_rank = others.filter(
+            Q(total_points__gt=points) | Q(total_points=points, entity_id__lt=entity_id)
+        ).count() + 1
+        if new_rank < old_rank:
+            moved = others.filter(rank__gte=new_rank, rank__lt=old_rank).update(rank=F('rank') + 1)
+        elif new_rank > old_rank:
+            moved = others.filter(rank__gt=old_rank, rank__lte=new_rank).update(rank=F('rank') - 1)
+        else:
+            moved = 0
+    else:
+        # Competition rank is 1 + the number of rows with more points
+        new_rank = others.filter(total_points__gt=points).count() + 1
+        if points_change is None:
+            moved = others.filter(total_points__lt=points).update(rank=F('rank') + 1)
+        elif points_change > 0:
+            moved = others.filter(
+                total_points__gte=points - points_change, total_points__lt=points
+            ).update(rank=F('rank') + 1)
+        elif points_change < 0:
+            moved = others.filter(
+                total_points__gte=points, total_points__lt=points - points_change
+            ).update(rank=F('rank') - 1)
+        else:
+            moved = 0
+
+    if new_rank != old_rank:
+        rows.filter(id=entry['id']).update(rank=new_rank)
+    return moved
@@ -0,0 +1,196 @@
+"""Workout recommendations for OctoFit Tracker
+
+Each user's profile comes from their daily rollups over the last
+PROFILE_DAYS days: the share of activities of each type, and the average
+duration and calories per activity. A workout's score for the user is:
+
+* MIX_WEIGHT times the share of their recent activities of the workout's type;
+* DURATION_WEIGHT and CALORIE_WEIGHT times how close the workout's duration
+  and calorie estimate are to their averages (1 for an exact match, falling
+  towards 0 as they diverge).
+
+The best PER_DIFFICULTY workouts at each difficulty are stored in
+WorkoutRecommendation, so serving a user's suggestions is one indexed read.
+Reads never write: a user without stored rows is scored in memory.
+
+Activity writes refresh their user's rows once the transaction commits.
+Workout changes only flag every stored row as stale. Profiles are relative
+to the current day, so rows written before today are stale too. The
+leaderboard worker (see jobs.py) rescores users with stale rows in batches
+of USER_BATCH_SIZE, and reads serve the stale rows until it has.
+"""
+from datetime import datetime, time, timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+from .models import User, DailyActivityRollup, Workout, WorkoutRecommendation
+
+PROFILE_DAYS = 28
+PER_DIFFICULTY = 5
+MIX_WEIGHT = 0.6
+DURATION_WEIGHT = 0.2
+CALORIE_WEIGHT = 0.2
+USER_BATCH_SIZE = 1000
+
+# Workout columns a score reads
+SCORED_FIELDS = ('id', 'activity_type', 'difficulty', 'duration', 'calories_estimate')
+
+
+def user_profiles(user_ids, today=None):
+    """{user_id: profile} from recent rollups; users without recent activity are absent"""
+    since = (today or timezone.localdate()) - timedelta(days=PROFILE_DAYS)
+    rows = DailyActivityRollup.objects.filter(user_id__in=user_ids, day__gte=since).order_by().values(
+        'user_id', 'activity_type'
+    ).annotate(
+        activity_count=Sum('activity_count'),
+        total_duration=Sum('total_duration'),
+        total_calories=Sum('total_calories'),
+    )
+    totals = {}
+    for row in rows:
+        if row['activity_count'] <= 0:
+            continue
+        user = totals.setdefault(row['user_id'], {'counts': {}, 'duration': 0, 'calories': 0})
+        user['counts'][row['activity_type']] = row['activity_count']
+        user['duration'] += row['total_duration']
+        user['calories'] += row['total_calories']
+
+    profiles = {}
+    for user_id, user in totals.items():
+        activity_count = sum(user['counts'].values())
+        profiles[user_id] = {
+            'mix': {activity_type: count / activity_count for activity_type, count in user['counts'].items()},
+            'duration': user['duration'] / activity_count,
+            'calories': user['calories'] / activity_count,
+        }
+    return profiles
+
+
+def _closeness(value, target):
+    """1 when `value` equals `target`, falling towards 0 as they diverge"""
+    if not target:
+        return 0.0
+    return 1 / (1 + abs(value - target) / target)
+
+
+def score_workout(profile, workout):
+    """How well a workout (a values() row) suits a user profile, from 0 to 1"""
+    if profile is None:
+        return 0.0
+    return round(
+        MIX_WEIGHT * profile['mix'].get(workout['activity_type'], 0.0) +
+        DURATION_WEIGHT * _closeness(workout['duration'], profile['duration']) +
+        CALORIE_WEIGHT * _closeness(workout['calories_estimate'], profile['calories']),
+        6,
+    )
+
+
+def recommend(user_id, profile, workouts):
+    """Unsaved recommendations for one user: the best PER_DIFFICULTY workouts per difficulty.
+
+    Ties are broken by workout id, so users without a profile get the
+    catalogue in id order.
+    """
+    scored = sorted(
+        ((score_workout(profile, workout), workout) for workout in workouts),
+        key=lambda item: (item[1]['difficulty'], -item[0], item[1]['id']),
+    )
+    rows, ranks = [], {}
+    for score, workout in scored:
+        rank = ranks[workout['difficulty']] = ranks.get(workout['difficulty'], 0) + 1
+        if rank <= PER_DIFFICULTY:
+            rows.append(WorkoutRecommendation(
+                user_id=user_id, workout_id=workout['id'], difficulty=workout['difficulty'],
+                rank=rank, score=score,
+            ))
+    return rows
+
+
+def refresh_recommendations(user_ids=None):
+    """Recompute stored recommendations for `user_ids`, or for every user; returns the row count"""
+    workouts = list(Workout.objects.values(*SCORED_FIELDS))
+    users = User.objects.order_by('id').values_list('id', flat=True)
+    full = user_ids is None
+    if not full:
+        users = users.filter(id__in=user_ids)
+    user_ids = list(users)
+    created = 0
+    with transaction.atomic():
+        if full:
+            drop_recommendations()
+        for start in range(0, len(user_ids), USER_BATCH_SIZE):
+            batch = user_ids[start:start + USER_BATCH_SIZE]
+            profiles = user_profiles(batch)
+            rows = [row for user_id in batch for row in recommend(user_id, profiles.get(user_id), workouts)]
+            if not full:
+                WorkoutRecommendation.objects.filter(user_id__in=batch).delete()
+            WorkoutRecommendation.objects.bulk_create(rows, batch_size=USER_BATCH_SIZE)
+            created += len(rows)
+    return created
+
+
+def schedule_refresh(user_ids):
+    """Refresh `user_ids` once the current transaction commits (immediately outside one)"""
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: refresh_recommendations(user_ids))
+
+
+def drop_recommendations():
+    """Delete every stored recommendation"""
+    WorkoutRecommendation.objects.all().delete()
+
+
+def mark_stale():
+    """Flag every stored row for rescoring, without touching what reads return until then"""
+    return WorkoutRecommendation.objects.filter(stale=False).update(stale=True)
+
+
+def stale_user_ids(limit):
+    """Up to `limit` users whose rows are flagged stale or were written before today"""
+    start_of_day = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    rows = WorkoutRecommendation.objects.filter(Q(stale=True) | Q(updated_at__lt=start_of_day))
+    return list(rows.order_by('user_id').values_list('user_id', flat=True).distinct()[:limit])
+
+
+def refresh_stale_recommendations(batch_size=USER_BATCH_SIZE):
+    """Rescore one batch of users with stale rows and return how many were rescored"""
+    user_ids = stale_user_ids(batch_size)
+    if user_ids:
+        try:
+            refresh_recommendations(user_ids)
+        except IntegrityError:
+            # An activity write rescored one of these users at the same time; retry on the next call
+            return 0
+    return len(user_ids)
+
+
+def _score_in_memory(user_id, difficulty=None):
+    """Recommended workouts for a user without stored rows, scored now and not stored"""
+    workouts = {workout.id: workout for workout in Workout.objects.all()}
+    rows = recommend(
+        user_id, user_profiles([user_id]).get(user_id),
+        [{field: getattr(workout, field) for field in SCORED_FIELDS} for workout in workouts.values()],
+    )
+    if difficulty is not None:
+        rows = sorted((row for row in rows if row.difficulty == difficulty), key=lambda row: row.rank)
+    else:
+        rows = sorted(rows, key=lambda row: (-row.score, row.workout_id))
+    return [workouts[row.workout_id] for row in rows[:PER_DIFFICULTY]]
+
+
+def user_recommendations(user_id, difficulty=None):
+    """Recommended workouts for a user, best first, from their stored rows even when stale.
+
+    A user without stored rows is scored in memory. Returns None for an unknown user.
+    """
+    rows = WorkoutRecommendation.objects.filter(user_id=user_id)
+    if difficulty is not None:
+        rows = rows.filter(difficulty=difficulty).order_by('rank')
+    else:
+        rows = rows.order_by('-score', 'workout_id')
+    recommendations = [row.workout for row in rows.select_related('workout')[:PER_DIFFICULTY]]
+    if recommendations or WorkoutRecommendation.objects.filter(user_id=user_id).exists():
+        return recommendations
+    if not User.objects.filter(id=user_id).exists():
+        return None
+    return _score_in_memory(user_id, difficulty)
@@ -0,0 +1,58 @@
+"""Compact response renderers for OctoFit Tracker
+
+Both are picked through DRF content negotiation, with the Accept header or
+?format=, on every router endpoint:
+
+* ColumnarJSONRenderer (`application/vnd.octofit.columnar+json`,
+  ?format=columnar) sends a list of rows as one array per field, so field
+  names appear once instead of once per row. Paginated responses keep their
+  `next` and `previous` links and turn `results` into columns; anything that
+  is not a list of rows renders as plain JSON.
+* MessagePackRenderer (`application/msgpack`, ?format=msgpack) sends the
+  usual structure as MessagePack. It needs the msgpack package and is only
+  enabled in settings when that is installed.
+"""
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+def to_columns(rows):
+    """{field: [value of each row]} for a list of row dicts; missing values are None"""
+    names = {}
+    for row in rows:
+        names.update(dict.fromkeys(row))
+    return {name: [row.get(name) for row in rows] for name in names}
+
+
+def columnar(data):
+    """`data` with its list of rows, top-level or paginated, turned into columns"""
+    if isinstance(data, list) and all(isinstance(row, dict) for row in data):
+        return to_columns(data)
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        return {**data, 'results': columnar(data['results'])}
+    return data
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """JSON with rows sent as one array per field"""
+    media_type = 'application/vnd.octofit.columnar+json'
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(columnar(data), accepted_media_type, renderer_context)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack encoding of the usual response structure"""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        import msgpack
+
+        if data is None:
+            return b''
+        # Values DRF leaves to the JSON encoder (decimals, dates, ...) are encoded the same way
+        return msgpack.packb(data, default=JSONEncoder().default, use_bin_type=True)
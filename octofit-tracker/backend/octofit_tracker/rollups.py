@@ -0,0 +1,106 @@
+"""Daily activity rollups for OctoFit Tracker
+
+DailyActivityRollup holds one row per (user, day, activity type). Single
+activity writes apply a delta through model signals; bulk paths call
+`add_activities` or `rebuild_rollups` directly. Stats endpoints aggregate
+rollup rows instead of scanning activities.
+"""
+from collections import defaultdict
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from .models import Activity, DailyActivityRollup
+
+BATCH_SIZE = 1000
+
+
+def rollup_key(user_id, date, activity_type):
+    """Rollup row key for an activity dated `date`"""
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return (user_id, timezone.localdate(date), activity_type)
+
+
+def apply_delta(key, activity_count, duration, calories, distance):
+    """Add (or with negative values, subtract) totals to the rollup row for `key`"""
+    user_id, day, activity_type = key
+    rows = DailyActivityRollup.objects.filter(user_id=user_id, day=day, activity_type=activity_type)
+    changes = {
+        'activity_count': F('activity_count') + activity_count,
+        'total_duration': F('total_duration') + duration,
+        'total_calories': F('total_calories') + calories,
+        'total_distance': F('total_distance') + distance,
+    }
+    with transaction.atomic():
+        if not rows.update(**changes):
+            try:
+                with transaction.atomic():
+                    DailyActivityRollup.objects.create(
+                        user_id=user_id, day=day, activity_type=activity_type,
+                        activity_count=activity_count, total_duration=duration,
+                        total_calories=calories, total_distance=distance,
+                    )
+            except IntegrityError:
+                # Another writer created the row first
+                rows.update(**changes)
+        if activity_count < 0:
+            rows.filter(activity_count__lte=0).delete()
+
+
+def add_activity(activity, sign=1):
+    """Apply one activity to its rollup row (sign=-1 removes it)"""
+    apply_delta(
+        rollup_key(activity.user_id, activity.date, activity.activity_type),
+        sign,
+        sign * activity.duration,
+        sign * activity.calories,
+        sign * (activity.distance or 0),
+    )
+
+
+def add_activities(activities):
+    """Apply many new activities with one delta per affected rollup row"""
+    deltas = defaultdict(lambda: [0, 0, 0, 0.0])
+    for activity in activities:
+        delta = deltas[rollup_key(activity.user_id, activity.date, activity.activity_type)]
+        delta[0] += 1
+        delta[1] += activity.duration
+        delta[2] += activity.calories
+        delta[3] += activity.distance or 0
+    for key, delta in deltas.items():
+        apply_delta(key, *delta)
+
+
+def rebuild_rollups(user_ids=None):
+    """Recompute rollup rows from activities with one grouped query"""
+    activities = Activity.objects.all()
+    rollups = DailyActivityRollup.objects.all()
+    if user_ids is not None:
+        activities = activities.filter(user_id__in=user_ids)
+        rollups = rollups.filter(user_id__in=user_ids)
+
+    rows = activities.order_by().annotate(day=TruncDate('date')).values(
+        'user_id', 'day', 'activity_type'
+    ).annotate(
+        activity_count=Count('id'),
+        total_duration=Sum('duration'),
+        total_calories=Sum('calories'),
+        total_distance=Coalesce(Sum('distance'), Value(0.0)),
+    )
+    with transaction.atomic():
+        rollups.delete()
+        DailyActivityRollup.objects.bulk_create(
+            (DailyActivityRollup(**row) for row in rows.iterator()),
+            batch_size=BATCH_SIZE,
+        )
+
+
+def rollup_stats(rollups):
+    """Activity totals over a rollup queryset, shaped like the stats endpoints"""
+    return rollups.aggregate(
+        total_activities=Coalesce(Sum('activity_count'), 0),
+        total_duration=Sum('total_duration'),
+        total_calories=Sum('total_calories'),
+        total_distance=Sum('total_distance'),
+    )
@@ -1,9 +1,97 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import F
+from django.utils import timezone
 from rest_framework import serializers
-from .models import User, Team, Activity, Leaderboard, Workout
+from .metrics import timed_serialization
+from .models import User, Team, Activity, Leaderboard, LeaderboardJob, LeaderboardSnapshot, Workout
 
 
-class UserSerializer(serializers.ModelSerializer):
+def _field_list(params, name):
+    value = params.get(name, None)
+    if value is None:
+        return None
+    return [field.strip() for field in value.split(',') if field.strip()]
+
+
+def select_fields(params, available):
+    """Names from `available` kept by ?fields= and ?exclude=, in their original order.
+
+    Returns None when neither parameter is given.
+    """
+    included = _field_list(params, 'fields')
+    excluded = _field_list(params, 'exclude')
+    if included is None and excluded is None:
+        return None
+    for name, requested in (('fields', included), ('exclude', excluded)):
+        unknown = [field for field in requested or () if field not in available]
+        if unknown:
+            raise serializers.ValidationError({
+                name: f"Unknown field(s): {', '.join(unknown)}. Choose from: {', '.join(available)}."
+            })
+    selected = [
+        field for field in available
+        if (included is None or field in included) and field not in (excluded or ())
+    ]
+    if not selected:
+        raise serializers.ValidationError({'fields': 'No fields left to return.'})
+    return selected
+
+
+def readable_fields(serializer):
+    return [name for name, field in serializer.fields.items() if not field.write_only]
+
+
+def model_columns(serializer, names):
+    """Model field paths that serializer fields `names` read, for .only(); None if one is computed"""
+    model = serializer.Meta.model
+    columns = []
+    for name in names:
+        source = serializer.fields[name].source
+        if source == '*':
+            return None
+        parts = source.split('.')
+        try:
+            model._meta.get_field(parts[0])
+        except FieldDoesNotExist:
+            return None
+        columns.append(parts[0])
+        if len(parts) > 1:
+            columns.append('__'.join(parts))
+    return columns
+
+
+class TimedRepresentationMixin:
+    """Serializer mixin that reports the time spent in `to_representation` to the request metrics"""
+
+    def to_representation(self, instance):
+        return timed_serialization(super().to_representation, instance)
+
+
+class SparseFieldsMixin:
+    """ModelSerializer mixin that drops the fields left out by the request's ?fields= / ?exclude=.
+
+    Only applies to reads, so writes still validate every field.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return
+        selected = select_fields(request.query_params, readable_fields(self))
+        if selected is not None:
+            for name in readable_fields(self):
+                if name not in selected:
+                    self.fields.pop(name)
+
+
+class UserSerializer(TimedRepresentationMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for User model"""
+    team_id = serializers.PrimaryKeyRelatedField(
+        source='team', queryset=Team.objects.all(), allow_null=True, required=False
+    )
+
     class Meta:
         model = User
         fields = ['id', 'email', 'username', 'password', 'team_id', 'created_at', 'updated_at']
@@ -17,36 +105,25 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-class TeamSerializer(serializers.ModelSerializer):
+class TeamSerializer(TimedRepresentationMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for Team model"""
-    member_count = serializers.SerializerMethodField()
-
     class Meta:
         model = Team
         fields = ['id', 'name', 'description', 'member_count', 'created_at', 'updated_at']
 
-    def get_member_count(self, obj):
-        return User.objects.filter(team_id=obj.id).count()
 
-
-class ActivitySerializer(serializers.ModelSerializer):
-    """Serializer for Activity model"""
-    user_name = serializers.SerializerMethodField()
+class ActivitySerializer(TimedRepresentationMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    """Serializer for Activity model. Querysets should select_related('user')"""
+    user_id = serializers.PrimaryKeyRelatedField(source='user', queryset=User.objects.all())
+    user_name = serializers.CharField(source='user.username', read_only=True)
 
     class Meta:
         model = Activity
         fields = ['id', 'user_id', 'user_name', 'activity_type', 'duration', 'distance', 
                   'calories', 'date', 'notes', 'created_at', 'updated_at']
 
-    def get_user_name(self, obj):
-        try:
-            user = User.objects.get(id=obj.user_id)
-            return user.username
-        except User.DoesNotExist:
-            return None
-
 
-class LeaderboardSerializer(serializers.ModelSerializer):
+class LeaderboardSerializer(TimedRepresentationMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for Leaderboard model"""
     class Meta:
         model = Leaderboard
@@ -54,9 +131,127 @@ class LeaderboardSerializer(serializers.ModelSerializer):
                   'total_activities', 'total_calories', 'total_duration', 'rank', 'updated_at']
 
 
-class WorkoutSerializer(serializers.ModelSerializer):
+class LeaderboardSnapshotSerializer(TimedRepresentationMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    """Serializer for LeaderboardSnapshot model"""
+    class Meta:
+        model = LeaderboardSnapshot
+        fields = ['id', 'entity_id', 'entity_type', 'name', 'total_points', 'total_activities',
+                  'total_calories', 'total_duration', 'rank', 'period_start', 'period_end', 'updated_at']
+
+
+class LeaderboardJobSerializer(TimedRepresentationMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    """Serializer for LeaderboardJob model"""
+    class Meta:
+        model = LeaderboardJob
+        fields = ['id', 'mode', 'status', 'request_count', 'requested_at', 'started_at', 'finished_at',
+                  'users_updated', 'teams_updated', 'error']
+        read_only_fields = fields
+
+
+class WorkoutSerializer(TimedRepresentationMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for Workout model"""
     class Meta:
         model = Workout
         fields = ['id', 'title', 'description', 'activity_type', 'difficulty', 
                   'duration', 'calories_estimate', 'instructions', 'created_at', 'updated_at']
+
+
+def _datetime_representation(value, current_timezone):
+    """Match DRF's ISO 8601 DateTimeField output"""
+    if not value:
+        return None
+    if timezone.is_aware(value):
+        value = value.astimezone(current_timezone)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+class FastReadSerializer:
+    """Read-only list serializer over `.values()` rows.
+
+    Produces the same output as `serializer_class` without instantiating models
+    or running DRF's per-field machinery. The field mapping is compiled once per
+    class from the ModelSerializer's Meta: model columns and `annotations` are
+    read from the row (dates and datetimes formatted like DRF) and any other
+    field calls `get_<name>(row)`. Pass `fields` to output, and read, only
+    some of them.
+    """
+    serializer_class = None
+    annotations = {}
+    value_fields = ()
+    getters = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.serializer_class is None:
+            return
+        meta = cls.serializer_class.Meta
+        model_fields = {field.attname: field for field in meta.model._meta.concrete_fields}
+        cls.value_fields = [name for name in meta.fields if name in model_fields]
+        getters = []
+        for name in meta.fields:
+            if name in cls.annotations:
+                getters.append((name, 'value', None))
+            elif name not in model_fields:
+                getters.append((name, 'method', getattr(cls, f'get_{name}')))
+            elif isinstance(model_fields[name], models.DateTimeField):
+                getters.append((name, 'datetime', None))
+            elif isinstance(model_fields[name], models.DateField):
+                getters.append((name, 'date', None))
+            else:
+                getters.append((name, 'value', None))
+        cls.getters = getters
+
+    def __init__(self, fields=None):
+        if fields is not None:
+            self.getters = [getter for getter in self.getters if getter[0] in fields]
+            self.value_fields = [name for name in self.value_fields if name in fields]
+            self.annotations = {name: value for name, value in self.annotations.items() if name in fields}
+
+    @classmethod
+    def field_names(cls):
+        return [name for name, kind, method in cls.getters]
+
+    def values(self, queryset, extra=()):
+        """Project `queryset` onto the columns this serializer reads, plus `extra` columns"""
+        columns = self.value_fields + [name for name in extra if name not in self.value_fields]
+        return queryset.values(*columns, **self.annotations)
+
+    def to_representation(self, rows):
+        # Run a pending query first, so only the serializing is timed
+        return timed_serialization(self._represent, list(rows))
+
+    def _represent(self, rows):
+        current_timezone = timezone.get_current_timezone()
+        data = []
+        for row in rows:
+            item = {}
+            for name, kind, method in self.getters:
+                if kind == 'value':
+                    item[name] = row[name]
+                elif kind == 'datetime':
+                    item[name] = _datetime_representation(row[name], current_timezone)
+                elif kind == 'date':
+                    item[name] = row[name].isoformat() if row[name] else None
+                else:
+                    item[name] = method(self, row)
+            data.append(item)
+        return data
+
+
+class FastActivitySerializer(FastReadSerializer):
+    """Fast read path with the output of ActivitySerializer"""
+    serializer_class = ActivitySerializer
+    annotations = {'user_name': F('user__username')}
+
+
+class FastLeaderboardSerializer(FastReadSerializer):
+    """Fast read path with the output of LeaderboardSerializer"""
+    serializer_class = LeaderboardSerializer
+
+
+class FastLeaderboardSnapshotSerializer(FastReadSerializer):
+    """Fast read path with the output of LeaderboardSnapshotSerializer"""
+    serializer_class = LeaderboardSnapshotSerializer
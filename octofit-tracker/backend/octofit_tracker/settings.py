@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
 import os
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -55,6 +56,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'octofit_tracker.middleware.RequestMetricsMiddleware',
+    'octofit_tracker.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -97,6 +100,25 @@ DATABASES = {
     }
 }
 
+# Database profile (see octofit_tracker/database.py). 'production' keeps
+# connections open between requests, checking them before reuse, and tunes
+# every SQLite connection with WAL, synchronous=NORMAL, a busy timeout and
+# larger page cache and memory map.
+DATABASE_PROFILE = os.environ.get('OCTOFIT_DB_PROFILE', 'default')
+if DATABASE_PROFILE == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': int(os.environ.get('OCTOFIT_DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+    })
+
+# Compute stats and leaderboard totals with MongoDB aggregation pipelines
+# instead of translated SQL (see octofit_tracker/mongo.py); off unless
+# OCTOFIT_MONGO_URI is set, e.g. when running on the djongo backend below
+MONGO_DAL = {
+    'URI': os.environ.get('OCTOFIT_MONGO_URI'),
+    'NAME': os.environ.get('OCTOFIT_MONGO_DB', 'octofit_db'),
+}
+
 # MongoDB configuration (for reference when migrating to production)
 # DATABASES = {
 #     'default': {
@@ -111,6 +133,47 @@ DATABASES = {
 # }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+# Local memory by default; set OCTOFIT_CACHE_BACKEND/OCTOFIT_CACHE_LOCATION to a
+# shared backend (e.g. django.core.cache.backends.redis.RedisCache) so response
+# cache invalidation reaches every worker process.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('OCTOFIT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('OCTOFIT_CACHE_LOCATION', 'octofit'),
+    }
+}
+
+# Cached API responses (see octofit_tracker/caching.py)
+RESPONSE_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': int(os.environ.get('OCTOFIT_RESPONSE_CACHE_TIMEOUT', 300)),
+}
+
+
+# How tied leaderboard points are ranked: 'ordinal' (1, 2, 3, ties broken by
+# entity id), 'competition' (1, 1, 3) or 'dense' (1, 1, 2); see ranking.py
+LEADERBOARD_RANKING = os.environ.get('OCTOFIT_LEADERBOARD_RANKING', 'ordinal')
+
+# Seconds between checks of the leaderboard table for writes made by other
+# processes, which the in-memory standings (see standings.py) then reload
+LEADERBOARD_INDEX_CHECK_SECONDS = float(os.environ.get('OCTOFIT_LEADERBOARD_INDEX_CHECK_SECONDS', 5))
+
+# Most activities one bulk ingest request may carry (see octofit_tracker/ingest.py);
+# larger payloads are rejected with 413 and should be split
+BULK_INGEST_MAX_ITEMS = int(os.environ.get('OCTOFIT_BULK_INGEST_MAX_ITEMS', 10000))
+
+# Response compression (see octofit_tracker/compression.py): codings in
+# preference order, skipped when not installed, and the smallest body worth
+# compressing
+RESPONSE_COMPRESSION = {
+    'ENCODINGS': os.environ.get('OCTOFIT_COMPRESSION_ENCODINGS', 'br,zstd,gzip').split(','),
+    'MIN_SIZE': int(os.environ.get('OCTOFIT_COMPRESSION_MIN_SIZE', 1024)),
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -152,6 +215,20 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Django REST Framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'octofit_tracker.pagination.DefaultCursorPagination',
+    'PAGE_SIZE': 50,
+    # Compact list formats, picked with the Accept header or ?format=columnar / ?format=msgpack
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'octofit_tracker.renderers.ColumnarJSONRenderer',
+    ] + (['octofit_tracker.renderers.MessagePackRenderer'] if find_spec('msgpack') else []),
+}
+
 # CORS Configuration
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_METHODS = [
@@ -173,3 +250,6 @@ CORS_ALLOW_HEADERS = [
     'x-csrftoken',
     'x-requested-with',
 ]
+CORS_EXPOSE_HEADERS = [
+    'server-timing',
+]
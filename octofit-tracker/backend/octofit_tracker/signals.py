@@ -0,0 +1,155 @@
+"""Model signal handlers for OctoFit Tracker"""
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from .caching import invalidate_responses
+from .database import configure_sqlite
+from .middleware import install_query_recorder
+from .recommendations import mark_stale, schedule_refresh
+from .leaderboard import apply_activity_changes, move_member_totals, remove_user_totals
+from .models import User, Team, Activity, DailyActivityRollup, Leaderboard, Workout
+from .rollups import add_activity
+from .standings import bump_table_version
+from .teams import adjust_member_counts
+
+
+def _deleted_with_user(origin):
+    """Whether a delete started from a User or a User queryset"""
+    return isinstance(origin, User) or (isinstance(origin, QuerySet) and origin.model is User)
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_team(sender, instance, raw=False, **kwargs):
+    """Record the stored team_id so post_save can tell whether it changed"""
+    if raw:
+        return
+    previous = None
+    if instance.pk is not None:
+        previous = User.objects.filter(pk=instance.pk).values_list('team_id', flat=True).first()
+    instance._previous_team_id = previous
+
+
+@receiver(post_save, sender=User)
+def update_team_member_counts(sender, instance, created, raw=False, **kwargs):
+    """Keep Team.member_count in step with User.team_id"""
+    if raw:
+        return
+    previous = None if created else getattr(instance, '_previous_team_id', None)
+    adjust_member_counts(previous, instance.team_id)
+
+
+@receiver(post_save, sender=User)
+def move_team_leaderboard_totals(sender, instance, created, raw=False, **kwargs):
+    """Move the user's activity totals between team rows when their team changes"""
+    if not created and not raw:
+        move_member_totals(instance.pk, getattr(instance, '_previous_team_id', None), instance.team_id)
+
+
+@receiver(pre_delete, sender=User)
+def remove_user_activity_totals(sender, instance, **kwargs):
+    """Take the user's activities off the leaderboard and rollups before they cascade.
+
+    One aggregated delta replaces a delta per activity; the Activity delete
+    receivers skip activities deleted along with their user.
+    """
+    remove_user_totals(instance.pk)
+    DailyActivityRollup.objects.filter(user_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=User)
+def release_team_membership(sender, instance, **kwargs):
+    """Decrement the member count of a deleted user's team"""
+    adjust_member_counts(instance.team_id, None)
+
+
+@receiver(post_delete, sender=User)
+def delete_user_leaderboard_row(sender, instance, **kwargs):
+    """Drop a deleted user's row; their activities were already removed from the team row"""
+    Leaderboard.objects.filter(entity_type='user', entity_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=Team)
+def delete_team_leaderboard_row(sender, instance, **kwargs):
+    """Drop a deleted team's row"""
+    Leaderboard.objects.filter(entity_type='team', entity_id=instance.pk).delete()
+
+
+@receiver(pre_save, sender=Activity)
+def remember_previous_activity(sender, instance, raw=False, **kwargs):
+    """Load the stored activity so post_save can reverse its rollup contribution"""
+    if raw:
+        return
+    previous = None
+    if instance.pk is not None:
+        previous = Activity.objects.filter(pk=instance.pk).only(
+            'user_id', 'date', 'activity_type', 'duration', 'calories', 'distance'
+        ).first()
+    instance._previous_activity = previous
+
+
+@receiver(post_save, sender=Activity)
+def update_rollups_on_save(sender, instance, created, raw=False, **kwargs):
+    """Move the activity's totals into its (possibly new) rollup row"""
+    if raw:
+        return
+    previous = None if created else getattr(instance, '_previous_activity', None)
+    if previous is not None:
+        add_activity(previous, sign=-1)
+    add_activity(instance)
+
+
+@receiver(post_delete, sender=Activity)
+def update_rollups_on_delete(sender, instance, origin=None, **kwargs):
+    """Remove a deleted activity's totals from its rollup row"""
+    if not _deleted_with_user(origin):
+        add_activity(instance, sign=-1)
+
+
+@receiver(post_save, sender=Activity)
+def update_leaderboard_on_save(sender, instance, created, raw=False, **kwargs):
+    """Move the activity's totals into its user's and team's leaderboard rows"""
+    if raw:
+        return
+    previous = None if created else getattr(instance, '_previous_activity', None)
+    changes = [(instance, 1)]
+    if previous is not None:
+        changes.insert(0, (previous, -1))
+    apply_activity_changes(changes)
+
+
+@receiver(post_delete, sender=Activity)
+def update_leaderboard_on_delete(sender, instance, origin=None, **kwargs):
+    """Remove a deleted activity's totals from its user's and team's leaderboard rows"""
+    if not _deleted_with_user(origin):
+        apply_activity_changes([(instance, -1)])
+
+
+@receiver([post_save, post_delete], sender=Activity)
+def refresh_user_recommendations(sender, instance, raw=False, origin=None, **kwargs):
+    """Rescore the activity's user once the write commits"""
+    if not raw and not _deleted_with_user(origin):
+        schedule_refresh([instance.user_id])
+
+
+@receiver([post_save, post_delete], sender=Leaderboard)
+def invalidate_leaderboard_cache(sender, **kwargs):
+    """Drop cached leaderboard responses and count the write when a row is written outside a refresh"""
+    bump_table_version()
+    invalidate_responses('leaderboard')
+
+
+@receiver([post_save, post_delete], sender=Workout)
+def invalidate_workout_cache(sender, **kwargs):
+    """Drop cached workout responses when a workout changes"""
+    invalidate_responses('workouts')
+
+
+@receiver([post_save, post_delete], sender=Workout)
+def mark_recommendations_stale(sender, **kwargs):
+    """Stored recommendations no longer cover the catalogue once a workout changes; the worker rescores them"""
+    mark_stale()
+
+
+connection_created.connect(install_query_recorder, dispatch_uid='octofit_query_recorder')
+connection_created.connect(configure_sqlite, dispatch_uid='octofit_configure_sqlite')
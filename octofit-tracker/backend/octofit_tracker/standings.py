@@ -0,0 +1,260 @@
+"""In-memory leaderboard standings for OctoFit Tracker
+
+`?top=N` on the leaderboard and the `around` action are served from a sorted
+copy of the Leaderboard table kept in each process, so they do not query the
+database. Each entity type's rows are kept in a list sorted by
+(-total_points, entity_id), which is the ordinal rank order, so a row's
+position is found with bisect in O(log n). Ranks are computed from positions
+under settings.LEADERBOARD_RANKING rather than read from the stored column.
+
+The index is tagged with the 'leaderboard' response cache version (see
+caching.py), which every leaderboard write bumps. A read that finds a newer
+version reloads the table with one query. Activity deltas applied in this
+process go through `sync_entries`, which re-reads just the rows they touched
+and updates the index in place when no other write happened in between.
+
+The cache version only reaches other processes through a shared cache, so
+writes made elsewhere (the leaderboard worker, reconcile_leaderboard --fix,
+other API processes) are also caught through the database: every write to
+the table bumps the LeaderboardVersion row in its own transaction (see
+`bump_table_version`), and at most every
+settings.LEADERBOARD_INDEX_CHECK_SECONDS a read compares that row with the
+index by primary key and reloads when it moved.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from .caching import invalidate_responses, namespace_version
+from .models import Leaderboard, LeaderboardVersion
+from .ranking import ranking_mode
+from .serializers import FastLeaderboardSerializer
+
+MAX_TOP = 500
+DEFAULT_RADIUS = 5
+MAX_RADIUS = 100
+
+FIELDS = FastLeaderboardSerializer.value_fields
+POINTS = FIELDS.index('total_points')
+ENTITY_ID = FIELDS.index('entity_id')
+ENTITY_TYPE = FIELDS.index('entity_type')
+
+
+class Standings:
+    """Rows of one entity type in rank order"""
+
+    def __init__(self, rows=()):
+        self.keys = []
+        self.rows = {}
+        # Distinct point totals, negated and sorted, for dense ranks
+        self.points = []
+        self.point_counts = Counter()
+        for row in rows:
+            self.insert(row)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @staticmethod
+    def key(row):
+        return (-row[POINTS], row[ENTITY_ID])
+
+    def insert(self, row):
+        """Add a row that is not in the index yet"""
+        key = self.key(row)
+        if not self.keys or key > self.keys[-1]:
+            self.keys.append(key)
+        else:
+            insort(self.keys, key)
+        self.rows[row[ENTITY_ID]] = row
+        if not self.point_counts[key[0]]:
+            insort(self.points, key[0])
+        self.point_counts[key[0]] += 1
+
+    def remove(self, entity_id):
+        """Drop a row; unknown ids are ignored"""
+        row = self.rows.pop(entity_id, None)
+        if row is None:
+            return
+        key = self.key(row)
+        del self.keys[bisect_left(self.keys, key)]
+        self.point_counts[key[0]] -= 1
+        if not self.point_counts[key[0]]:
+            del self.point_counts[key[0]]
+            del self.points[bisect_left(self.points, key[0])]
+
+    def upsert(self, row):
+        self.remove(row[ENTITY_ID])
+        self.insert(row)
+
+    def rank(self, position, mode):
+        """Rank of the row at `position` under `mode`"""
+        negated_points = self.keys[position][0]
+        if mode == 'competition':
+            return bisect_left(self.keys, (negated_points,)) + 1
+        if mode == 'dense':
+            return bisect_left(self.points, negated_points) + 1
+        return position + 1
+
+    def position(self, entity_id):
+        """Position of `entity_id` in rank order, or None when it has no row"""
+        row = self.rows.get(entity_id)
+        if row is None:
+            return None
+        return bisect_left(self.keys, self.key(row))
+
+    def slice(self, start, stop, mode=None):
+        """Value rows with their ranks for positions [start, stop)"""
+        mode = mode or ranking_mode()
+        start = max(start, 0)
+        result = []
+        for position in range(start, min(stop, len(self.keys))):
+            row = dict(zip(FIELDS, self.rows[self.keys[position][1]]))
+            row['rank'] = self.rank(position, mode)
+            result.append(row)
+        return result
+
+    def top(self, count, mode=None):
+        return self.slice(0, count, mode)
+
+    def around(self, entity_id, radius, mode=None):
+        """Rows within `radius` positions of `entity_id`, or None when it has no row"""
+        position = self.position(entity_id)
+        if position is None:
+            return None
+        return self.slice(position - radius, position + radius + 1, mode)
+
+
+class LeaderboardIndex:
+    """Standings for every entity type, as of one leaderboard cache version and table version"""
+
+    def __init__(self, version, table_version, rows=()):
+        self.version = version
+        self.table_version = table_version
+        self.standings = {}
+        self.checked_at = time.monotonic()
+        for row in rows:
+            self.upsert(row)
+
+    def get(self, entity_type):
+        return self.standings.setdefault(entity_type, Standings())
+
+    def upsert(self, row):
+        self.remove(row[ENTITY_TYPE], row[ENTITY_ID])
+        self.get(row[ENTITY_TYPE]).insert(row)
+
+    def remove(self, entity_type, entity_id):
+        self.get(entity_type).remove(entity_id)
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def _rows(queryset):
+    return queryset.order_by('entity_type', '-total_points', 'entity_id').values_list(*FIELDS)
+
+
+def load_index():
+    """Read the whole leaderboard into a new index"""
+    # Read the versions first so a write landing during the load forces another one
+    version = namespace_version('leaderboard')
+    return LeaderboardIndex(version, table_version(), _rows(Leaderboard.objects.all()).iterator())
+
+
+def table_version():
+    """The LeaderboardVersion count of writes to the Leaderboard table"""
+    return LeaderboardVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+
+def bump_table_version():
+    """Count a write to the Leaderboard table and return the new table version.
+
+    Call it in the writing transaction. The row stays locked until the
+    transaction ends, so the value read back is this write's own.
+    """
+    if not LeaderboardVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        LeaderboardVersion.objects.bulk_create([LeaderboardVersion(pk=1, version=1)], ignore_conflicts=True)
+    return table_version()
+
+
+def _is_current(index):
+    """Whether `index` still matches the table, checking the table at most every check interval"""
+    if index.version != namespace_version('leaderboard'):
+        return False
+    now = time.monotonic()
+    if now - index.checked_at < settings.LEADERBOARD_INDEX_CHECK_SECONDS:
+        return True
+    if table_version() != index.table_version:
+        return False
+    index.checked_at = now
+    return True
+
+
+def get_standings(entity_type):
+    """Current standings for `entity_type`, reloading the index when the leaderboard changed"""
+    global _index
+    with _lock:
+        if _index is None or not _is_current(_index):
+            _index = load_index()
+        return _index.get(entity_type)
+
+
+def top(entity_type, count):
+    """The best `count` rows of `entity_type`"""
+    standings = get_standings(entity_type)
+    with _lock:
+        return standings.top(count)
+
+
+def around(entity_type, entity_id, radius):
+    """Rows within `radius` ranks of an entity, or None when it is not on the leaderboard"""
+    standings = get_standings(entity_type)
+    with _lock:
+        return standings.around(entity_id, radius)
+
+
+def apply_entries(keys, version, written):
+    """Update the index in place from the stored rows for (entity_type, entity_id) `keys`.
+
+    `version` and `written` are the cache and table versions these writes
+    produced. The index only adopts them when it was current just
+    before, otherwise it is left stale and reloaded on the next read.
+    """
+    with _lock:
+        if _index is None or (_index.version, _index.table_version) != (version - 1, written - 1):
+            return False
+        found = set()
+        if keys:
+            condition = Q()
+            for entity_type, entity_id in keys:
+                condition |= Q(entity_type=entity_type, entity_id=entity_id)
+            for row in _rows(Leaderboard.objects.filter(condition)):
+                _index.upsert(row)
+                found.add((row[ENTITY_TYPE], row[ENTITY_ID]))
+        for entity_type, entity_id in set(keys) - found:
+            _index.remove(entity_type, entity_id)
+        _index.version = version
+        _index.table_version = written
+        return True
+
+
+def sync_entries(keys):
+    """Count the write now, then once the transaction commits drop cached responses and update the index for `keys`"""
+    keys = list(keys)
+    written = bump_table_version()
+
+    def sync():
+        apply_entries(keys, invalidate_responses('leaderboard'), written)
+
+    transaction.on_commit(sync)
+
+
+def reset_index():
+    """Forget the index; the next read loads it again"""
+    global _index
+    with _lock:
+        _index = None
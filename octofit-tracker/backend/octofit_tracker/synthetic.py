@@ -0,0 +1,186 @@
+"""Synthetic data generation for OctoFit Tracker
+
+Builds datasets of arbitrary size with bulk_create in batches, then derives
+rollups, member counts, the leaderboard and workout recommendations once at
+the end. Activity generation can be spread over several forked worker
+processes.
+"""
+import multiprocessing
+import random
+from datetime import timedelta
+from django.db import connection, connections
+from django.utils import timezone
+from .leaderboard import refresh_leaderboard
+from .models import User, Team, Activity, Workout
+from .recommendations import refresh_recommendations
+from .rollups import rebuild_rollups
+from .teams import sync_member_counts
+
+DEFAULT_BATCH_SIZE = 5000
+ACTIVITY_TYPES = ['running', 'cycling', 'swimming', 'walking', 'weightlifting', 'yoga']
+DISTANCE_TYPES = {'running', 'cycling', 'swimming', 'walking'}
+DIFFICULTIES = ['beginner', 'intermediate', 'advanced']
+NOTES = ['Great workout!', 'Feeling strong today', 'Good progress', 'New personal best!', '']
+
+
+def _batched(objects, batch_size):
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate_activities(rng, user_ids, activities_per_user, days, now):
+    """Yield unsaved activities, `activities_per_user` for each user"""
+    seconds = days * 24 * 60 * 60
+    for user_id in user_ids:
+        for _ in range(activities_per_user):
+            activity_type = rng.choice(ACTIVITY_TYPES)
+            yield Activity(
+                user_id=user_id,
+                activity_type=activity_type,
+                duration=rng.randint(20, 120),
+                distance=round(rng.uniform(1.0, 20.0), 2) if activity_type in DISTANCE_TYPES else None,
+                calories=rng.randint(100, 800),
+                date=now - timedelta(seconds=rng.randint(0, seconds)),
+                notes=rng.choice(NOTES),
+            )
+
+
+def insert_activities(user_ids, activities_per_user, days, seed, batch_size, now):
+    """Generate and bulk insert activities for `user_ids`, returning the row count"""
+    rng = random.Random(seed)
+    created = 0
+    activities = generate_activities(rng, user_ids, activities_per_user, days, now)
+    for batch in _batched(activities, batch_size):
+        Activity.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def _activity_chunk_worker(arguments):
+    """Generate one chunk of activities; insert it here unless the parent must write"""
+    user_ids, activities_per_user, days, seed, now, insert = arguments
+    activities = list(generate_activities(random.Random(seed), user_ids, activities_per_user, days, now))
+    if not insert:
+        return activities
+    try:
+        Activity.objects.bulk_create(activities)
+        return len(activities)
+    finally:
+        connections.close_all()
+
+
+def insert_activities_parallel(user_ids, activities_per_user, days, seed, batch_size, now, workers):
+    """Generate activities in `workers` forked processes, one batch-sized chunk of users at a time.
+
+    SQLite allows a single writer, so there the workers only generate rows and
+    the parent inserts them; other databases insert from the workers directly.
+    Falls back to a single process where fork is unavailable.
+    """
+    if workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        return insert_activities(user_ids, activities_per_user, days, seed, batch_size, now)
+
+    users_per_chunk = max(1, batch_size // max(1, activities_per_user))
+    insert_in_workers = connection.vendor != 'sqlite'
+    chunks = [
+        (
+            user_ids[start:start + users_per_chunk], activities_per_user, days,
+            None if seed is None else seed + start, now, insert_in_workers,
+        )
+        for start in range(0, len(user_ids), users_per_chunk)
+    ]
+    # Forked children must not share the parent's open database connections
+    connections.close_all()
+    created = 0
+    with multiprocessing.get_context('fork').Pool(workers) as pool:
+        for result in pool.imap(_activity_chunk_worker, chunks):
+            if insert_in_workers:
+                created += result
+            else:
+                Activity.objects.bulk_create(result)
+                created += len(result)
+    return created
+
+
+def derive_tables(log=None):
+    """Compute rollups, team member counts, the leaderboard and recommendations from raw rows"""
+    log = log or (lambda message: None)
+    log('Computing rollups, member counts, leaderboard and recommendations...')
+    rebuild_rollups()
+    sync_member_counts()
+    refresh_leaderboard()
+    refresh_recommendations()
+
+
+def generate_dataset(users=100, teams=4, activities_per_user=10, days=30, workouts=24,
+                     seed=None, batch_size=DEFAULT_BATCH_SIZE, workers=1, log=None):
+    """Insert a synthetic dataset and compute its derived tables.
+
+    Returns a dict with the number of rows created per model.
+    """
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+    now = timezone.now()
+
+    log(f'Creating {teams} teams...')
+    first_team = Team.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    Team.objects.bulk_create(
+        (
+            Team(name=f'Team {first_team + number}', description=f'Synthetic team {first_team + number}')
+            for number in range(1, teams + 1)
+        ),
+        batch_size=batch_size,
+    )
+    team_ids = list(Team.objects.filter(id__gt=first_team).order_by('id').values_list('id', flat=True))
+
+    log(f'Creating {users} users...')
+    first_user = User.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    User.objects.bulk_create(
+        (
+            User(
+                email=f'athlete{first_user + number}@octofit.test',
+                username=f'Athlete {first_user + number}',
+                password='synthetic',
+                team_id=team_ids[number % len(team_ids)] if team_ids else None,
+            )
+            for number in range(1, users + 1)
+        ),
+        batch_size=batch_size,
+    )
+    user_ids = list(User.objects.filter(id__gt=first_user).order_by('id').values_list('id', flat=True))
+
+    log(f'Creating {len(user_ids) * activities_per_user} activities with {workers} worker(s)...')
+    activity_count = insert_activities_parallel(
+        user_ids, activities_per_user, days, seed, batch_size, now, workers
+    )
+
+    log(f'Creating {workouts} workouts...')
+    Workout.objects.bulk_create(
+        (
+            Workout(
+                title=f'Workout {number}',
+                description='Synthetic workout',
+                activity_type=ACTIVITY_TYPES[number % len(ACTIVITY_TYPES)],
+                difficulty=DIFFICULTIES[number % len(DIFFICULTIES)],
+                duration=rng.randint(20, 90),
+                calories_estimate=rng.randint(100, 700),
+                instructions='1. Warm up\n2. Work\n3. Cool down',
+            )
+            for number in range(1, workouts + 1)
+        ),
+        batch_size=batch_size,
+    )
+
+    derive_tables(log)
+
+    return {
+        'teams': len(team_ids),
+        'users': len(user_ids),
+        'activities': activity_count,
+        'workouts': workouts,
+    }
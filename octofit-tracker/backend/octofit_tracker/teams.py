@@ -0,0 +1,29 @@
+"""Team member count maintenance for OctoFit Tracker"""
+from django.db.models import Count, F
+from .models import Team
+
+
+def adjust_member_counts(old_team_id, new_team_id):
+    """Move one member from `old_team_id` to `new_team_id` (either may be None)"""
+    if old_team_id == new_team_id:
+        return
+    if old_team_id is not None:
+        Team.objects.filter(id=old_team_id).update(member_count=F('member_count') - 1)
+    if new_team_id is not None:
+        Team.objects.filter(id=new_team_id).update(member_count=F('member_count') + 1)
+
+
+def sync_member_counts():
+    """Recompute every team's member count from a single grouped query.
+
+    Use after writes that bypass model signals, such as bulk_create or
+    QuerySet.update on User.team.
+    """
+    teams = Team.objects.only('id', 'member_count').annotate(members_total=Count('members'))
+    changed = []
+    for team in teams:
+        if team.member_count != team.members_total:
+            team.member_count = team.members_total
+            changed.append(team)
+    Team.objects.bulk_update(changed, ['member_count'], batch_size=1000)
+    return len(changed)
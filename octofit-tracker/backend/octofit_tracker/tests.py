@@ -1,9 +1,67 @@
-from django.test import TestCase
+from asgiref.sync import async_to_sync
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework import status
-from .models import User, Team, Activity, Leaderboard, Workout
-from datetime import datetime
+from django.core import serializers
+from django.core.management import call_command
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Sum
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from .models import (
+    User, Team, Activity, DailyActivityRollup, Leaderboard, LeaderboardJob, LeaderboardSnapshot, Workout,
+    WorkoutRecommendation
+)
+from .serializers import (
+    ActivitySerializer, LeaderboardSerializer, LeaderboardSnapshotSerializer, UserSerializer,
+    FastActivitySerializer, FastLeaderboardSerializer
+)
+from rest_framework.renderers import JSONRenderer
+from . import benchmarks, mongo
+from .async_views import in_own_connection
+from .benchmarks import (
+    api as benchmark_api, concurrency as benchmark_concurrency, payloads as benchmark_payloads,
+    ranking as benchmark_ranking, serializers as benchmark_serializers, writes as benchmark_writes,
+)
+from .caching import get_response_cache, invalidate_responses, namespace_version
+from .compression import CODECS, negotiate
+from .database import PROFILES, apply_pragmas, configure_sqlite
+from .jobs import claim_next_job, enqueue_refresh, recover_stale_jobs, run_job
+from .metrics import Histogram, SerializeTimer, current_serialize_timer, registry as metrics_registry
+from .leaderboard import (
+    compute_team_entries, compute_user_entries, find_drift, materialize_period, period_snapshot,
+    refresh_leaderboard, snapshot_rows
+)
+from .periods import period_window
+from .queryplans import find_full_scans, full_scans
+from .ranking import rank_all, ranks_for, rerank_entry
+from .standings import Standings, bump_table_version, reset_index
+from .recommendations import refresh_recommendations, refresh_stale_recommendations
+from .renderers import columnar
+from .rollups import rebuild_rollups
+from .synthetic import generate_dataset
+from .teams import sync_member_counts
+from datetime import date, datetime, timedelta
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
 
 
 class UserModelTest(TestCase):
@@ -243,3 +301,1877 @@ class APITestCases(APITestCase):
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Activity.objects.count(), 1)
+
+
+class LeaderboardRefreshTest(APITestCase):
+    """Test cases for leaderboard recomputation"""
+
+    def setUp(self):
+        self.team = Team.objects.create(name="Refresh Team")
+        self.runner = User.objects.create(
+            email="runner@example.com", username="runner", password="pass", team_id=self.team.id
+        )
+        self.walker = User.objects.create(
+            email="walker@example.com", username="walker", password="pass", team_id=self.team.id
+        )
+        self.idle = User.objects.create(email="idle@example.com", username="idle", password="pass")
+        for calories in (300, 500):
+            Activity.objects.create(
+                user_id=self.runner.id, activity_type="running", duration=30,
+                calories=calories, date=timezone.now()
+            )
+        Activity.objects.create(
+            user_id=self.walker.id, activity_type="walking", duration=60,
+            calories=200, date=timezone.now()
+        )
+
+    def test_full_refresh_totals_and_ranks(self):
+        """Test refresh computes totals and ranks for users and teams"""
+        response = self.client.post(reverse('leaderboard-refresh'))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['mode'], 'full')
+        call_command('leaderboard_worker', once=True, allow_local_cache=True, stdout=io.StringIO())
+
+        runner = Leaderboard.objects.get(entity_type='user', entity_id=self.runner.id)
+        self.assertEqual(runner.total_points, 2 * 10 + 800)
+        self.assertEqual(runner.total_duration, 60)
+        self.assertEqual(runner.rank, 1)
+        self.assertEqual(Leaderboard.objects.get(entity_type='user', entity_id=self.walker.id).rank, 2)
+        idle = Leaderboard.objects.get(entity_type='user', entity_id=self.idle.id)
+        self.assertEqual((idle.total_points, idle.rank), (0, 3))
+
+        team = Leaderboard.objects.get(entity_type='team', entity_id=self.team.id)
+        self.assertEqual(team.total_activities, 3)
+        self.assertEqual(team.total_calories, 1000)
+        self.assertEqual(team.rank, 1)
+
+    def test_refresh_query_count_does_not_grow_with_users(self):
+        """Test a full refresh runs a fixed number of queries"""
+        refresh_leaderboard()
+        with CaptureQueriesContext(connection) as small:
+            refresh_leaderboard()
+        for i in range(20):
+            User.objects.create(email=f"extra{i}@example.com", username=f"extra{i}", password="pass")
+        with CaptureQueriesContext(connection) as large:
+            refresh_leaderboard()
+        self.assertLessEqual(len(large.captured_queries), len(small.captured_queries) + 2)
+
+    def test_incremental_refresh_only_updates_changed_users(self):
+        """Test incremental refresh recomputes changed users and their teams"""
+        refresh_leaderboard()
+        Activity.objects.create(
+            user_id=self.walker.id, activity_type="cycling", duration=90,
+            calories=900, date=timezone.now()
+        )
+        run = refresh_leaderboard(incremental=True)
+        self.assertEqual(run.mode, 'incremental')
+        self.assertEqual(run.users_updated, 1)
+        self.assertEqual(run.teams_updated, 1)
+
+        walker = Leaderboard.objects.get(entity_type='user', entity_id=self.walker.id)
+        self.assertEqual(walker.total_points, 2 * 10 + 1100)
+        self.assertEqual(walker.rank, 1)
+        self.assertEqual(Leaderboard.objects.get(entity_type='user', entity_id=self.runner.id).rank, 2)
+        self.assertEqual(Leaderboard.objects.get(entity_type='team', entity_id=self.team.id).total_calories, 1900)
+
+    def test_refresh_removes_deleted_entities(self):
+        """Test rows for deleted users are pruned"""
+        refresh_leaderboard()
+        self.idle.delete()
+        refresh_leaderboard()
+        self.assertFalse(Leaderboard.objects.filter(entity_type='user', entity_id=self.idle.id).exists())
+        self.assertEqual(Leaderboard.objects.filter(entity_type='user').count(), 2)
+
+
+class LeaderboardDeltaTest(APITestCase):
+    """Test activity writes keep leaderboard totals current between refreshes"""
+
+    def setUp(self):
+        self.team = Team.objects.create(name="Delta Team")
+        self.other_team = Team.objects.create(name="Other Team")
+        self.user = User.objects.create(
+            email="delta@example.com", username="delta", password="pass", team_id=self.team.id
+        )
+        self.teammate = User.objects.create(
+            email="mate@example.com", username="mate", password="pass", team_id=self.team.id
+        )
+
+    def totals(self, entity_type, entity_id):
+        row = Leaderboard.objects.filter(entity_type=entity_type, entity_id=entity_id).first()
+        return row and (row.total_points, row.total_activities, row.total_calories, row.total_duration)
+
+    def post_activity(self, user, calories, duration=30):
+        response = self.client.post(reverse('activity-list'), {
+            'user_id': user.id, 'activity_type': 'running', 'duration': duration,
+            'calories': calories, 'date': timezone.now().isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def test_create_update_delete(self):
+        """Test API writes add, move and remove totals on the user and team rows"""
+        first = self.post_activity(self.user, 300)
+        self.post_activity(self.teammate, 100, duration=20)
+        self.assertEqual(self.totals('user', self.user.id), (310, 1, 300, 30))
+        self.assertEqual(self.totals('team', self.team.id), (420, 2, 400, 50))
+
+        response = self.client.patch(reverse('activity-detail', args=[first]), {
+            'calories': 500, 'user_id': self.teammate.id
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.totals('user', self.user.id), (0, 0, 0, 0))
+        self.assertEqual(self.totals('user', self.teammate.id), (620, 2, 600, 50))
+        self.assertEqual(self.totals('team', self.team.id), (620, 2, 600, 50))
+
+        self.client.delete(reverse('activity-detail', args=[first]))
+        self.assertEqual(self.totals('team', self.team.id), (110, 1, 100, 20))
+        self.assertEqual(find_drift(), [])
+
+    def test_write_rolls_back_with_its_deltas(self):
+        """Test a failed write leaves no rollup or leaderboard change behind"""
+        with mock.patch('octofit_tracker.signals.apply_activity_changes', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                Activity.objects.create(
+                    user=self.user, activity_type="running", duration=30, calories=300, date=timezone.now()
+                )
+        self.assertFalse(Activity.objects.exists())
+        self.assertFalse(DailyActivityRollup.objects.exists())
+
+    def test_team_change_moves_totals(self):
+        """Test changing a user's team moves their totals between team rows"""
+        self.post_activity(self.user, 300)
+        self.user.team = self.other_team
+        self.user.save()
+        self.assertEqual(self.totals('team', self.team.id), (0, 0, 0, 0))
+        self.assertEqual(self.totals('team', self.other_team.id), (310, 1, 300, 30))
+        self.user.delete()
+        self.assertIsNone(self.totals('user', self.user.id))
+        self.assertEqual(self.totals('team', self.other_team.id), (0, 0, 0, 0))
+        self.assertEqual(find_drift(), [])
+
+    def test_user_delete_applies_one_delta(self):
+        """Test deleting a user costs the same queries however many activities cascade with them"""
+        def delete_with(user, activities):
+            for calories in range(activities):
+                self.post_activity(user, calories)
+            with CaptureQueriesContext(connection) as queries:
+                user.delete()
+            return len(queries.captured_queries)
+
+        self.post_activity(self.teammate, 100)
+        few = delete_with(self.user, 1)
+        other = User.objects.create(email="other@example.com", username="other", password="pass", team=self.team)
+        self.assertEqual(delete_with(other, 5), few)
+        self.assertEqual(self.totals('team', self.team.id), (110, 1, 100, 30))
+        self.assertFalse(DailyActivityRollup.objects.exclude(user_id=self.teammate.id).exists())
+        self.assertEqual(find_drift(), [])
+
+    def test_fixture_loads_apply_no_deltas(self):
+        """Test raw saves from loaddata leave fixture totals as they are"""
+        now = timezone.now()
+        activity = Activity(
+            user=self.user, activity_type="running", duration=30, calories=300, date=now,
+            created_at=now, updated_at=now
+        )
+        for obj in serializers.deserialize('json', serializers.serialize('json', [activity])):
+            obj.save()
+        self.assertEqual(Activity.objects.count(), 1)
+        self.assertIsNone(self.totals('user', self.user.id))
+        self.assertFalse(DailyActivityRollup.objects.exists())
+
+    def test_bulk_ingest_applies_deltas(self):
+        """Test bulk ingested activities reach the leaderboard without a refresh"""
+        items = [
+            {'user_id': user.id, 'activity_type': 'cycling', 'duration': 40, 'calories': 200,
+             'date': timezone.now().isoformat()}
+            for user in (self.user, self.user, self.teammate)
+        ]
+        self.client.post(reverse('activity-bulk'), items, format='json')
+        self.assertEqual(self.totals('user', self.user.id), (420, 2, 400, 80))
+        self.assertEqual(self.totals('team', self.team.id), (630, 3, 600, 120))
+
+    def test_writes_update_stored_snapshots(self):
+        """Test activity writes apply their deltas to stored snapshots and re-rank them in place"""
+        week = period_window('week')
+        self.post_activity(self.teammate, 100)
+        period_snapshot(*week)
+
+        def summary(rows):
+            return sorted(
+                (row.entity_type, row.rank, row.entity_id, row.total_points, row.total_activities) for row in rows
+            )
+
+        def stored():
+            return summary(period_snapshot(*week))
+
+        def rebuilt():
+            return summary(snapshot_rows(*week))
+
+        with mock.patch('octofit_tracker.leaderboard.materialize_period') as materialize:
+            first = self.post_activity(self.user, 300)
+            self.assertEqual(stored(), rebuilt())
+            self.client.patch(reverse('activity-detail', args=[first]), {'calories': 50}, format='json')
+            self.assertEqual(stored(), rebuilt())
+            self.assertEqual([row[2] for row in stored() if row[0] == 'user'], [self.teammate.id, self.user.id])
+            self.client.delete(reverse('activity-detail', args=[first]))
+            self.assertEqual(stored(), rebuilt())
+        materialize.assert_not_called()
+        self.assertEqual(stored(), [('team', 1, self.team.id, 110, 1), ('user', 1, self.teammate.id, 110, 1)])
+
+    def test_reconcile_command(self):
+        """Test reconcile_leaderboard reports drift and --fix repairs it"""
+        self.post_activity(self.user, 300)
+        call_command('reconcile_leaderboard', stdout=io.StringIO())
+        Leaderboard.objects.filter(entity_type='user').update(total_points=1)
+        with self.assertRaisesMessage(CommandError, '1 leaderboard row(s) drifted'):
+            call_command('reconcile_leaderboard', stdout=io.StringIO())
+        output = io.StringIO()
+        call_command('reconcile_leaderboard', fix=True, stdout=output)
+        self.assertIn(f'user {self.user.id}: stored (1, 1, 300, 30), expected (310, 1, 300, 30)', output.getvalue())
+        self.assertIn('0 row(s) still drifted', output.getvalue())
+
+
+class RankingTest(TestCase):
+    """Test window-function ranks and single-row re-ranks"""
+
+    POINTS = [500, 300, 300, 200, 100, 100, 50]
+
+    def setUp(self):
+        for entity_id, points in enumerate(self.POINTS, 1):
+            Leaderboard.objects.create(
+                entity_id=entity_id, entity_type='user', name=f'User {entity_id}', total_points=points
+            )
+        Leaderboard.objects.create(entity_id=1, entity_type='team', name='Team 1', total_points=10)
+
+    def ranks(self):
+        return dict(Leaderboard.objects.filter(entity_type='user').values_list('entity_id', 'rank'))
+
+    def expected(self, mode):
+        """Ranks from a Python sort of the current points"""
+        rows = sorted(
+            Leaderboard.objects.filter(entity_type='user').values_list('total_points', 'entity_id'),
+            key=lambda row: (-row[0], row[1]),
+        )
+        return dict(zip((entity_id for _, entity_id in rows), ranks_for([points for points, _ in rows], mode)))
+
+    def change_points(self, entity_id, change):
+        Leaderboard.objects.filter(entity_type='user', entity_id=entity_id).update(
+            total_points=F('total_points') + change
+        )
+
+    def test_rank_all_modes(self):
+        """Test each mode ranks ties as documented and leaves other entity types alone"""
+        rank_all('user', 'ordinal')
+        self.assertEqual(self.ranks(), {1: 1, 2: 2, 3: 3, 4: 4, 5: 5, 6: 6, 7: 7})
+        rank_all('user', 'competition')
+        self.assertEqual(self.ranks(), {1: 1, 2: 2, 3: 2, 4: 4, 5: 5, 6: 5, 7: 7})
+        rank_all('user', 'dense')
+        self.assertEqual(self.ranks(), {1: 1, 2: 2, 3: 2, 4: 3, 5: 4, 6: 4, 7: 5})
+        self.assertEqual(Leaderboard.objects.get(entity_type='team').rank, 0)
+
+    def test_rank_all_writes_only_moved_rows(self):
+        """Test a re-rank with nothing moved updates no rows"""
+        self.assertEqual(rank_all('user', 'ordinal'), 7)
+        self.assertEqual(rank_all('user', 'ordinal'), 0)
+        self.change_points(7, 250)
+        self.assertEqual(rank_all('user', 'ordinal'), 4)
+
+    def test_python_fallback_matches_update_from(self):
+        """Test backends without UPDATE ... FROM get the same ranks"""
+        with mock.patch('octofit_tracker.ranking._supports_update_from', return_value=False):
+            self.assertEqual(rank_all('user', 'competition'), 7)
+        self.assertEqual(self.ranks(), self.expected('competition'))
+
+    def test_rerank_entry_matches_full_rank(self):
+        """Test moving one row up or down agrees with a full re-rank"""
+        for mode in ('ordinal', 'competition', 'dense'):
+            rank_all('user', mode)
+            for entity_id, change in [(7, 260), (1, -400), (4, 100), (5, -50), (3, 0)]:
+                self.change_points(entity_id, change)
+                rerank_entry('user', entity_id, change, mode=mode)
+                self.assertEqual(self.ranks(), self.expected(mode), (mode, entity_id, change))
+
+    def test_rerank_entry_touches_rows_between_positions(self):
+        """Test a partial re-rank only shifts the rows the entry passed"""
+        rank_all('user', 'ordinal')
+        self.change_points(6, 150)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(rerank_entry('user', 6, 150, mode='ordinal'), 2)
+        self.assertEqual(len(queries), 4)
+        self.assertEqual(self.ranks(), {1: 1, 2: 2, 3: 3, 6: 4, 4: 5, 5: 6, 7: 7})
+
+    def test_rerank_new_entry(self):
+        """Test a new row is placed among existing rows"""
+        for mode in ('ordinal', 'competition'):
+            rank_all('user', mode)
+            entity_id = Leaderboard.objects.count() + 10
+            Leaderboard.objects.create(
+                entity_id=entity_id, entity_type='user', name='New', total_points=300,
+                rank=Leaderboard.objects.filter(entity_type='user').count() + 1,
+            )
+            rerank_entry('user', entity_id, mode=mode)
+            self.assertEqual(self.ranks(), self.expected(mode), mode)
+
+    def test_unknown_mode(self):
+        """Test an unknown LEADERBOARD_RANKING is reported"""
+        with override_settings(LEADERBOARD_RANKING='olympic'):
+            with self.assertRaises(ImproperlyConfigured):
+                rank_all('user')
+
+    def test_ranks_for_snapshots(self):
+        """Test snapshot ranks follow the configured mode"""
+        self.assertEqual(ranks_for([9, 9, 5], 'ordinal'), [1, 2, 3])
+        self.assertEqual(ranks_for([9, 9, 5], 'competition'), [1, 1, 3])
+        self.assertEqual(ranks_for([9, 9, 5], 'dense'), [1, 1, 2])
+        with override_settings(LEADERBOARD_RANKING='competition'):
+            self.assertEqual(ranks_for([9, 9, 5]), [1, 1, 3])
+
+
+class StandingsTest(APITestCase):
+    """Test top-N and around-me reads from the in-memory standings"""
+
+    POINTS = [500, 300, 300, 200, 100, 100, 50]
+
+    def setUp(self):
+        get_response_cache().clear()
+        reset_index()
+        for entity_id, points in enumerate(self.POINTS, 1):
+            Leaderboard.objects.create(
+                entity_id=entity_id, entity_type='user', name=f'User {entity_id}', total_points=points
+            )
+        Leaderboard.objects.create(entity_id=1, entity_type='team', name='Team 1', total_points=10)
+
+    def get(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(row['entity_id'], row['rank']) for row in response.data]
+
+    def test_top(self):
+        """Test ?top=N returns the best rows without touching the database once loaded"""
+        self.assertEqual(self.get('leaderboard-list', top=3), [(1, 1), (2, 2), (3, 3)])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get('leaderboard-list', top=2), [(1, 1), (2, 2)])
+        self.assertEqual(len(queries.captured_queries), 0, queries.captured_queries)
+        self.assertEqual(self.get('leaderboard-list', top=5, type='team'), [(1, 1)])
+
+    def test_ranking_modes(self):
+        """Test ranks follow LEADERBOARD_RANKING"""
+        with override_settings(LEADERBOARD_RANKING='competition'):
+            self.assertEqual(self.get('leaderboard-list', top=4), [(1, 1), (2, 2), (3, 2), (4, 4)])
+        with override_settings(LEADERBOARD_RANKING='dense'):
+            self.assertEqual(self.get('leaderboard-list', top=4), [(1, 1), (2, 2), (3, 2), (4, 3)])
+
+    def test_around(self):
+        """Test around returns the rows within radius of the entity, clipped at the top"""
+        self.assertEqual(self.get('leaderboard-around', entity_id=4, radius=1), [(3, 3), (4, 4), (5, 5)])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get('leaderboard-around', entity_id=1, radius=2), [(1, 1), (2, 2), (3, 3)])
+        self.assertEqual(len(queries.captured_queries), 0)
+        self.assertEqual(len(self.get('leaderboard-around', entity_id=7)), 6)
+
+    def test_invalid_parameters(self):
+        """Test bad parameters are rejected and unknown entities are not found"""
+        for name, params in [
+            ('leaderboard-list', {'top': 0}),
+            ('leaderboard-list', {'top': 'ten'}),
+            ('leaderboard-around', {}),
+            ('leaderboard-around', {'entity_id': 1, 'radius': -1}),
+        ]:
+            self.assertEqual(self.client.get(reverse(name), params).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('leaderboard-around'), {'entity_id': 99})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_activity_write_updates_index_in_place(self):
+        """Test an activity's deltas reach the index without a reload"""
+        user = User.objects.create(email="top@example.com", username="top", password="pass")
+        Leaderboard.objects.update_or_create(
+            entity_id=user.id, entity_type='user', defaults={'name': 'top', 'total_points': 0}
+        )
+        self.get('leaderboard-list', top=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Activity.objects.create(
+                user=user, activity_type="running", duration=30, calories=600, date=timezone.now()
+            )
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get('leaderboard-list', top=1), [(user.id, 1)])
+        self.assertEqual(len(queries.captured_queries), 0)
+
+    def test_first_activity_adds_row_in_place(self):
+        """Test a write that creates a user's row bumps the version once and updates the index in place"""
+        user = User.objects.create(email="new@example.com", username="new", password="pass")
+        Leaderboard.objects.filter(entity_type='user', entity_id=user.id).delete()
+        self.get('leaderboard-list', top=1)
+        version = namespace_version('leaderboard')
+        with self.captureOnCommitCallbacks(execute=True):
+            Activity.objects.create(
+                user=user, activity_type="running", duration=30, calories=600, date=timezone.now()
+            )
+        self.assertEqual(namespace_version('leaderboard'), version + 1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get('leaderboard-list', top=1), [(user.id, 1)])
+        self.assertEqual(len(queries.captured_queries), 0)
+
+    def test_other_writes_reload(self):
+        """Test a write that bumps the leaderboard version is picked up on the next read"""
+        self.get('leaderboard-list', top=1)
+        Leaderboard.objects.filter(entity_type='user', entity_id=7).update(total_points=1000)
+        invalidate_responses('leaderboard')
+        self.assertEqual(self.get('leaderboard-list', top=1), [(7, 1)])
+
+    def test_writes_from_other_processes_reload(self):
+        """Test a write that did not bump this process's version is found by the periodic table check"""
+        self.get('leaderboard-list', top=1)
+        with override_settings(LEADERBOARD_INDEX_CHECK_SECONDS=0):
+            with CaptureQueriesContext(connection) as queries:
+                self.get('leaderboard-list', top=1)
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertIn('FROM "leaderboard_version"', queries.captured_queries[0]['sql'])
+        with transaction.atomic():
+            Leaderboard.objects.filter(entity_type='user', entity_id=7).update(total_points=1000)
+            bump_table_version()
+        self.assertEqual(self.get('leaderboard-list', top=1), [(1, 1)])
+        with override_settings(LEADERBOARD_INDEX_CHECK_SECONDS=0):
+            self.assertEqual(self.get('leaderboard-list', top=1), [(7, 1)])
+            Leaderboard.objects.filter(entity_type='user', entity_id=7).delete()
+            self.assertEqual(self.get('leaderboard-list', top=1), [(1, 1)])
+
+    def test_table_check_keeps_index_after_own_writes(self):
+        """Test deltas applied in place leave the index matching the table, so the check does not reload"""
+        user = User.objects.create(email="check@example.com", username="check", password="pass")
+        self.get('leaderboard-list', top=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Activity.objects.create(
+                user=user, activity_type="running", duration=30, calories=600, date=timezone.now()
+            )
+        with override_settings(LEADERBOARD_INDEX_CHECK_SECONDS=0):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.get('leaderboard-list', top=1), [(user.id, 1)])
+        self.assertEqual(len(queries.captured_queries), 1, queries.captured_queries)
+
+    def test_period_top_reads_snapshot(self):
+        """Test ?top= with a period reads the period's snapshot"""
+        response = self.client.get(reverse('leaderboard-list'), {'top': 3, 'period': 'week'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [])
+
+    def test_standings_match_sorted_ranks(self):
+        """Test positions and ranks stay correct through upserts and removals"""
+        rows = {entity_id: (entity_id, 'user', points) for entity_id, points in enumerate([5, 9, 9, 1, 5, 7], 1)}
+        with mock.patch.multiple('octofit_tracker.standings', FIELDS=('entity_id', 'entity_type', 'total_points'),
+                                 POINTS=2, ENTITY_ID=0):
+            standings = Standings(rows.values())
+            standings.upsert((4, 'user', 9))
+            standings.remove(2)
+            standings.remove(42)
+            standings.insert((7, 'user', 3))
+            del rows[2]
+            rows[4], rows[7] = (4, 'user', 9), (7, 'user', 3)
+            expected = sorted(rows.values(), key=lambda row: (-row[2], row[0]))
+            for mode in ('ordinal', 'competition', 'dense'):
+                top = standings.top(10, mode)
+                self.assertEqual([row['entity_id'] for row in top], [row[0] for row in expected])
+                self.assertEqual([row['rank'] for row in top], ranks_for([row[2] for row in expected], mode))
+            self.assertEqual([row['entity_id'] for row in standings.around(5, 1)], [1, 5, 7])
+
+
+class LeaderboardJobTest(APITestCase):
+    """Test cases for queued leaderboard refresh jobs"""
+
+    def setUp(self):
+        self.user = User.objects.create(email="job@example.com", username="job", password="pass")
+        Activity.objects.create(
+            user_id=self.user.id, activity_type="running", duration=30, calories=300, date=timezone.now()
+        )
+
+    def test_refresh_endpoint_queues_job(self):
+        """Test the refresh endpoint returns 202 and a job that the worker completes"""
+        response = self.client.post(reverse('leaderboard-refresh'))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'queued')
+        self.assertEqual(Leaderboard.objects.get(entity_type='user').rank, 1)
+        Leaderboard.objects.all().delete()
+
+        output = io.StringIO()
+        call_command('leaderboard_worker', once=True, allow_local_cache=True, stdout=output)
+        self.assertIn('Ran 1 job(s)', output.getvalue())
+        job = self.client.get(response['Location']).data
+        self.assertEqual((job['status'], job['users_updated']), ('succeeded', 1))
+        self.assertEqual(Leaderboard.objects.get(entity_type='user').total_points, 310)
+
+    def test_worker_refuses_process_local_cache(self):
+        """Test the worker will not run against a per-process cache unless told to"""
+        with self.assertRaisesMessage(CommandError, 'OCTOFIT_CACHE_BACKEND'):
+            call_command('leaderboard_worker', once=True, stdout=io.StringIO())
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(CACHES=shared):
+            output = io.StringIO()
+            call_command('leaderboard_worker', once=True, stdout=output)
+        self.assertIn('Ran 0 job(s)', output.getvalue())
+
+    def test_duplicate_requests_are_coalesced(self):
+        """Test requests made while a job is queued join it, and full wins over incremental"""
+        first = self.client.post(reverse('leaderboard-refresh') + '?mode=incremental')
+        second = self.client.post(reverse('leaderboard-refresh'))
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertEqual((second.data['mode'], second.data['request_count']), ('full', 2))
+        self.assertEqual(LeaderboardJob.objects.count(), 1)
+
+    def test_one_job_runs_at_a_time(self):
+        """Test a request during a running job queues one follow-up that waits for it"""
+        self.assertIsNone(claim_next_job())
+        enqueue_refresh()
+        running = claim_next_job()
+        follow_up = enqueue_refresh(incremental=True)
+        self.assertNotEqual(follow_up.id, running.id)
+        self.assertEqual(enqueue_refresh(incremental=True).id, follow_up.id)
+        self.assertIsNone(claim_next_job())
+
+        run_job(running)
+        self.assertEqual(claim_next_job().id, follow_up.id)
+
+    def test_failed_job_records_error(self):
+        """Test a failing recomputation marks the job failed with the error"""
+        enqueue_refresh()
+        with mock.patch('octofit_tracker.jobs.refresh_leaderboard', side_effect=RuntimeError('boom')):
+            job = run_job(claim_next_job())
+        self.assertEqual((job.status, job.error), ('failed', 'RuntimeError: boom'))
+        failed = self.client.get(reverse('leaderboard-job-list'), {'status': 'failed'}).data['results']
+        self.assertEqual([row['id'] for row in failed], [job.id])
+
+    def test_stale_running_job_is_recovered(self):
+        """Test a job abandoned by a dead worker stops blocking the queue"""
+        enqueue_refresh()
+        stuck = claim_next_job()
+        LeaderboardJob.objects.filter(pk=stuck.pk).update(started_at=timezone.now() - timedelta(hours=2))
+        enqueue_refresh()
+        self.assertIsNone(claim_next_job())
+        self.assertEqual(recover_stale_jobs(stale_after=3600), 1)
+        self.assertIsNotNone(claim_next_job())
+
+
+class WorkoutRecommendationTest(APITestCase):
+    """Test cases for precomputed workout recommendations"""
+
+    def setUp(self):
+        get_response_cache().clear()
+        self.user = User.objects.create(email="rec@example.com", username="rec", password="pass")
+        self.short_run = self.workout('Short Run', 'running', 'beginner', 30, 300)
+        self.long_run = self.workout('Long Run', 'running', 'beginner', 90, 900)
+        self.yoga = self.workout('Yoga Flow', 'yoga', 'beginner', 60, 150)
+        self.ride = self.workout('Tempo Ride', 'cycling', 'intermediate', 45, 450)
+        for _ in range(3):
+            self.log('running', 30, 300)
+        refresh_recommendations()
+        self.url = reverse('workout-suggest')
+
+    def workout(self, title, activity_type, difficulty, duration, calories):
+        return Workout.objects.create(
+            title=title, description=title, activity_type=activity_type, difficulty=difficulty,
+            duration=duration, calories_estimate=calories, instructions='Go',
+        )
+
+    def log(self, activity_type, duration, calories):
+        Activity.objects.create(
+            user=self.user, activity_type=activity_type, duration=duration, calories=calories, date=timezone.now()
+        )
+
+    def suggested(self, **params):
+        response = self.client.get(self.url, {'user_id': self.user.id, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [workout['id'] for workout in response.json()]
+
+    def test_scores_follow_activity_history(self):
+        """Test the workout closest to the user's activity mix, duration and calories comes first"""
+        self.assertEqual(self.suggested(), [self.short_run.id, self.long_run.id, self.ride.id, self.yoga.id])
+        self.assertEqual(self.suggested(difficulty='intermediate'), [self.ride.id])
+
+    def test_suggest_is_one_query(self):
+        """Test a user's suggestions are read in one query and not cached"""
+        self.suggested()
+        with CaptureQueriesContext(connection) as queries:
+            self.suggested(difficulty='beginner')
+        self.assertEqual(len(queries.captured_queries), 1)
+
+    def test_activity_writes_refresh_on_commit(self):
+        """Test new activities rescore their user once the write commits"""
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(6):
+                self.log('yoga', 60, 150)
+        self.assertEqual(self.suggested()[0], self.yoga.id)
+
+    def test_new_user_is_scored_without_storing(self):
+        """Test a user without stored rows is scored in memory and the read writes nothing"""
+        user = User.objects.create(email="new@example.com", username="new", password="pass")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'user_id': user.id, 'difficulty': 'beginner'})
+        self.assertEqual(
+            [workout['id'] for workout in response.json()], [self.short_run.id, self.long_run.id, self.yoga.id]
+        )
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in queries.captured_queries))
+        self.assertFalse(WorkoutRecommendation.objects.filter(user=user).exists())
+        response = self.client.get(self.url, {'user_id': user.id})
+        self.assertEqual(
+            [workout['id'] for workout in response.json()],
+            [self.short_run.id, self.long_run.id, self.yoga.id, self.ride.id]
+        )
+
+    def test_rows_from_earlier_days_are_rescored_by_the_worker(self):
+        """Test rows written before today are served until the worker rescores them, so old profiles age out"""
+        WorkoutRecommendation.objects.update(updated_at=timezone.now() - timedelta(days=1), score=0)
+        self.assertEqual(len(self.suggested()), 4)
+        self.assertTrue(WorkoutRecommendation.objects.filter(score=0).exists())
+        output = io.StringIO()
+        call_command('leaderboard_worker', once=True, allow_local_cache=True, stdout=output)
+        self.assertIn('rescored recommendations for 1 user(s)', output.getvalue())
+        self.assertFalse(WorkoutRecommendation.objects.filter(score=0).exists())
+        self.assertEqual(self.suggested()[0], self.short_run.id)
+
+    def test_workout_changes_mark_rows_stale(self):
+        """Test editing the catalogue flags stored rows, which stay readable until a batch rescores them"""
+        sprint = self.workout('Sprint Run', 'running', 'beginner', 30, 310)
+        self.assertEqual(WorkoutRecommendation.objects.filter(stale=False).count(), 0)
+        self.assertEqual(len(self.suggested(difficulty='beginner')), 3)
+        self.assertEqual(refresh_stale_recommendations(), 1)
+        self.assertEqual(refresh_stale_recommendations(), 0)
+        self.assertIn(sprint.id, self.suggested(difficulty='beginner'))
+
+    def test_invalid_users(self):
+        """Test unknown users get 404 and malformed ids get 400"""
+        self.assertEqual(self.client.get(self.url, {'user_id': 999}).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(self.url, {'user_id': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_suggest_without_user_is_ordered(self):
+        """Test anonymous suggestions are the difficulty's workouts in id order"""
+        response = self.client.get(self.url, {'difficulty': 'beginner'})
+        self.assertEqual(
+            [workout['id'] for workout in response.json()], [self.short_run.id, self.long_run.id, self.yoga.id]
+        )
+
+
+class ActivitySerializationQueryTest(APITestCase):
+    """Test cases for activity list query counts and user references"""
+
+    def setUp(self):
+        self.users = [
+            User.objects.create(email=f"user{i}@example.com", username=f"user{i}", password="pass")
+            for i in range(5)
+        ]
+        for user in self.users:
+            for _ in range(3):
+                Activity.objects.create(
+                    user_id=user.id, activity_type="running", duration=30,
+                    calories=250, date=timezone.now()
+                )
+
+    def test_activity_list_joins_user_names(self):
+        """Test listing activities reads user names in the same query"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('activity-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries.captured_queries), 1)
+        names = {row['user_id']: row['user_name'] for row in response.data['results']}
+        self.assertEqual(names[self.users[0].id], 'user0')
+
+    def test_user_activities_action_joins_user_names(self):
+        """Test the user activities action needs only the user lookup and one page query"""
+        user = self.users[0]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('user-activities', args=[user.id]))
+        self.assertEqual(len(queries.captured_queries), 2)
+        self.assertEqual({row['user_name'] for row in response.data['results']}, {'user0'})
+
+    def test_unknown_user_is_rejected(self):
+        """Test activities must reference an existing user"""
+        response = self.client.post(reverse('activity-list'), {
+            'user_id': 9999, 'activity_type': 'yoga', 'duration': 20, 'calories': 80,
+            'date': timezone.now().isoformat()
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('user_id', response.data)
+
+    def test_deleting_user_deletes_activities(self):
+        """Test a user's activities and rollups go with the user"""
+        user = self.users[0]
+        user.delete()
+        self.assertFalse(Activity.objects.filter(user_id=user.id).exists())
+        self.assertFalse(DailyActivityRollup.objects.filter(user_id=user.id).exists())
+
+
+class TeamMemberCountTest(APITestCase):
+    """Test cases for the denormalized team member count"""
+
+    def setUp(self):
+        self.red = Team.objects.create(name="Red")
+        self.blue = Team.objects.create(name="Blue")
+        self.user = User.objects.create(
+            email="member@example.com", username="member", password="pass", team_id=self.red.id
+        )
+
+    def member_counts(self):
+        return dict(Team.objects.values_list('name', 'member_count'))
+
+    def test_member_count_follows_team_changes(self):
+        """Test creating, moving and deleting users keeps counts correct"""
+        self.assertEqual(self.member_counts(), {'Red': 1, 'Blue': 0})
+        self.user.team_id = self.blue.id
+        self.user.save()
+        self.assertEqual(self.member_counts(), {'Red': 0, 'Blue': 1})
+        self.user.delete()
+        self.assertEqual(self.member_counts(), {'Red': 0, 'Blue': 0})
+
+    def test_member_count_after_api_update(self):
+        """Test changing a user's team through the API updates counts"""
+        url = reverse('user-detail', args=[self.user.id])
+        response = self.client.patch(url, {'team_id': self.blue.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.member_counts(), {'Red': 0, 'Blue': 1})
+
+    def test_team_list_does_not_count_per_team(self):
+        """Test listing teams is a single query"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('team-list'))
+        self.assertEqual(len(queries.captured_queries), 1)
+        counts = {row['name']: row['member_count'] for row in response.data['results']}
+        self.assertEqual(counts, {'Red': 1, 'Blue': 0})
+
+    def test_sync_member_counts_repairs_bulk_writes(self):
+        """Test sync_member_counts fixes counts after signal-less writes"""
+        User.objects.filter(id=self.user.id).update(team_id=self.blue.id)
+        self.assertEqual(sync_member_counts(), 2)
+        self.assertEqual(self.member_counts(), {'Red': 0, 'Blue': 1})
+
+
+class CursorPaginationTest(APITestCase):
+    """Test cases for cursor pagination on list endpoints"""
+
+    def setUp(self):
+        self.user = User.objects.create(email="pager@example.com", username="pager", password="pass")
+        now = timezone.now()
+        for days_ago in range(7):
+            Activity.objects.create(
+                user_id=self.user.id, activity_type="running", duration=30,
+                calories=100 + days_ago, date=now - timedelta(days=days_ago)
+            )
+
+    def collect_pages(self, url, params):
+        rows = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            rows.extend(response.data['results'])
+            if not response.data['next']:
+                return rows
+            response = self.client.get(response.data['next'])
+
+    def test_activity_pages_are_newest_first(self):
+        """Test activities page by descending date without gaps or repeats"""
+        rows = self.collect_pages(reverse('activity-list'), {'page_size': 3})
+        self.assertEqual([row['calories'] for row in rows], list(range(100, 107)))
+
+    def test_user_activities_action_is_paginated(self):
+        """Test the user activities action uses the activity cursor"""
+        response = self.client.get(reverse('user-activities', args=[self.user.id]), {'page_size': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_leaderboard_pages_follow_rank(self):
+        """Test leaderboard pages are ordered by rank"""
+        Leaderboard.objects.all().delete()
+        for rank in range(1, 6):
+            Leaderboard.objects.create(entity_id=rank, entity_type='user', name=f"u{rank}", rank=rank)
+        rows = self.collect_pages(reverse('leaderboard-list'), {'page_size': 2})
+        self.assertEqual([row['rank'] for row in rows], [1, 2, 3, 4, 5])
+
+
+class SparseFieldsTest(APITestCase):
+    """Test ?fields= and ?exclude= trim both the SELECT and the payload"""
+
+    def setUp(self):
+        get_response_cache().clear()
+        reset_index()
+        self.team = Team.objects.create(name="Sparse Team", description="Long description")
+        self.user = User.objects.create(
+            email="sparse@example.com", username="sparse", password="pass", team_id=self.team.id
+        )
+        now = timezone.now()
+        for days_ago in range(3):
+            Activity.objects.create(
+                user=self.user, activity_type="running", duration=30, calories=100 + days_ago,
+                date=now - timedelta(days=days_ago), notes="A very long note"
+            )
+        Workout.objects.create(
+            title="Easy Walk", description="Walk", activity_type="walking", difficulty="beginner",
+            duration=30, calories_estimate=150, instructions="Walk slowly"
+        )
+
+    def get(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data, ' '.join(query['sql'] for query in queries.captured_queries)
+
+    def test_list_fields(self):
+        """Test list endpoints return and select only the requested fields"""
+        data, sql = self.get(reverse('activity-list'), {'fields': 'id,user_name,calories'})
+        self.assertEqual([set(row) for row in data['results']], [{'id', 'user_name', 'calories'}] * 3)
+        self.assertNotIn('"notes"', sql)
+        data, sql = self.get(reverse('workout-list'), {'exclude': 'description,instructions'})
+        self.assertNotIn('instructions', data['results'][0])
+        self.assertIn('title', data['results'][0])
+        self.assertNotIn('"instructions"', sql)
+
+    def test_pagination_with_trimmed_ordering(self):
+        """Test cursors still work when the ordering columns are not returned"""
+        response = self.client.get(reverse('activity-list'), {'fields': 'calories', 'page_size': 2})
+        rows = response.data['results'] + self.client.get(response.data['next']).data['results']
+        self.assertEqual(rows, [{'calories': 100}, {'calories': 101}, {'calories': 102}])
+
+    def test_detail_and_actions(self):
+        """Test retrieve and the nested list actions honour the parameters"""
+        data, sql = self.get(reverse('team-detail', args=[self.team.id]), {'fields': 'name'})
+        self.assertEqual(data, {'name': 'Sparse Team'})
+        self.assertNotIn('"description"', sql)
+        data, _ = self.get(reverse('team-members', args=[self.team.id]), {'fields': 'username'})
+        self.assertEqual(data['results'], [{'username': 'sparse'}])
+        data, sql = self.get(reverse('user-activities', args=[self.user.id]), {'exclude': 'notes,user_name'})
+        self.assertNotIn('notes', data['results'][0])
+        self.assertNotIn('"notes"', sql)
+
+    def test_actions_without_foreign_key_run_no_query_per_row(self):
+        """Test the nested list actions do not load a deferred foreign key for each row"""
+        User.objects.create(email="second@example.com", username="second", password="pass", team=self.team)
+        with self.assertNumQueries(2):
+            data, _ = self.get(reverse('user-activities', args=[self.user.id]), {'fields': 'calories'})
+        self.assertEqual(len(data['results']), 3)
+        with self.assertNumQueries(2):
+            data, _ = self.get(reverse('team-members', args=[self.team.id]), {'fields': 'username'})
+        self.assertEqual(len(data['results']), 2)
+
+    def test_activity_detail_drops_unread_joins(self):
+        """Test retrieving an activity without user_name skips the user join, and keeps it with user_name"""
+        activity = Activity.objects.order_by('id').first()
+        data, sql = self.get(reverse('activity-detail', args=[activity.id]), {'fields': 'activity_type'})
+        self.assertEqual(data, {'activity_type': 'running'})
+        self.assertNotIn('JOIN', sql)
+        data, sql = self.get(reverse('activity-detail', args=[activity.id]), {'fields': 'id,user_name'})
+        self.assertEqual(data, {'id': activity.id, 'user_name': 'sparse'})
+        self.assertIn('JOIN', sql)
+        self.assertNotIn('"email"', sql)
+
+    def test_leaderboard_reads(self):
+        """Test the leaderboard list, top and around reads"""
+        Leaderboard.objects.all().delete()
+        Leaderboard.objects.create(entity_id=self.user.id, entity_type='user', name='sparse', total_points=5, rank=1)
+        data, _ = self.get(reverse('leaderboard-list'), {'fields': 'name'})
+        self.assertEqual(data['results'], [{'name': 'sparse'}])
+        data, _ = self.get(reverse('leaderboard-list'), {'top': 1, 'fields': 'name,rank'})
+        self.assertEqual(data, [{'name': 'sparse', 'rank': 1}])
+        data, _ = self.get(reverse('leaderboard-around'), {'entity_id': self.user.id, 'exclude': 'updated_at,id'})
+        self.assertNotIn('updated_at', data[0])
+        self.assertIn('total_points', data[0])
+
+    def test_invalid_fields(self):
+        """Test unknown or write-only fields and empty selections are rejected"""
+        invalid = [
+            {'fields': 'id,nope'}, {'exclude': 'nope'}, {'fields': 'password'}, {'fields': 'id', 'exclude': 'id'}
+        ]
+        for params in invalid:
+            response = self.client.get(reverse('user-list'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_writes_return_every_field(self):
+        """Test the parameters do not trim write responses"""
+        response = self.client.patch(
+            f"{reverse('team-detail', args=[self.team.id])}?fields=id", {'name': 'Renamed'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['name'], 'Renamed')
+
+
+class ResponseFormatTest(APITestCase):
+    """Test response compression and the compact renderers"""
+
+    def setUp(self):
+        get_response_cache().clear()
+        for number in range(30):
+            Workout.objects.create(
+                title=f"Workout {number}", description="Steady effort " * 5, activity_type="running",
+                difficulty="beginner", duration=30, calories_estimate=300, instructions="Run"
+            )
+
+    def test_negotiate(self):
+        """Test q-values, wildcards and the server preference order"""
+        self.assertEqual(negotiate('gzip, br', ['br', 'gzip']), 'br')
+        self.assertEqual(negotiate('gzip;q=1, br;q=0.5', ['br', 'gzip']), 'gzip')
+        self.assertEqual(negotiate('*', ['zstd', 'gzip']), 'zstd')
+        self.assertEqual(negotiate('br;q=0, *;q=0.1', ['br', 'gzip']), 'gzip')
+        self.assertIsNone(negotiate('identity', ['gzip']))
+        self.assertIsNone(negotiate('', ['gzip']))
+
+    def test_gzip_list(self):
+        """Test large responses are compressed for clients that accept it"""
+        plain = self.client.get(reverse('workout-list'))
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        with override_settings(RESPONSE_COMPRESSION={'ENCODINGS': ['gzip'], 'MIN_SIZE': 1024}):
+            response = self.client.get(reverse('workout-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertTrue(response['ETag'].startswith('W/'))
+        cached = self.client.get(reverse('workout-list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_small_responses_are_not_compressed(self):
+        """Test bodies under the threshold are sent as is"""
+        response = self.client.get(
+            reverse('workout-detail', args=[Workout.objects.first().id]), HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming_export_is_gzipped(self):
+        """Test streaming responses are compressed as they stream"""
+        user = User.objects.create(email="stream@example.com", username="stream", password="pass")
+        for _ in range(3):
+            Activity.objects.create(
+                user=user, activity_type="running", duration=30, calories=300, date=timezone.now()
+            )
+        response = self.client.get(reverse('activity-export'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+
+    def test_optional_codecs(self):
+        """Test brotli and zstd are negotiated when installed"""
+        for encoding in ('br', 'zstd'):
+            if encoding not in CODECS:
+                continue
+            response = self.client.get(reverse('workout-list'), HTTP_ACCEPT_ENCODING=f'gzip;q=0.5, {encoding}')
+            self.assertEqual(response['Content-Encoding'], encoding)
+
+    def test_columnar_format(self):
+        """Test ?format=columnar and its media type send one array per field"""
+        response = self.client.get(reverse('workout-list'), {'format': 'columnar', 'fields': 'id,title'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = json.loads(response.content)
+        self.assertEqual(body['results']['title'][:2], ['Workout 0', 'Workout 1'])
+        self.assertEqual(set(body['results']), {'id', 'title'})
+        response = self.client.get(
+            reverse('workout-detail', args=[Workout.objects.first().id]),
+            HTTP_ACCEPT='application/vnd.octofit.columnar+json',
+        )
+        self.assertEqual(json.loads(response.content)['title'], 'Workout 0')
+
+    def test_columns(self):
+        """Test rows with different keys fill the gaps with None"""
+        self.assertEqual(columnar([{'a': 1}, {'a': 2, 'b': 3}]), {'a': [1, 2], 'b': [None, 3]})
+        self.assertEqual(columnar([]), {})
+        self.assertEqual(columnar({'detail': 'Not found.'}), {'detail': 'Not found.'})
+
+    def test_msgpack_format(self):
+        """Test ?format=msgpack round-trips the JSON structure"""
+        try:
+            import msgpack
+        except ImportError:
+            self.skipTest('msgpack is not installed')
+        response = self.client.get(reverse('workout-list'), {'format': 'msgpack'})
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(
+            msgpack.unpackb(response.content), json.loads(self.client.get(reverse('workout-list')).content)
+        )
+
+
+class ActivityExportTest(APITestCase):
+    """Test cases for the streaming activity export"""
+
+    def setUp(self):
+        self.user = User.objects.create(email="export@example.com", username="exporter", password="pass")
+        self.other = User.objects.create(email="other@example.com", username="other", password="pass")
+        Activity.objects.create(
+            user_id=self.user.id, activity_type="running", duration=30, distance=5.0,
+            calories=300, date=timezone.make_aware(datetime(2026, 3, 1, 8, 0)), notes="a, b"
+        )
+        Activity.objects.create(
+            user_id=self.user.id, activity_type="yoga", duration=45,
+            calories=150, date=timezone.make_aware(datetime(2026, 3, 5, 8, 0))
+        )
+        Activity.objects.create(
+            user_id=self.other.id, activity_type="running", duration=20,
+            calories=200, date=timezone.make_aware(datetime(2026, 3, 2, 8, 0))
+        )
+
+    def export(self, **params):
+        response = self.client.get(reverse('activity-export'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_export_filters_by_user(self):
+        """Test NDJSON export streams one object per line"""
+        lines = self.export(user_id=self.user.id).splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual({row['user_name'] for row in rows}, {'exporter'})
+        self.assertEqual(set(rows[0]), set(ActivitySerializer.Meta.fields))
+
+    def test_csv_export_filters_by_type_and_date(self):
+        """Test CSV export applies type and date range filters"""
+        content = self.export(output='csv', activity_type='running', **{'from': '2026-03-01', 'to': '2026-03-02'})
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['notes'], 'a, b')
+        self.assertEqual(rows[0]['user_name'], 'exporter')
+
+    def test_export_rejects_unknown_format(self):
+        """Test an unknown output format is a validation error"""
+        response = self.client.get(reverse('activity-export'), {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_rejects_bad_dates(self):
+        """Test malformed date filters are a validation error"""
+        response = self.client.get(reverse('activity-export'), {'from': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkActivityIngestTest(APITestCase):
+    """Test cases for bulk activity ingestion"""
+
+    def setUp(self):
+        self.user = User.objects.create(email="bulk@example.com", username="bulk", password="pass")
+
+    def activity(self, **overrides):
+        data = {
+            'user_id': self.user.id,
+            'activity_type': 'cycling',
+            'duration': 40,
+            'calories': 350,
+            'date': timezone.now().isoformat(),
+        }
+        data.update(overrides)
+        return data
+
+    def test_bulk_create_from_json_array(self):
+        """Test a JSON array is inserted in batches"""
+        items = [self.activity() for _ in range(5)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('activity-bulk') + '?batch_size=2', items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual(response.data['user_ids'], [self.user.id])
+        self.assertEqual(Activity.objects.count(), 5)
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "activities"')]
+        self.assertEqual(len(inserts), 3)
+
+    def test_bulk_reports_per_item_errors(self):
+        """Test invalid items are reported by index and valid ones still saved"""
+        items = [self.activity(), self.activity(duration='long'), self.activity(user_id=9999)]
+        response = self.client.post(reverse('activity-bulk'), {'activities': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertIn('duration', response.data['errors'][0]['errors'])
+        self.assertIn('user_id', response.data['errors'][1]['errors'])
+
+    def test_bulk_accepts_ndjson(self):
+        """Test an NDJSON body is parsed line by line"""
+        body = '\n'.join(json.dumps(self.activity()) for _ in range(3)) + '\n'
+        response = self.client.post(reverse('activity-bulk'), body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Activity.objects.count(), 3)
+
+    @override_settings(BULK_INGEST_MAX_ITEMS=3)
+    def test_bulk_rejects_too_many_items(self):
+        """Test JSON and NDJSON bodies over the item limit are rejected with 413 and nothing is saved"""
+        response = self.client.post(reverse('activity-bulk'), [self.activity() for _ in range(4)], format='json')
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        body = '\n'.join(json.dumps(self.activity()) for _ in range(4))
+        response = self.client.post(reverse('activity-bulk'), body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(Activity.objects.exists())
+        response = self.client.post(reverse('activity-bulk'), [self.activity() for _ in range(3)], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_bulk_refresh_updates_leaderboard(self):
+        """Test ?refresh=true recomputes the touched users' leaderboard rows"""
+        response = self.client.post(reverse('activity-bulk') + '?refresh=true', [self.activity()], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        entry = Leaderboard.objects.get(entity_type='user', entity_id=self.user.id)
+        self.assertEqual(entry.total_points, 10 + 350)
+        self.assertEqual(entry.rank, 1)
+
+    def test_bulk_rejects_non_list(self):
+        """Test a body that is not a list is rejected"""
+        response = self.client.post(reverse('activity-bulk'), {'user_id': self.user.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DailyRollupTest(APITestCase):
+    """Test cases for daily activity rollups and the stats endpoints"""
+
+    def setUp(self):
+        self.team = Team.objects.create(name="Rollup Team")
+        self.user = User.objects.create(
+            email="rollup@example.com", username="rollup", password="pass", team_id=self.team.id
+        )
+        self.teammate = User.objects.create(
+            email="mate@example.com", username="mate", password="pass", team_id=self.team.id
+        )
+        self.day = timezone.make_aware(datetime(2026, 4, 10, 9, 0))
+        self.run = Activity.objects.create(
+            user_id=self.user.id, activity_type="running", duration=30, distance=5.0,
+            calories=300, date=self.day
+        )
+        Activity.objects.create(
+            user_id=self.user.id, activity_type="running", duration=20, distance=3.0,
+            calories=200, date=self.day + timedelta(hours=8)
+        )
+        Activity.objects.create(
+            user_id=self.teammate.id, activity_type="yoga", duration=60,
+            calories=150, date=self.day
+        )
+
+    def rollup(self, user, activity_type='running', day=None):
+        return DailyActivityRollup.objects.get(
+            user_id=user.id, day=(day or self.day).date(), activity_type=activity_type
+        )
+
+    def test_create_update_delete_maintain_rollups(self):
+        """Test activity writes apply deltas to the rollup rows"""
+        rollup = self.rollup(self.user)
+        self.assertEqual((rollup.activity_count, rollup.total_duration, rollup.total_distance), (2, 50, 8.0))
+
+        self.run.activity_type = 'cycling'
+        self.run.save()
+        self.assertEqual(self.rollup(self.user).activity_count, 1)
+        self.assertEqual(self.rollup(self.user, 'cycling').total_calories, 300)
+
+        self.run.delete()
+        self.assertFalse(DailyActivityRollup.objects.filter(activity_type='cycling').exists())
+
+    def test_rebuild_matches_incremental_rollups(self):
+        """Test a full rebuild produces the same rows as the signal deltas"""
+        fields = ('user_id', 'day', 'activity_type', 'activity_count', 'total_duration',
+                  'total_calories', 'total_distance')
+        incremental = sorted(DailyActivityRollup.objects.values_list(*fields))
+        rebuild_rollups()
+        self.assertEqual(sorted(DailyActivityRollup.objects.values_list(*fields)), incremental)
+
+    def test_bulk_ingest_updates_rollups(self):
+        """Test bulk ingestion applies rollup deltas despite skipping signals"""
+        item = {
+            'user_id': self.user.id, 'activity_type': 'running', 'duration': 10,
+            'calories': 100, 'date': self.day.isoformat(),
+        }
+        self.client.post(reverse('activity-bulk'), [item, item], format='json')
+        self.assertEqual(self.rollup(self.user).activity_count, 4)
+
+    def test_user_and_team_stats_read_rollups(self):
+        """Test stats endpoints aggregate rollups without touching activities"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('user-stats', args=[self.user.id]))
+        self.assertFalse(any('"activities"' in q['sql'] for q in queries.captured_queries))
+        self.assertEqual(response.data['total_activities'], 2)
+        self.assertEqual(response.data['total_calories'], 500)
+
+        response = self.client.get(reverse('team-stats', args=[self.team.id]))
+        self.assertEqual(response.data['total_activities'], 3)
+        self.assertEqual(response.data['total_duration'], 110)
+        self.assertEqual(response.data['member_count'], 2)
+
+
+class PeriodWindowTest(APITestCase):
+    """Test cases for windowed stats and period leaderboards"""
+
+    def setUp(self):
+        self.team = Team.objects.create(name="Window Team")
+        self.user = User.objects.create(
+            email="window@example.com", username="window", password="pass", team_id=self.team.id
+        )
+        self.rival = User.objects.create(email="rival@example.com", username="rival", password="pass")
+        self.now = timezone.now()
+        Activity.objects.create(
+            user_id=self.user.id, activity_type="running", duration=30,
+            calories=300, date=self.now
+        )
+        Activity.objects.create(
+            user_id=self.rival.id, activity_type="running", duration=90,
+            calories=2000, date=self.now - timedelta(days=60)
+        )
+
+    def test_period_window_bounds(self):
+        """Test week windows start on Monday and month windows on the 1st"""
+        today = date(2026, 10, 15)
+        self.assertEqual(period_window('week', today), (date(2026, 10, 12), date(2026, 10, 19)))
+        self.assertEqual(period_window('month', today), (date(2026, 10, 1), date(2026, 11, 1)))
+        self.assertEqual(period_window('month', date(2026, 12, 31)), (date(2026, 12, 1), date(2027, 1, 1)))
+
+    def test_user_stats_for_period_and_range(self):
+        """Test user stats can be limited to a period or date range"""
+        url = reverse('user-stats', args=[self.rival.id])
+        self.assertEqual(self.client.get(url).data['total_activities'], 1)
+        self.assertEqual(self.client.get(url, {'period': 'week'}).data['total_activities'], 0)
+
+        day = timezone.localdate(self.now - timedelta(days=60))
+        response = self.client.get(url, {'from': day.isoformat(), 'to': (day + timedelta(days=1)).isoformat()})
+        self.assertEqual(response.data['total_calories'], 2000)
+        self.assertEqual(response.data['from'], day)
+
+    def test_team_stats_for_period(self):
+        """Test team stats honour the period parameter"""
+        response = self.client.get(reverse('team-stats', args=[self.team.id]), {'period': 'month'})
+        self.assertEqual(response.data['total_activities'], 1)
+        self.assertEqual(response.data['member_count'], 1)
+
+    def test_weekly_leaderboard_reads_snapshot(self):
+        """Test ?period=week ranks only this week's activity without scanning activities"""
+        refresh_leaderboard()
+        self.assertEqual(Leaderboard.objects.get(entity_type='user', rank=1).entity_id, self.rival.id)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('leaderboard-list'), {'period': 'week', 'type': 'user'})
+        self.assertFalse(any('"activities"' in q['sql'] for q in queries.captured_queries))
+        rows = response.data['results']
+        self.assertEqual([(row['entity_id'], row['rank']) for row in rows], [(self.user.id, 1)])
+        self.assertIn('period_start', rows[0])
+
+    def test_custom_range_leaderboard_is_computed_without_storing(self):
+        """Test a custom window is ranked from rollups and leaves no snapshot rows behind"""
+        start = timezone.localdate(self.now - timedelta(days=61))
+        params = {'from': start.isoformat(), 'to': (start + timedelta(days=3)).isoformat(), 'type': 'team'}
+        response = self.client.get(reverse('leaderboard-list'), params)
+        self.assertEqual(response.data['results'], [])
+        params['type'] = 'user'
+        response = self.client.get(reverse('leaderboard-list'), params)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['entity_id'], self.rival.id)
+        self.assertEqual(response.data['results'][0]['rank'], 1)
+        response = self.client.get(reverse('leaderboard-list'), {**params, 'top': 1})
+        self.assertEqual([row['entity_id'] for row in response.data], [self.rival.id])
+        self.assertFalse(LeaderboardSnapshot.objects.filter(period_start=start).exists())
+
+    def test_custom_window_is_cached_until_a_write(self):
+        """Test a custom window is ranked once and ranked again after an activity write"""
+        start = timezone.localdate(self.now - timedelta(days=61))
+        params = {'from': start.isoformat(), 'to': (start + timedelta(days=3)).isoformat(), 'type': 'user'}
+        self.client.get(reverse('leaderboard-list'), params)
+        with mock.patch('octofit_tracker.leaderboard.snapshot_rows') as rows:
+            self.client.get(reverse('leaderboard-list'), {**params, 'page': 1})
+        rows.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Activity.objects.create(
+                user_id=self.user.id, activity_type="running", duration=30,
+                calories=5000, date=self.now - timedelta(days=60)
+            )
+        response = self.client.get(reverse('leaderboard-list'), params)
+        self.assertEqual(response.data['results'][0]['entity_id'], self.user.id)
+
+    def test_first_period_read_survives_concurrent_materialization(self):
+        """Test a first read that loses the insert race reads the rows the other request stored"""
+        def lose_race(start, end):
+            materialize_period(start, end)
+            raise IntegrityError('UNIQUE constraint failed')
+
+        window = period_window('week')
+        LeaderboardSnapshot.objects.all().delete()
+        with mock.patch('octofit_tracker.leaderboard.materialize_period', side_effect=lose_race):
+            rows = period_snapshot(*window)
+        self.assertEqual(rows.filter(entity_type='user').first().entity_id, self.user.id)
+
+    def test_leaderboard_rejects_open_ended_window(self):
+        """Test leaderboard windows need both bounds"""
+        response = self.client.get(reverse('leaderboard-list'), {'from': '2026-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('leaderboard-list'), {'period': 'year'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ResponseCacheTest(APITestCase):
+    """Test cases for cached leaderboard and workout responses"""
+
+    def setUp(self):
+        get_response_cache().clear()
+        self.user = User.objects.create(email="cache@example.com", username="cache", password="pass")
+        Workout.objects.create(
+            title="Easy Walk", description="Walk", activity_type="walking", difficulty="beginner",
+            duration=30, calories_estimate=150, instructions="Walk"
+        )
+
+    def test_repeat_get_is_served_from_cache(self):
+        """Test a repeated GET runs no queries and keeps its ETag"""
+        url = reverse('workout-list')
+        first = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(url)
+        self.assertEqual(len(queries.captured_queries), 0)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_if_none_match_returns_not_modified(self):
+        """Test a matching ETag gets a 304 on both cache misses and hits"""
+        url = reverse('workout-suggest')
+        etag = self.client.get(url)['ETag']
+        get_response_cache().clear()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"stale"').status_code, status.HTTP_200_OK)
+
+    def test_workout_writes_invalidate(self):
+        """Test creating a workout through the API drops cached workout lists"""
+        url = reverse('workout-list')
+        self.assertEqual(len(self.client.get(url).json()['results']), 1)
+        response = self.client.post(url, {
+            'title': 'Hill Run', 'description': 'Hills', 'activity_type': 'running',
+            'difficulty': 'advanced', 'duration': 40, 'calories_estimate': 500, 'instructions': 'Run'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(self.client.get(url).json()['results']), 2)
+
+    def test_refresh_invalidates_leaderboard(self):
+        """Test a leaderboard refresh drops cached leaderboard responses"""
+        url = reverse('leaderboard-list')
+        self.assertEqual(self.client.get(url).json()['results'], [])
+        self.client.post(reverse('leaderboard-refresh'))
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('leaderboard_worker', once=True, allow_local_cache=True, stdout=io.StringIO())
+        rows = self.client.get(url).json()['results']
+        self.assertEqual([row['entity_id'] for row in rows], [self.user.id])
+
+    def test_query_params_are_cached_separately(self):
+        """Test different query strings get different cache entries"""
+        url = reverse('workout-list')
+        self.assertEqual(len(self.client.get(url, {'difficulty': 'beginner'}).json()['results']), 1)
+        self.assertEqual(len(self.client.get(url, {'difficulty': 'advanced'}).json()['results']), 0)
+
+
+class FastReadSerializerTest(APITestCase):
+    """Test cases for the values()-based read serializers"""
+
+    def setUp(self):
+        self.user = User.objects.create(email="fast@example.com", username="fast", password="pass")
+        Activity.objects.create(
+            user_id=self.user.id, activity_type="running", duration=30, distance=5.25,
+            calories=300, date=timezone.now(), notes="Tempo"
+        )
+        Activity.objects.create(
+            user_id=self.user.id, activity_type="yoga", duration=45, distance=None,
+            calories=150, date=timezone.now() - timedelta(days=2, microseconds=7)
+        )
+        other = User.objects.create(email="other@example.com", username="other", password="pass")
+        Activity.objects.create(
+            user_id=other.id, activity_type="walking", duration=20, calories=90, date=timezone.now()
+        )
+        refresh_leaderboard()
+
+    def assertSameJSON(self, fast, model):
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(fast), renderer.render(model))
+
+    def test_activity_parity(self):
+        """Test the fast activity output matches ActivitySerializer byte for byte"""
+        activities = Activity.objects.select_related('user').order_by('id')
+        fast = FastActivitySerializer()
+        self.assertSameJSON(
+            fast.to_representation(fast.values(activities)),
+            ActivitySerializer(activities, many=True).data
+        )
+
+    def test_leaderboard_parity(self):
+        """Test the fast leaderboard output matches LeaderboardSerializer byte for byte"""
+        entries = Leaderboard.objects.order_by('id')
+        fast = FastLeaderboardSerializer()
+        self.assertSameJSON(
+            fast.to_representation(fast.values(entries)),
+            LeaderboardSerializer(entries, many=True).data
+        )
+
+    def test_list_endpoints_use_fast_path(self):
+        """Test list pages keep their shape and cursor links"""
+        response = self.client.get(reverse('activity-list'), {'page_size': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(set(response.data['results'][0]), set(ActivitySerializer.Meta.fields))
+        next_page = self.client.get(response.data['next'])
+        self.assertEqual(len(next_page.data['results']), 1)
+
+        start, end = period_window('week')
+        response = self.client.get(reverse('leaderboard-list'), {'from': start, 'to': end})
+        self.assertEqual(response.data['results'][0]['period_start'], start.isoformat())
+        snapshot = LeaderboardSnapshotSerializer(
+            period_snapshot(start, end).order_by('rank', 'id'), many=True
+        ).data
+        self.assertSameJSON(response.data['results'], snapshot)
+
+
+class AsyncReadViewTest(APITransactionTestCase):
+    """Test cases for the async read endpoints; their stats queries run on connections of their own"""
+
+    def setUp(self):
+        get_response_cache().clear()
+        self.team = Team.objects.create(name="Async Team")
+        self.users = [
+            User.objects.create(
+                email=f"async{i}@example.com", username=f"async{i}", password="pass", team_id=self.team.id
+            )
+            for i in range(3)
+        ]
+        for user in self.users:
+            Activity.objects.create(
+                user_id=user.id, activity_type="running", duration=30, distance=4.5,
+                calories=200, date=timezone.now()
+            )
+        refresh_leaderboard()
+
+    def async_request(self, method, name, args=(), params=None):
+        async def request():
+            return await getattr(self.async_client, method)(reverse(name, args=args), params or {})
+        return async_to_sync(request)()
+
+    def async_get(self, name, args=(), params=None):
+        return self.async_request('get', name, args, params)
+
+    def assertMatchesSync(self, name, args=(), params=None):
+        """Assert the async endpoint returns the same body as its DRF counterpart"""
+        expected = self.client.get(reverse(name, args=args), params or {})
+        response = self.async_get(f'async-{name}', args, params)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+        return response
+
+    def test_stats_match_drf_endpoints(self):
+        """Test user and team stats, windowed or not, match the DRF output"""
+        self.assertMatchesSync('user-stats', [self.users[0].id])
+        self.assertMatchesSync('user-stats', [self.users[0].id], {'period': 'week'})
+        response = self.assertMatchesSync('team-stats', [self.team.id], {'period': 'month'})
+        self.assertEqual(response.json()['member_count'], 3)
+        self.assertEqual(response.json()['total_activities'], 3)
+
+    def test_members_and_leaderboard_match_drf_endpoints(self):
+        """Test member and leaderboard pages match the DRF output"""
+        self.assertMatchesSync('team-members', [self.team.id])
+        self.assertMatchesSync('leaderboard-list', params={'type': 'user'})
+        start, end = period_window('week')
+        self.assertMatchesSync('leaderboard-list', params={'from': start, 'to': end})
+
+    def test_sparse_fields_and_top_match_drf_endpoints(self):
+        """Test ?fields=, ?exclude= and ?top= give the same output as DRF"""
+        self.assertMatchesSync('team-members', [self.team.id], {'fields': 'id,username'})
+        self.assertMatchesSync('leaderboard-list', params={'exclude': 'name,updated_at'})
+        response = self.assertMatchesSync('leaderboard-list', params={'top': 2, 'fields': 'entity_id,rank'})
+        self.assertEqual([set(row) for row in response.json()], [{'entity_id', 'rank'}] * 2)
+        start, end = period_window('week')
+        self.assertMatchesSync('leaderboard-list', params={'from': start, 'to': end, 'top': 1})
+        self.assertMatchesSync('leaderboard-list', params={'fields': 'nope'})
+        self.assertMatchesSync('leaderboard-list', params={'top': 0})
+
+    def test_errors_match_drf_endpoints(self):
+        """Test missing objects, bad windows and writes are rejected like DRF does"""
+        self.assertMatchesSync('user-stats', [9999])
+        self.assertMatchesSync('team-members', [9999])
+        self.assertMatchesSync('team-stats', [self.team.id], {'period': 'year'})
+        self.assertMatchesSync('leaderboard-list', params={'from': '2024-01-01'})
+        response = self.async_request('post', 'async-leaderboard-list')
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_leaderboard_is_cached_and_invalidated(self):
+        """Test the async leaderboard uses the shared leaderboard cache namespace"""
+        first = self.async_get('async-leaderboard-list')
+        self.assertIn('ETag', first)
+        with CaptureQueriesContext(connection) as queries:
+            self.async_get('async-leaderboard-list')
+        self.assertEqual(len(queries.captured_queries), 0)
+        self.client.post(reverse('leaderboard-refresh'))
+        with CaptureQueriesContext(connection) as queries:
+            self.async_get('async-leaderboard-list')
+        self.assertGreater(len(queries.captured_queries), 0)
+
+    def test_stats_queries_run_concurrently(self):
+        """Test queries gathered through in_own_connection run at the same time on separate connections"""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def meet():
+            connection.ensure_connection()
+            own = id(connection.connection)
+            barrier.wait()
+            return own
+
+        async def gather():
+            return await asyncio.gather(in_own_connection(meet), in_own_connection(meet))
+
+        first, second = async_to_sync(gather)()
+        self.assertNotEqual(first, second)
+
+    def test_stats_honour_mongo_dal(self):
+        """Test the async stats read from MongoDB when MONGO_DAL is configured, like the DRF endpoints"""
+        totals = {'total_activities': 7, 'total_duration': 70, 'total_calories': 700, 'total_distance': 7.0}
+        stats = mock.patch.object(mongo, 'rollup_stats', side_effect=lambda db, user_ids, window: dict(totals))
+        with mock.patch.object(mongo, 'enabled', return_value=True), mock.patch.object(mongo, 'get_database'), stats:
+            self.assertEqual(self.async_get('async-user-stats', [self.users[0].id]).json(), totals)
+            self.assertEqual(self.async_get('async-team-stats', [self.team.id]).json(), {**totals, 'member_count': 3})
+
+    def test_metrics_middleware_counts_async_queries(self):
+        """Test Server-Timing reports the queries of an async view"""
+        response = self.async_get('async-user-stats', [self.users[0].id])
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+
+class BenchmarkSuiteTest(TestCase):
+    """Test cases for the benchmark harness"""
+
+    def test_api_suite_measures_every_case(self):
+        """Test the API suite runs against a tiny synthetic dataset"""
+        generate_dataset(users=6, teams=2, activities_per_user=3, workouts=3, seed=1)
+        results = benchmark_api.run(iterations=2, refresh_iterations=1)
+        self.assertIn('leaderboard-refresh', results)
+        self.assertGreater(results['leaderboard-refresh-job']['queries'], results['leaderboard-refresh']['queries'])
+        self.assertEqual(results['activity-list']['queries'], 1)
+        self.assertTrue(all(result['p95_ms'] >= result['p50_ms'] for result in results.values()))
+
+    def test_serializer_suite_compares_both_paths(self):
+        """Test the serializer suite measures ModelSerializer and fast cases"""
+        generate_dataset(users=4, teams=2, activities_per_user=3, workouts=1, seed=1)
+        results = benchmark_serializers.run(iterations=2)
+        self.assertEqual(
+            set(results), {'activity-model', 'activity-fast', 'leaderboard-model', 'leaderboard-fast'}
+        )
+        self.assertEqual(results['activity-fast']['queries'], 1)
+
+    def test_find_regressions(self):
+        """Test query growth always fails and latency fails only past tolerance"""
+        baselines = {'api:user-list': {'queries': 1, 'p95_ms': 10.0}}
+        ok = {'api:user-list': {'queries': 1, 'p95_ms': 19.0}}
+        self.assertEqual(benchmarks.find_regressions(ok, baselines), [])
+        slow = {'api:user-list': {'queries': 1, 'p95_ms': 25.0}}
+        self.assertEqual(len(benchmarks.find_regressions(slow, baselines)), 1)
+        chatty = {'api:user-list': {'queries': 2, 'p95_ms': 5.0}}
+        self.assertIn('2 queries', benchmarks.find_regressions(chatty, baselines)[0])
+
+    def test_percentile_nearest_rank(self):
+        """Test nearest-rank percentiles"""
+        self.assertEqual(benchmarks.percentile([5, 1, 3, 2, 4], 0.5), 3)
+        self.assertEqual(benchmarks.percentile(list(range(1, 101)), 0.95), 95)
+
+
+class ConcurrencyBenchmarkTest(TransactionTestCase):
+    """Test cases for the WSGI vs ASGI benchmark suite, which uses extra threads and connections"""
+
+    def test_suite_measures_both_stacks(self):
+        """Test sequential and burst cases are reported for each stack"""
+        generate_dataset(users=4, teams=2, activities_per_user=2, workouts=1, seed=1)
+        results = benchmark_concurrency.run(iterations=1, concurrency=2)
+        self.assertEqual(len(results), 16)
+        self.assertIn('requests_per_s', results['asgi-team-stats-burst'])
+        self.assertNotIn('queries', results['wsgi-leaderboard-list-burst'])
+
+
+class DatabaseProfileTest(TestCase):
+    """Test cases for the SQLite connection profiles"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db = sqlite3.connect(Path(directory.name) / 'profile.sqlite3', isolation_level=None)
+        self.addCleanup(self.db.close)
+
+    def pragma(self, name):
+        return self.db.execute(f'PRAGMA {name}').fetchone()[0]
+
+    def test_production_pragmas(self):
+        """Test the production profile switches a file database to WAL with relaxed syncing"""
+        apply_pragmas(self.db, PROFILES['production'])
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('mmap_size'), 256 * 1024 * 1024)
+
+    def test_connection_hook_follows_setting(self):
+        """Test configure_sqlite applies the configured profile and skips other vendors"""
+        wrapper = SimpleNamespace(vendor='sqlite', connection=self.db)
+        with override_settings(DATABASE_PROFILE='default'):
+            configure_sqlite(sender=None, connection=wrapper)
+        self.assertEqual(self.pragma('journal_mode'), 'delete')
+        with override_settings(DATABASE_PROFILE='production'):
+            configure_sqlite(sender=None, connection=SimpleNamespace(vendor='postgresql', connection=None))
+            configure_sqlite(sender=None, connection=wrapper)
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+
+    def test_unknown_profile(self):
+        """Test an unknown profile name is a configuration error"""
+        wrapper = SimpleNamespace(vendor='sqlite', connection=self.db)
+        with override_settings(DATABASE_PROFILE='turbo'):
+            with self.assertRaises(ImproperlyConfigured):
+                configure_sqlite(sender=None, connection=wrapper)
+
+
+class WriteBenchmarkTest(TransactionTestCase):
+    """Test cases for the SQLite write throughput benchmark suite"""
+
+    def test_suite_measures_each_profile(self):
+        """Test every profile commits all writes against its own copy of the database"""
+        generate_dataset(users=4, teams=2, activities_per_user=2, workouts=1, seed=1)
+        results = benchmark_writes.run(iterations=3, concurrency=2, readers=1)
+        self.assertEqual(sorted(results), ['default-writes', 'production-writes'])
+        for summary in results.values():
+            self.assertEqual(summary['locked'], 0)
+            self.assertGreater(summary['writes_per_s'], 0)
+        self.assertEqual(Activity.objects.count(), 8)
+
+    def test_copy_includes_data(self):
+        """Test the workload database starts from the seeded rows"""
+        generate_dataset(users=3, teams=1, activities_per_user=2, workouts=1, seed=1)
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'copy.sqlite3'
+            benchmark_writes.copy_database(path)
+            copy = sqlite3.connect(path)
+            try:
+                self.assertEqual(copy.execute('SELECT COUNT(*) FROM activities').fetchone()[0], 6)
+            finally:
+                copy.close()
+
+
+class RankingBenchmarkTest(TestCase):
+    """Test cases for the leaderboard ranking benchmark suite"""
+
+    def test_suite_reports_each_case_and_rolls_back(self):
+        """Test every case is measured and the added rows are rolled back"""
+        generate_dataset(users=4, teams=2, activities_per_user=1, workouts=1, seed=1)
+        rows = Leaderboard.objects.count()
+        results = benchmark_ranking.run(iterations=3, refresh_iterations=2, ranking_rows=200)
+        self.assertEqual(
+            sorted(results), ['full-python', 'full-window', 'partial-competition', 'partial-ordinal']
+        )
+        for summary in results.values():
+            self.assertIn('rows_moved', summary)
+        self.assertEqual(Leaderboard.objects.count(), rows)
+
+
+class PayloadBenchmarkTest(TestCase):
+    """Test cases for the response payload benchmark suite"""
+
+    def test_suite_reports_bytes_per_format_and_coding(self):
+        """Test every format and coding is measured and compression shrinks the payload"""
+        generate_dataset(users=4, teams=2, activities_per_user=5, workouts=1, seed=1)
+        results = benchmark_payloads.run(iterations=2)
+        self.assertIn('activities-columnar-gzip', results)
+        self.assertLess(results['activities-json-gzip']['bytes'], results['activities-json-identity']['bytes'])
+        self.assertLess(
+            results['activities-columnar-identity']['bytes'], results['activities-json-identity']['bytes']
+        )
+
+
+class MongoPipelineTest(APITestCase):
+    """Test the MongoDB pipelines agree with the SQL aggregates.
+
+    Runs against the mongod at OCTOFIT_MONGO_TEST_URI when set, otherwise
+    against mongomock, and is skipped when neither is available.
+    """
+    MONGO_DAL = {'URI': 'mongodb://octofit-test', 'NAME': 'octofit_test'}
+
+    def setUp(self):
+        uri = os.environ.get('OCTOFIT_MONGO_TEST_URI')
+        if uri:
+            import pymongo
+            client = pymongo.MongoClient(uri)
+            self.addCleanup(client.drop_database, 'octofit_test')
+        elif mongomock is not None:
+            client = mongomock.MongoClient()
+        else:
+            self.skipTest('Set OCTOFIT_MONGO_TEST_URI or install mongomock')
+        self.db = client['octofit_test']
+        get_response_cache().clear()
+        generate_dataset(users=12, teams=3, activities_per_user=6, days=40, workouts=1, seed=3)
+        self.mirror_to_mongo()
+
+    def mirror_to_mongo(self):
+        """Copy the rows into collections laid out the way djongo stores them"""
+        def midnight(day):
+            return datetime(day.year, day.month, day.day)
+
+        for name, rows in [
+            ('users', User.objects.values('id', 'username', 'team_id')),
+            ('activities', Activity.objects.values('id', 'user_id', 'activity_type', 'duration', 'calories', 'date')),
+            ('daily_activity_rollups', [
+                {**row, 'day': midnight(row['day'])} for row in DailyActivityRollup.objects.values()
+            ]),
+        ]:
+            self.db[name].delete_many({})
+            self.db[name].insert_many([dict(row) for row in rows])
+        mongo.ensure_indexes(self.db)
+
+    def on_mongo(self):
+        return mock.patch.object(mongo, 'get_database', return_value=self.db)
+
+    def entries(self, compute, *args):
+        return sorted(
+            (entry.entity_id, entry.total_points, entry.total_activities, entry.total_calories, entry.total_duration)
+            for entry in compute(*args)
+        )
+
+    def test_leaderboard_totals_match_sql(self):
+        """Test user and team totals, whole and filtered, match the SQL aggregates"""
+        team_ids = list(Team.objects.values_list('id', flat=True)[:2])
+        user_ids = User.objects.filter(team_id=team_ids[0]).values('id')
+        cases = [
+            (compute_user_entries,), (compute_user_entries, user_ids),
+            (compute_team_entries,), (compute_team_entries, team_ids),
+        ]
+        expected = [self.entries(*case) for case in cases]
+        with override_settings(MONGO_DAL=self.MONGO_DAL), self.on_mongo():
+            self.assertEqual([self.entries(*case) for case in cases], expected)
+
+    def test_stats_endpoints_match_sql(self):
+        """Test user and team stats, with and without a window, match the SQL path"""
+        user = User.objects.filter(team__isnull=False).first()
+        urls = [
+            (reverse('user-stats', args=[user.id]), {}),
+            (reverse('user-stats', args=[user.id]), {'period': 'week'}),
+            (reverse('team-stats', args=[user.team_id]), {'period': 'month'}),
+            (reverse('team-stats', args=[user.team_id]), {'from': '2000-01-01', 'to': '2000-02-01'}),
+        ]
+        expected = [self.client.get(url, params).json() for url, params in urls]
+        with override_settings(MONGO_DAL=self.MONGO_DAL), self.on_mongo():
+            self.assertEqual([self.client.get(url, params).json() for url, params in urls], expected)
+
+    def test_refresh_on_mongo(self):
+        """Test a full refresh computes the same leaderboard from the pipelines"""
+        refresh_leaderboard()
+        expected = list(Leaderboard.objects.order_by('entity_type', 'rank').values_list(
+            'entity_type', 'entity_id', 'total_points', 'rank'
+        ))
+        Leaderboard.objects.all().delete()
+        with override_settings(MONGO_DAL=self.MONGO_DAL), self.on_mongo():
+            refresh_leaderboard()
+        self.assertEqual(list(Leaderboard.objects.order_by('entity_type', 'rank').values_list(
+            'entity_type', 'entity_id', 'total_points', 'rank'
+        )), expected)
+
+    def test_pipelines_are_indexed(self):
+        """Test the stats pipeline starts with a match on the compound rollup index"""
+        self.assertIn(
+            'user_id_1_day_1_activity_type_1', self.db.daily_activity_rollups.index_information()
+        )
+        match = mongo.stats_pipeline([1, 2], (date(2024, 1, 1), None))[0]['$match']
+        self.assertEqual(match, {'user_id': {'$in': [1, 2]}, 'day': {'$gte': datetime(2024, 1, 1)}})
+
+
+class QueryPlanTest(TestCase):
+    """Test the hot endpoints' queries are served by indexes"""
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plans are only checked on SQLite')
+        get_response_cache().clear()
+        generate_dataset(users=6, teams=2, activities_per_user=3, workouts=6, seed=1)
+
+    def test_hot_queries_avoid_full_table_scans(self):
+        """Test no hot endpoint reads a whole table outside of allowed list pages"""
+        problems = find_full_scans()
+        self.assertEqual(problems, [], '\n'.join(f'{name}: SCAN {table}: {sql}' for name, table, sql in problems))
+
+    def test_unindexed_filter_is_reported(self):
+        """Test the harness recognizes a full table scan"""
+        sql, params = Activity.objects.filter(notes='x').query.sql_with_params()
+        self.assertEqual(full_scans(sql, params), ['activities'])
+        sql, params = Activity.objects.filter(activity_type='yoga').query.sql_with_params()
+        self.assertEqual(full_scans(sql, params), [])
+
+    def test_other_databases_are_rejected(self):
+        """Test the harness refuses to run on databases without EXPLAIN QUERY PLAN"""
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'postgresql'):
+                find_full_scans()
+
+
+class PopulateDbCommandTest(TestCase):
+    """Test cases for the populate_db management command"""
+
+    def test_synthetic_dataset(self):
+        """Test --users generates the requested volume and derived tables"""
+        call_command(
+            'populate_db', users=8, teams=2, activities_per_user=3, days=7, workouts=4,
+            seed=7, batch_size=5, stdout=io.StringIO()
+        )
+        self.assertEqual(User.objects.count(), 8)
+        self.assertEqual(Activity.objects.count(), 24)
+        self.assertEqual(Workout.objects.count(), 4)
+        self.assertEqual(sorted(Team.objects.values_list('member_count', flat=True)), [4, 4])
+        self.assertEqual(Leaderboard.objects.count(), 10)
+        self.assertEqual(
+            DailyActivityRollup.objects.aggregate(total=Sum('activity_count'))['total'], 24
+        )
+
+    def test_default_hero_dataset(self):
+        """Test the default run still builds the superhero teams"""
+        call_command('populate_db', seed=3, stdout=io.StringIO())
+        self.assertEqual(set(Team.objects.values_list('name', flat=True)), {'Team Marvel', 'Team DC'})
+        self.assertEqual(User.objects.count(), 12)
+        self.assertEqual(Leaderboard.objects.filter(entity_type='team').count(), 2)
+        self.assertEqual(sorted(Team.objects.values_list('member_count', flat=True)), [6, 6])
+
+    def test_rejects_invalid_options(self):
+        """Test nonsensical volumes are rejected"""
+        with self.assertRaises(CommandError):
+            call_command('populate_db', users=5, workers=0, stdout=io.StringIO())
+
+
+class RequestMetricsTest(APITestCase):
+    """Test cases for request instrumentation"""
+
+    def setUp(self):
+        metrics_registry.reset()
+        self.user = User.objects.create(email="metrics@example.com", username="metrics", password="pass")
+
+    def test_server_timing_header(self):
+        """Test responses carry DB, render and total timings"""
+        response = self.client.get(reverse('user-list'))
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn('desc="1 queries"', timing)
+        self.assertIn('serialize;dur=', timing)
+        self.assertIn('render;dur=', timing)
+        self.assertIn('desc="Response rendering"', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_serializer_time_is_measured(self):
+        """Test time spent in DRF and fast serializers is reported once, not once per nested call"""
+        User.objects.create(email="metrics2@example.com", username="metrics2", password="pass")
+        ticks = iter(range(100))
+        with mock.patch('octofit_tracker.metrics.time.perf_counter', side_effect=lambda: next(ticks)):
+            timer = SerializeTimer()
+            token = current_serialize_timer.set(timer)
+            try:
+                # One second per user, then one for the fast serializer, then one for the outer call only
+                UserSerializer(User.objects.all(), many=True).data
+                FastLeaderboardSerializer().to_representation([])
+                timer.measure(lambda: UserSerializer(User.objects.all(), many=True).data)
+            finally:
+                current_serialize_timer.reset(token)
+        self.assertEqual(timer.seconds, 4)
+
+        for name in ('user-list', 'leaderboard-list'):
+            self.client.get(reverse(name))
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('octofit_serialize_duration_seconds_count{route="user-list"} 1', body)
+        self.assertIn('octofit_serialize_duration_seconds_count{route="leaderboard-list"} 1', body)
+
+    def test_metrics_endpoint_exposes_route_histograms(self):
+        """Test the metrics endpoint reports histograms per route name"""
+        self.client.get(reverse('user-list'))
+        self.client.get(reverse('user-list'))
+        self.client.post(reverse('leaderboard-refresh'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn('# TYPE octofit_request_duration_seconds histogram', body)
+        self.assertIn('octofit_request_duration_seconds_count{route="user-list"} 2', body)
+        self.assertIn('octofit_db_queries_bucket{route="user-list",le="1"} 2', body)
+        self.assertIn('octofit_db_queries_count{route="leaderboard-refresh"} 1', body)
+        self.assertIn('octofit_response_size_bytes_bucket{route="user-list",le="+Inf"} 2', body)
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test histogram samples accumulate across buckets"""
+        histogram = Histogram((1, 5, 10))
+        for value in (0.5, 3, 3, 7, 50):
+            histogram.observe(value)
+        self.assertEqual(list(histogram.samples()), [('1', 1), ('5', 3), ('10', 4), ('+Inf', 5)])
+        self.assertEqual(histogram.total, 63.5)
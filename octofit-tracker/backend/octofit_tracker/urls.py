@@ -19,8 +19,10 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from octofit_tracker.views import (
     api_root, UserViewSet, TeamViewSet, ActivityViewSet,
-    LeaderboardViewSet, WorkoutViewSet
+    LeaderboardViewSet, LeaderboardJobViewSet, WorkoutViewSet
 )
+from octofit_tracker.metrics import metrics_view
+from octofit_tracker import async_views
 
 # Create router and register viewsets
 router = DefaultRouter()
@@ -28,6 +30,7 @@ router.register(r'users', UserViewSet, basename='user')
 router.register(r'teams', TeamViewSet, basename='team')
 router.register(r'activities', ActivityViewSet, basename='activity')
 router.register(r'leaderboard', LeaderboardViewSet, basename='leaderboard')
+router.register(r'leaderboard-jobs', LeaderboardJobViewSet, basename='leaderboard-job')
 router.register(r'workouts', WorkoutViewSet, basename='workout')
 
 # Get base URL based on environment
@@ -42,4 +45,10 @@ urlpatterns = [
     path('', api_root, name='api-root'),  # Root URL points to API root
     path('api/', api_root, name='api-root-alt'),  # Alternative path
     path('api/', include(router.urls)),
+    # Async versions of the hot read endpoints, for ASGI deployments
+    path('api/async/leaderboard/', async_views.leaderboard_list, name='async-leaderboard-list'),
+    path('api/async/users/<int:pk>/stats/', async_views.user_stats, name='async-user-stats'),
+    path('api/async/teams/<int:pk>/stats/', async_views.team_stats, name='async-team-stats'),
+    path('api/async/teams/<int:pk>/members/', async_views.team_members, name='async-team-members'),
+    path('metrics', metrics_view, name='metrics'),
 ]
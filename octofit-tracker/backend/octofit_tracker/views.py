@@ -1,13 +1,148 @@
+from django.conf import settings
 from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
-from django.db.models import Sum, Count
-from .models import User, Team, Activity, Leaderboard, Workout
+from .models import (
+    User, Team, Activity, DailyActivityRollup, Leaderboard, LeaderboardJob, LeaderboardSnapshot, Workout
+)
 from .serializers import (
     UserSerializer, TeamSerializer, ActivitySerializer,
-    LeaderboardSerializer, WorkoutSerializer
+    LeaderboardSerializer, LeaderboardSnapshotSerializer, LeaderboardJobSerializer, WorkoutSerializer,
+    FastActivitySerializer, FastLeaderboardSerializer, FastLeaderboardSnapshotSerializer,
+    model_columns, readable_fields, select_fields
 )
+from . import mongo, standings
+from .caching import CachedResponseMixin
+from .jobs import enqueue_refresh
+from .leaderboard import is_stored_period, period_snapshot, refresh_users, window_snapshot
+from .exports import EXPORT_FORMATS, stream_activities
+from .ingest import DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE, ingest_activities
+from .parsers import NDJSONParser, TooManyItems
+from .periods import bounded_window_from_params, filter_window, parse_date_param, window_from_params
+from .pagination import ActivityCursorPagination, LeaderboardCursorPagination, WindowSnapshotPagination
+from .recommendations import PER_DIFFICULTY, user_recommendations
+from .rollups import rollup_stats
+
+
+def window_stats(user_ids, window):
+    """Rollup totals for `user_ids`, plus the window bounds when the stats are windowed"""
+    if mongo.enabled():
+        stats = mongo.rollup_stats(mongo.get_database(), user_ids, window)
+    else:
+        rollups = DailyActivityRollup.objects.filter(user_id__in=user_ids)
+        if window is not None:
+            rollups = filter_window(rollups, window)
+        stats = rollup_stats(rollups)
+    if window is not None:
+        stats['from'], stats['to'] = window
+    return stats
+
+
+def _ordering_columns(paginator_class):
+    ordering = getattr(paginator_class, 'ordering', ())
+    if isinstance(ordering, str):
+        ordering = (ordering,)
+    return [field.lstrip('-') for field in ordering]
+
+
+def _related_paths(tree, prefix=''):
+    """Every relation path in a `query.select_related` tree"""
+    for name, subtree in tree.items():
+        yield prefix + name
+        yield from _related_paths(subtree, f'{prefix}{name}__')
+
+
+def _select_read_relations(queryset, columns):
+    """Keep only the select_related joins that `columns` read through.
+
+    A relation deferred by .only() cannot also be followed with select_related.
+    """
+    related = queryset.query.select_related
+    if related is False:
+        return queryset
+    needed = {
+        '__'.join(parts[:depth]) for parts in (column.split('__') for column in columns)
+        for depth in range(1, len(parts))
+    }
+    if isinstance(related, dict):
+        needed = [path for path in _related_paths(related) if path in needed]
+    queryset = queryset.select_related(None)
+    return queryset.select_related(*needed) if needed else queryset
+
+
+class SparseFieldsMixin:
+    """Honour ?fields= / ?exclude= on reads.
+
+    The serializers drop the fields left out (see serializers.SparseFieldsMixin);
+    this mixin also defers their columns in `sparse_actions` querysets, keeping
+    the primary key and the pagination ordering columns.
+    """
+    sparse_actions = ('list', 'retrieve')
+
+    def sparse_fields(self, serializer_class=None):
+        """Serializer fields the request keeps, or None for all of them"""
+        if self.request.method not in ('GET', 'HEAD'):
+            return None
+        serializer_class = serializer_class or self.get_serializer_class()
+        return select_fields(self.request.query_params, readable_fields(serializer_class()))
+
+    def sparse_queryset(self, queryset, serializer_class=None, paginator_class=None):
+        """Restrict `queryset` to the columns the kept fields read"""
+        serializer_class = serializer_class or self.get_serializer_class()
+        fields = self.sparse_fields(serializer_class)
+        if fields is None:
+            return queryset
+        columns = model_columns(serializer_class(), fields)
+        if columns is None:
+            return queryset
+        ordering = _ordering_columns(paginator_class or self.pagination_class)
+        queryset = _select_read_relations(queryset, columns)
+        return queryset.only(queryset.model._meta.pk.name, *columns, *ordering)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action in self.sparse_actions:
+            queryset = self.sparse_queryset(queryset)
+        return queryset
+
+
+class FastListMixin:
+    """Serve `list` from `.values()` rows through a FastReadSerializer"""
+    fast_serializer_class = None
+
+    def get_fast_serializer_class(self):
+        return self.fast_serializer_class
+
+    def get_fast_serializer(self):
+        """A fast serializer for the fields the request keeps"""
+        return self.get_fast_serializer_class()(self.sparse_fields())
+
+    def list(self, request, *args, **kwargs):
+        fast = self.get_fast_serializer()
+        rows = fast.values(
+            self.filter_queryset(self.get_queryset()), extra=_ordering_columns(self.pagination_class)
+        )
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(fast.to_representation(rows))
+        return self.get_paginated_response(fast.to_representation(page))
+
+
+def parse_int_param(params, name, default=None, minimum=None, maximum=None):
+    """Parse an integer query parameter, rejecting values outside [minimum, maximum]"""
+    value = params.get(name, None)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValidationError({name: 'Expected an integer.'})
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise ValidationError({name: f'Expected an integer from {minimum} to {maximum}.'})
+    return value
 
 
 @api_view(['GET'])
@@ -18,11 +153,12 @@ def api_root(request, format=None):
         'teams': reverse('team-list', request=request, format=format),
         'activities': reverse('activity-list', request=request, format=format),
         'leaderboard': reverse('leaderboard-list', request=request, format=format),
+        'leaderboard-jobs': reverse('leaderboard-job-list', request=request, format=format),
         'workouts': reverse('workout-list', request=request, format=format),
     })
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """ViewSet for User model"""
     queryset = User.objects.all()
     serializer_class = UserSerializer
@@ -31,25 +167,24 @@ class UserViewSet(viewsets.ModelViewSet):
     def activities(self, request, pk=None):
         """Get all activities for a specific user"""
         user = self.get_object()
-        activities = Activity.objects.filter(user_id=user.id)
-        serializer = ActivitySerializer(activities, many=True)
-        return Response(serializer.data)
+        # Not user.activities: rows from a related manager read their user_id, which ?fields= may defer
+        activities = self.sparse_queryset(
+            Activity.objects.filter(user=user).select_related('user'), ActivitySerializer, ActivityCursorPagination
+        )
+        paginator = ActivityCursorPagination()
+        page = paginator.paginate_queryset(activities, request, view=self)
+        serializer = ActivitySerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['get'])
     def stats(self, request, pk=None):
-        """Get statistics for a specific user"""
+        """Get statistics for a specific user (?period=week|month or ?from=&to= to limit the window)"""
         user = self.get_object()
-        activities = Activity.objects.filter(user_id=user.id)
-        stats = activities.aggregate(
-            total_activities=Count('id'),
-            total_duration=Sum('duration'),
-            total_calories=Sum('calories'),
-            total_distance=Sum('distance')
-        )
-        return Response(stats)
+        window = window_from_params(request.query_params)
+        return Response(window_stats([user.id], window))
 
 
-class TeamViewSet(viewsets.ModelViewSet):
+class TeamViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """ViewSet for Team model"""
     queryset = Team.objects.all()
     serializer_class = TeamSerializer
@@ -58,119 +193,210 @@ class TeamViewSet(viewsets.ModelViewSet):
     def members(self, request, pk=None):
         """Get all members of a team"""
         team = self.get_object()
-        users = User.objects.filter(team_id=team.id)
-        serializer = UserSerializer(users, many=True)
-        return Response(serializer.data)
+        # Not team.members: rows from a related manager read their team_id, which ?fields= may defer
+        page = self.paginate_queryset(self.sparse_queryset(User.objects.filter(team=team), UserSerializer))
+        serializer = UserSerializer(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['get'])
     def stats(self, request, pk=None):
-        """Get statistics for a specific team"""
+        """Get statistics for a specific team (?period=week|month or ?from=&to= to limit the window)"""
         team = self.get_object()
-        user_ids = User.objects.filter(team_id=team.id).values_list('id', flat=True)
-        activities = Activity.objects.filter(user_id__in=user_ids)
-        stats = activities.aggregate(
-            total_activities=Count('id'),
-            total_duration=Sum('duration'),
-            total_calories=Sum('calories'),
-            total_distance=Sum('distance')
-        )
-        stats['member_count'] = len(user_ids)
+        window = window_from_params(request.query_params)
+        stats = window_stats(team.members.values('id'), window)
+        stats['member_count'] = team.member_count
         return Response(stats)
 
 
-class ActivityViewSet(viewsets.ModelViewSet):
+class ActivityViewSet(SparseFieldsMixin, FastListMixin, viewsets.ModelViewSet):
     """ViewSet for Activity model"""
     queryset = Activity.objects.all()
     serializer_class = ActivitySerializer
+    fast_serializer_class = FastActivitySerializer
+    pagination_class = ActivityCursorPagination
 
     def get_queryset(self):
-        """Filter activities by user_id if provided"""
-        queryset = Activity.objects.all()
+        """Filter activities by user_id, activity_type and a [from, to) date range if provided"""
+        queryset = Activity.objects.select_related('user')
         user_id = self.request.query_params.get('user_id', None)
+        activity_type = self.request.query_params.get('activity_type', None)
+        date_from = parse_date_param(self.request.query_params, 'from')
+        date_to = parse_date_param(self.request.query_params, 'to')
+
         if user_id is not None:
             queryset = queryset.filter(user_id=user_id)
+        if activity_type is not None:
+            queryset = queryset.filter(activity_type=activity_type)
+        if date_from is not None:
+            queryset = queryset.filter(date__gte=date_from)
+        if date_to is not None:
+            queryset = queryset.filter(date__lt=date_to)
         return queryset
 
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """Create many activities from a JSON array or NDJSON body.
+
+        Valid items are inserted even when others fail; failures are reported
+        by index. ?batch_size= sets the bulk_create batch size and
+        ?refresh=true also recomputes the touched users' leaderboard rows and re-ranks.
+        Bodies with more than settings.BULK_INGEST_MAX_ITEMS items are rejected with 413.
+        """
+        items = request.data
+        if isinstance(items, dict):
+            items = items.get('activities')
+        if not isinstance(items, list):
+            raise ValidationError({'activities': 'Expected a list of activities.'})
+        if len(items) > settings.BULK_INGEST_MAX_ITEMS:
+            raise TooManyItems(settings.BULK_INGEST_MAX_ITEMS)
+
+        try:
+            batch_size = int(request.query_params.get('batch_size', DEFAULT_BATCH_SIZE))
+        except ValueError:
+            raise ValidationError({'batch_size': 'Expected an integer.'})
+        batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+
+        result = ingest_activities(items, batch_size=batch_size)
+        if result['user_ids'] and request.query_params.get('refresh') == 'true':
+            refresh_users(result['user_ids'])
+
+        if not result['errors']:
+            response_status = status.HTTP_201_CREATED
+        elif result['created']:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(result, status=response_status)
 
-class LeaderboardViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream filtered activities as NDJSON (default) or CSV (?output=csv)"""
+        export_format = request.query_params.get('output', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'output': f"Choose one of: {', '.join(EXPORT_FORMATS)}"})
+        return stream_activities(self.get_queryset(), export_format)
+
+
+class LeaderboardViewSet(CachedResponseMixin, SparseFieldsMixin, FastListMixin, viewsets.ModelViewSet):
     """ViewSet for Leaderboard model"""
+    cache_namespace = 'leaderboard'
     queryset = Leaderboard.objects.all()
     serializer_class = LeaderboardSerializer
+    pagination_class = LeaderboardCursorPagination
 
     def get_queryset(self):
-        """Filter leaderboard by entity_type if provided"""
-        queryset = Leaderboard.objects.all()
+        """Filter leaderboard by entity_type, reading a period snapshot for ?period= or ?from=&to=
+
+        Custom windows are not stored, so they have no rows to retrieve; `list` computes them.
+        """
+        window = self.get_window()
+        if window is None:
+            queryset = Leaderboard.objects.all()
+        elif is_stored_period(*window):
+            queryset = period_snapshot(*window)
+        else:
+            queryset = LeaderboardSnapshot.objects.none()
         entity_type = self.request.query_params.get('type', None)
         if entity_type is not None:
             queryset = queryset.filter(entity_type=entity_type)
         return queryset
 
+    def get_window(self):
+        return bounded_window_from_params(self.request.query_params)
+
+    def is_cached(self, request, action):
+        """?top= and around are read from the in-memory standings, which are cheaper than a cache lookup"""
+        if action == 'list' and 'top' in request.GET:
+            return False
+        return super().is_cached(request, action)
+
+    def list(self, request, *args, **kwargs):
+        """List leaderboard rows, or only the best ?top=N rows of ?type= (users by default)"""
+        window = self.get_window()
+        if window is not None and not is_stored_period(*window):
+            return self.list_window(request, window)
+        if 'top' not in request.query_params:
+            return super().list(request, *args, **kwargs)
+        count = parse_int_param(request.query_params, 'top', minimum=1, maximum=standings.MAX_TOP)
+        entity_type = request.query_params.get('type', 'user')
+        fast = self.get_fast_serializer()
+        if window is None:
+            rows = standings.top(entity_type, count)
+        else:
+            rows = fast.values(self.get_queryset().filter(entity_type=entity_type).order_by('rank', 'id')[:count])
+        return Response(fast.to_representation(rows))
+
+    def list_window(self, request, window):
+        """Rows for a custom ?from=&to= window, computed from rollups without being stored"""
+        fast = self.get_fast_serializer()
+        if 'top' in request.query_params:
+            count = parse_int_param(request.query_params, 'top', minimum=1, maximum=standings.MAX_TOP)
+            rows = window_snapshot(*window, request.query_params.get('type', 'user'))
+            return Response(fast.to_representation(rows[:count]))
+        rows = window_snapshot(*window, request.query_params.get('type', None))
+        paginator = WindowSnapshotPagination()
+        page = paginator.paginate_queryset(rows, request, view=self)
+        return paginator.get_paginated_response(fast.to_representation(page))
+
+    @action(detail=False, methods=['get'])
+    def around(self, request):
+        """Rows within ?radius= ranks of ?entity_id= among ?type= (users by default)"""
+        if 'entity_id' not in request.query_params:
+            raise ValidationError({'entity_id': 'This parameter is required.'})
+        entity_id = parse_int_param(request.query_params, 'entity_id')
+        radius = parse_int_param(
+            request.query_params, 'radius', default=standings.DEFAULT_RADIUS, minimum=0, maximum=standings.MAX_RADIUS
+        )
+        rows = standings.around(request.query_params.get('type', 'user'), entity_id, radius)
+        if rows is None:
+            raise NotFound()
+        return Response(FastLeaderboardSerializer(self.sparse_fields()).to_representation(rows))
+
+    def get_serializer_class(self):
+        if self.request.method == 'GET' and self.get_window() is not None:
+            return LeaderboardSnapshotSerializer
+        return LeaderboardSerializer
+
+    def get_fast_serializer_class(self):
+        if self.get_window() is not None:
+            return FastLeaderboardSnapshotSerializer
+        return FastLeaderboardSerializer
+
     @action(detail=False, methods=['post'])
     def refresh(self, request):
-        """Recalculate leaderboard rankings"""
-        # Clear existing leaderboard
-        Leaderboard.objects.all().delete()
-
-        # Calculate user rankings
-        users = User.objects.all()
-        user_stats = []
-        for user in users:
-            activities = Activity.objects.filter(user_id=user.id)
-            stats = activities.aggregate(
-                total_activities=Count('id'),
-                total_duration=Sum('duration'),
-                total_calories=Sum('calories')
-            )
-            total_points = (stats['total_activities'] or 0) * 10 + (stats['total_calories'] or 0)
-            user_stats.append({
-                'entity_id': user.id,
-                'entity_type': 'user',
-                'name': user.username,
-                'total_points': total_points,
-                'total_activities': stats['total_activities'] or 0,
-                'total_calories': stats['total_calories'] or 0,
-                'total_duration': stats['total_duration'] or 0,
-            })
-
-        # Sort by points and assign ranks
-        user_stats.sort(key=lambda x: x['total_points'], reverse=True)
-        for rank, stat in enumerate(user_stats, 1):
-            stat['rank'] = rank
-            Leaderboard.objects.create(**stat)
-
-        # Calculate team rankings
-        teams = Team.objects.all()
-        team_stats = []
-        for team in teams:
-            user_ids = User.objects.filter(team_id=team.id).values_list('id', flat=True)
-            activities = Activity.objects.filter(user_id__in=user_ids)
-            stats = activities.aggregate(
-                total_activities=Count('id'),
-                total_duration=Sum('duration'),
-                total_calories=Sum('calories')
-            )
-            total_points = (stats['total_activities'] or 0) * 10 + (stats['total_calories'] or 0)
-            team_stats.append({
-                'entity_id': team.id,
-                'entity_type': 'team',
-                'name': team.name,
-                'total_points': total_points,
-                'total_activities': stats['total_activities'] or 0,
-                'total_calories': stats['total_calories'] or 0,
-                'total_duration': stats['total_duration'] or 0,
-            })
-
-        # Sort by points and assign ranks
-        team_stats.sort(key=lambda x: x['total_points'], reverse=True)
-        for rank, stat in enumerate(team_stats, 1):
-            stat['rank'] = rank
-            Leaderboard.objects.create(**stat)
-
-        return Response({'message': 'Leaderboard refreshed successfully'})
-
-
-class WorkoutViewSet(viewsets.ModelViewSet):
+        """Queue a leaderboard recalculation (?mode=incremental to only update changed entities).
+
+        Requests made while a job is waiting are merged into it. Poll the
+        returned job, also linked from the Location header, for its status.
+        """
+        incremental = request.query_params.get('mode') == 'incremental'
+        job = enqueue_refresh(incremental=incremental)
+        location = reverse('leaderboard-job-detail', args=[job.id], request=request)
+        return Response(
+            LeaderboardJobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': location},
+        )
+
+
+class LeaderboardJobViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
+    """ViewSet for LeaderboardJob model"""
+    queryset = LeaderboardJob.objects.all()
+    serializer_class = LeaderboardJobSerializer
+
+    def get_queryset(self):
+        """Filter jobs by status if provided"""
+        queryset = LeaderboardJob.objects.all()
+        job_status = self.request.query_params.get('status', None)
+        if job_status is not None:
+            queryset = queryset.filter(status=job_status)
+        return queryset
+
+
+class WorkoutViewSet(CachedResponseMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     """ViewSet for Workout model"""
+    cache_namespace = 'workouts'
+    cached_actions = ('list', 'retrieve', 'suggest')
     queryset = Workout.objects.all()
     serializer_class = WorkoutSerializer
 
@@ -187,10 +413,26 @@ class WorkoutViewSet(viewsets.ModelViewSet):
         
         return queryset
 
+    def is_cached(self, request, action):
+        """Personal suggestions are a single indexed read and change with every activity"""
+        if action == 'suggest' and 'user_id' in request.GET:
+            return False
+        return super().is_cached(request, action)
+
     @action(detail=False, methods=['get'])
     def suggest(self, request):
-        """Get personalized workout suggestions"""
-        difficulty = request.query_params.get('difficulty', 'beginner')
-        workouts = Workout.objects.filter(difficulty=difficulty)[:5]
+        """Get workout suggestions: ?user_id= for a user's recommendations, else workouts at ?difficulty="""
+        difficulty = request.query_params.get('difficulty', None)
+        user_id = request.query_params.get('user_id', None)
+        if user_id is None:
+            workouts = Workout.objects.filter(difficulty=difficulty or 'beginner').order_by('id')[:PER_DIFFICULTY]
+        else:
+            try:
+                user_id = int(user_id)
+            except ValueError:
+                raise ValidationError({'user_id': 'Expected an integer.'})
+            workouts = user_recommendations(user_id, difficulty)
+            if workouts is None:
+                raise NotFound()
         serializer = self.get_serializer(workouts, many=True)
         return Response(serializer.data)